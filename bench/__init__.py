@@ -0,0 +1,7 @@
+"""
+Нагрузочное тестирование файлового сервиса: python -m bench --help.
+
+Каждый запуск работает в отдельной рабочей директории (своя база данных и директория файлов),
+заполняет каталог синтетическими записями и файлами и прогоняет сценарии внутри процесса
+или через uvicorn. Результаты сохраняются в JSON и сравниваются командой compare.
+"""
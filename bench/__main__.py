@@ -0,0 +1,168 @@
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import uuid
+
+from bench.environment import apply_environment, bench_environment, run_metadata
+
+# Показатели, по которым compare ищет регрессии: (путь в результате, True - чем больше, тем лучше)
+COMPARED_METRICS = (
+    (("req_per_s",), True),
+    (("files_per_s",), True),
+    (("mb_per_s",), True),
+    (("latency_ms", "p50"), False),
+    (("latency_ms", "p99"), False),
+    (("peak_rss_mb",), False),
+)
+
+# Названия сценариев нужны до импорта bench.scenarios, который импортирует src
+SCENARIO_NAMES = ("list", "get", "search", "search_text", "download", "upload", "upload_large", "download_large",
+                  "ingest")
+
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+
+def parse_size(value: str) -> int:
+    """Размер в байтах из строки вида 4096, 512K, 256M или 4G."""
+    value = value.strip().upper().rstrip("B")
+    unit = value[-1] if value and value[-1] in SIZE_UNITS else ""
+    try:
+        return int(float(value[:len(value) - len(unit)]) * SIZE_UNITS[unit])
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Некорректный размер: {value}")
+
+
+def parse_arguments(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Нагрузочное тестирование файлового сервиса.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Заполнить каталог и прогнать сценарии")
+    run.add_argument("--mode", choices=("inprocess", "uvicorn"), default="inprocess",
+                     help="inprocess - ASGI-транспорт в этом процессе, uvicorn - отдельный сервер и TCP")
+    run.add_argument("--workers", type=int, default=1, help="Число процессов uvicorn (режим uvicorn)")
+    run.add_argument("--workdir", default="bench-data", help="Рабочая директория: база данных и файлы")
+    run.add_argument("--database-url", help="База данных вместо SQLite в рабочей директории")
+    run.add_argument("--rows", type=int, default=100000, help="Синтетических записей в каталоге")
+    run.add_argument("--files", type=int, default=1000, help="Из них с файлами на диске (для download)")
+    run.add_argument("--file-size", type=parse_size, default="64K", help="Размер синтетических файлов")
+    run.add_argument("--scenarios", default=",".join(SCENARIO_NAMES),
+                     help=f"Сценарии через запятую: {', '.join(SCENARIO_NAMES)}")
+    run.add_argument("--requests", type=int, default=1000, help="Запросов в каждом сценарии (файлов в ingest)")
+    run.add_argument("--concurrency", type=int, default=32, help="Одновременных запросов")
+    run.add_argument("--large-size", type=parse_size, default="256M", help="Размер файлов upload_large")
+    run.add_argument("--large-count", type=int, default=1, help="Число файлов upload_large")
+    run.add_argument("--output", help="Файл JSON с результатами")
+
+    compare = commands.add_parser("compare", help="Сравнить два файла результатов")
+    compare.add_argument("base", help="Результаты до изменения")
+    compare.add_argument("new", help="Результаты после изменения")
+    compare.add_argument("--threshold", type=float, default=10.0,
+                         help="Допустимое ухудшение показателя, процентов; при превышении код выхода 1")
+    return parser.parse_args(argv)
+
+
+async def run_scenarios(args: argparse.Namespace, environment: dict) -> dict:
+    from bench.runner import InProcessServer, UvicornServer
+    from bench.scenarios import SCENARIOS, BenchContext
+
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Неизвестные сценарии: {', '.join(sorted(unknown))}")
+
+    server = InProcessServer() if args.mode == "inprocess" else UvicornServer(environment, workers=args.workers)
+    results = {}
+    async with server as client:
+        ctx = BenchContext(
+            client, server.pid, rows=args.rows, files=min(args.files, args.rows), requests=args.requests,
+            concurrency=args.concurrency, large_size=args.large_size, large_count=args.large_count,
+            run_id=uuid.uuid4().hex[:8],
+        )
+        for name in names:
+            logging.info(f"Сценарий {name}...")
+            result = await SCENARIOS[name](ctx)
+            if result is None:
+                logging.info(f"Сценарий {name} пропущен: нет данных для него.")
+                continue
+            results[name] = result
+            print(format_row(name, result), flush=True)
+    return results
+
+
+def format_row(name: str, result: dict) -> str:
+    latency = result.get("latency_ms", {})
+    rate = result.get("req_per_s", result.get("files_per_s", 0.0))
+    return (f"{name:<15} {result['requests']:>8} {result['errors']:>6} {rate:>10.1f} {result['mb_per_s']:>9.2f} "
+            f"{latency.get('p50', 0.0):>9.2f} {latency.get('p99', 0.0):>9.2f} {result['peak_rss_mb']:>9.1f}")
+
+
+HEADER = (f"{'scenario':<15} {'requests':>8} {'errors':>6} {'per_s':>10} {'MB/s':>9} "
+          f"{'p50_ms':>9} {'p99_ms':>9} {'rss_MB':>9}")
+
+
+def command_run(args: argparse.Namespace) -> int:
+    environment = bench_environment(args.workdir, args.database_url)
+    apply_environment(environment)
+    from bench.seed import seed_catalog
+
+    logging.info(f"Заполнение каталога: {args.rows} записей, {args.files} файлов.")
+    seed = seed_catalog(args.rows, args.files, args.file_size)
+    print(HEADER, flush=True)
+    results = asyncio.run(run_scenarios(args, environment))
+
+    report = {
+        "meta": dict(run_metadata(), mode=args.mode, workers=args.workers, concurrency=args.concurrency,
+                     requests=args.requests, file_size=args.file_size, large_size=args.large_size),
+        "seed": seed,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        logging.info(f"Результаты сохранены в {args.output}.")
+    return 0
+
+
+def _metric(result: dict, path):
+    for key in path:
+        if not isinstance(result, dict) or key not in result:
+            return None
+        result = result[key]
+    return result
+
+
+def command_compare(args: argparse.Namespace) -> int:
+    with open(args.base) as f:
+        base = json.load(f)["results"]
+    with open(args.new) as f:
+        new = json.load(f)["results"]
+
+    regressions = 0
+    print(f"{'scenario':<15} {'metric':<16} {'base':>10} {'new':>10} {'change':>8}")
+    for scenario in [name for name in base if name in new]:
+        for path, higher_is_better in COMPARED_METRICS:
+            before, after = _metric(base[scenario], path), _metric(new[scenario], path)
+            if not before or after is None:
+                continue
+            change = (after - before) / before * 100
+            worse = -change if higher_is_better else change
+            regressed = worse > args.threshold
+            regressions += regressed
+            print(f"{scenario:<15} {'.'.join(path):<16} {before:>10} {after:>10} {change:>+7.1f}%"
+                  f"{'  REGRESSION' if regressed else ''}")
+    return 1 if regressions else 0
+
+
+def main(argv=None) -> int:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    args = parse_arguments(argv)
+    if args.command == "run":
+        return command_run(args)
+    return command_compare(args)
+
+
+# Проверка обязательна: пул процессов превью (spawn) импортирует главный модуль в каждом процессе
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,46 @@
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+# Корень репозитория: uvicorn запускается отсюда, чтобы импортировать src.app
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def bench_environment(workdir: str, database_url: Optional[str] = None) -> Dict[str, str]:
+    """
+    Переменные окружения приложения для запуска в рабочей директории бенчмарка.
+    Устанавливаются до импорта src: настройки читаются из окружения при импорте src.config.
+    """
+    workdir = os.path.abspath(workdir)
+    return {
+        "DATABASE_URL": database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "FILES_DIR": os.path.join(workdir, "files"),
+        # Сверка обходит весь каталог и исказила бы замеры; превью синтетических файлов не нужны
+        "RECONCILE_INTERVAL": "0",
+        "PREVIEW_WORKERS": os.environ.get("PREVIEW_WORKERS", "1"),
+    }
+
+
+def apply_environment(variables: Dict[str, str]) -> None:
+    os.environ.update(variables)
+    os.makedirs(variables["FILES_DIR"], exist_ok=True)
+
+
+def run_metadata() -> dict:
+    """Сведения о запуске для сравнения результатов: версия кода, интерпретатор, машина."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": commit,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
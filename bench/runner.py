@@ -0,0 +1,203 @@
+import asyncio
+import itertools
+import os
+import resource
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+import httpx
+
+from bench.environment import REPO_DIR
+
+# Запрос сценария: номер запроса -> (код ответа, переданные байты)
+RequestFunc = Callable[[httpx.AsyncClient, int], Awaitable[Tuple[int, int]]]
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _process_rss(pid: int) -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _process_tree(pid: int) -> List[int]:
+    """pid и все его потомки (процессы uvicorn --workers, пул превью)."""
+    pids, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        pids.append(current)
+        try:
+            with open(f"/proc/{current}/task/{current}/children") as f:
+                pending += [int(child) for child in f.read().split()]
+        except OSError:
+            pass
+    return pids
+
+
+class RssSampler:
+    """
+    Пиковый объём резидентной памяти процесса pid и его потомков за время сценария.
+    Без /proc (не Linux) - пик за всё время жизни текущего процесса по getrusage.
+    """
+
+    def __init__(self, pid: int, interval: float = 0.05):
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self.stopped = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "RssSampler":
+        self.peak = self.sample()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stopped.set()
+        self.thread.join()
+        self.peak = max(self.peak, self.sample())
+
+    def _run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, self.sample())
+
+    def sample(self) -> int:
+        sizes = [_process_rss(pid) for pid in _process_tree(self.pid)]
+        if sizes and sizes[0] is not None:
+            return sum(size for size in sizes if size)
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == "darwin" else maxrss * 1024  # На macOS - байты, на Linux - КиБ
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def run_load(client: httpx.AsyncClient, request: RequestFunc, total: int, concurrency: int,
+                   server_pid: int) -> dict:
+    """Выполняет total запросов сценария, не больше concurrency одновременно, и сводит замеры."""
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    transferred = 0
+    numbers = itertools.count()
+
+    async def worker():
+        nonlocal transferred
+        for number in numbers:
+            if number >= total:
+                return
+            started = time.perf_counter()
+            try:
+                status, size = await request(client, number)
+            except httpx.HTTPError as e:
+                status, size = type(e).__name__, 0
+            latencies.append(time.perf_counter() - started)
+            statuses[str(status)] += 1
+            transferred += size
+
+    with RssSampler(server_pid) as rss:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(min(concurrency, total))))
+        wall = time.perf_counter() - started
+    return summarize(latencies, statuses, transferred, wall, rss.peak)
+
+
+def summarize(latencies: List[float], statuses: Counter, transferred: int, wall: float, peak_rss: int) -> dict:
+    latencies = sorted(latencies)
+    errors = sum(count for status, count in statuses.items() if not status.startswith(("2", "3")))
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "statuses": dict(statuses),
+        "seconds": round(wall, 3),
+        "req_per_s": round(len(latencies) / wall, 1) if wall else 0.0,
+        "mb_per_s": round(transferred / wall / 1024 ** 2, 2) if wall else 0.0,
+        "bytes": transferred,
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+            "p50": round(percentile(latencies, 0.50) * 1000, 2),
+            "p90": round(percentile(latencies, 0.90) * 1000, 2),
+            "p99": round(percentile(latencies, 0.99) * 1000, 2),
+            "max": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        },
+        "peak_rss_mb": round(peak_rss / 1024 ** 2, 1),
+    }
+
+
+class InProcessServer:
+    """Приложение в текущем процессе через ASGI-транспорт httpx, с выполнением событий startup/shutdown."""
+
+    pid = os.getpid()
+
+    async def __aenter__(self) -> httpx.AsyncClient:
+        from src.app import app
+
+        self.app = app
+        await app.router.startup()
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench",
+                                        timeout=None)
+        return self.client
+
+    async def __aexit__(self, *exc) -> None:
+        await self.client.aclose()
+        await self.app.router.shutdown()
+
+
+class UvicornServer:
+    """Приложение в отдельном процессе uvicorn; запросы идут через TCP, как в эксплуатации."""
+
+    def __init__(self, environment: dict, workers: int = 1, port: Optional[int] = None):
+        self.environment = environment
+        self.workers = workers
+        self.port = port or _free_port()
+        self.process: Optional[subprocess.Popen] = None
+
+    @property
+    def pid(self) -> int:
+        return self.process.pid
+
+    async def __aenter__(self) -> httpx.AsyncClient:
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "src.app:app", "--host", "127.0.0.1", "--port", str(self.port),
+             "--workers", str(self.workers), "--log-level", "warning"],
+            cwd=REPO_DIR, env=dict(os.environ, **self.environment),
+        )
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+        self.client = httpx.AsyncClient(base_url=f"http://127.0.0.1:{self.port}", timeout=None, limits=limits)
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                if (await self.client.get("/files/", params={"limit": 1})).status_code == 200:
+                    return self.client
+            except httpx.TransportError:
+                pass
+            if self.process.poll() is not None or time.monotonic() > deadline:
+                await self.__aexit__()
+                raise RuntimeError("Сервер uvicorn не запустился")
+            await asyncio.sleep(0.2)
+
+    async def __aexit__(self, *exc) -> None:
+        await self.client.aclose()
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
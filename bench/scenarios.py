@@ -0,0 +1,219 @@
+import asyncio
+import io
+import os
+import random
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+from sqlalchemy import func, select
+
+from bench.runner import RssSampler, run_load
+from bench.seed import COMMENT_GROUPS, seed_directory, seed_name, synthetic_content
+from src.config import FILES_DIR
+from src.database import engine
+from src.models import File
+from src.utils import normalize_directory
+
+# Размер файлов сценариев upload и ingest
+SMALL_FILE_SIZE = 4 * 1024
+# Размер блока, из которого собирается содержимое больших файлов
+SYNTHETIC_BLOCK_SIZE = 1024 * 1024
+# Сколько ждать, пока наблюдатель добавит в каталог все файлы сценария ingest
+INGEST_TIMEOUT = 600
+INGEST_POLL_INTERVAL = 0.2
+
+
+class SyntheticFile(io.RawIOBase):
+    """
+    Файл заданного размера, содержимое которого генерируется при чтении: тело загрузки
+    в несколько гигабайт передаётся потоком и не занимает память клиента.
+    """
+
+    def __init__(self, size: int, seed: int):
+        self.size = size
+        self.position = 0
+        self.block = seed.to_bytes(8, "big") + random.Random(seed).randbytes(SYNTHETIC_BLOCK_SIZE - 8)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.position, io.SEEK_END: self.size}[whence]
+        self.position = max(0, base + offset)
+        return self.position
+
+    def readinto(self, buffer) -> int:
+        length = min(len(buffer), self.size - self.position)
+        written = 0
+        while written < length:
+            offset = (self.position + written) % SYNTHETIC_BLOCK_SIZE
+            piece = self.block[offset:offset + length - written]
+            buffer[written:written + len(piece)] = piece
+            written += len(piece)
+        self.position += length
+        return length
+
+
+class BenchContext:
+    """Параметры запуска и общее состояние сценариев (например, имена загруженных больших файлов)."""
+
+    def __init__(self, client: httpx.AsyncClient, server_pid: int, rows: int, files: int, requests: int,
+                 concurrency: int, large_size: int, large_count: int, run_id: str):
+        self.client = client
+        self.server_pid = server_pid
+        self.rows = rows
+        self.files = files
+        self.requests = requests
+        self.concurrency = concurrency
+        self.large_size = large_size
+        self.large_count = large_count
+        self.run_id = run_id
+        self.random = random.Random(run_id)
+        self.large_files: List[str] = []
+
+    async def load(self, request, total: Optional[int] = None, concurrency: Optional[int] = None) -> dict:
+        return await run_load(self.client, request, total or self.requests, concurrency or self.concurrency,
+                              self.server_pid)
+
+
+async def _get(client: httpx.AsyncClient, url: str, **params) -> Tuple[int, int]:
+    response = await client.get(url, params=params or None)
+    return response.status_code, len(response.content)
+
+
+async def _download(client: httpx.AsyncClient, file_name: str) -> Tuple[int, int]:
+    """Скачивает файл потоком, не накапливая тело ответа в памяти клиента."""
+    received = 0
+    async with client.stream("GET", f"/download/{file_name}") as response:
+        async for chunk in response.aiter_raw():
+            received += len(chunk)
+    return response.status_code, received
+
+
+async def _upload(client: httpx.AsyncClient, file_name: str, content) -> Tuple[int, int]:
+    response = await client.post(
+        "/upload/", files={"uploaded_file": (file_name, content, "application/octet-stream")},
+    )
+    size = content.size if isinstance(content, SyntheticFile) else len(content)
+    return response.status_code, size
+
+
+async def scenario_list(ctx: BenchContext) -> dict:
+    async def request(client, number):
+        return await _get(client, "/files/", cursor=ctx.random.randrange(ctx.rows), limit=50)
+    return await ctx.load(request)
+
+
+async def scenario_get(ctx: BenchContext) -> dict:
+    async def request(client, number):
+        return await _get(client, f"/file/{seed_name(ctx.random.randrange(ctx.rows))}")
+    return await ctx.load(request)
+
+
+async def scenario_search(ctx: BenchContext) -> dict:
+    async def request(client, number):
+        return await _get(client, "/search/", directory=seed_directory(ctx.random.randrange(ctx.rows)), limit=100)
+    return await ctx.load(request)
+
+
+async def scenario_search_text(ctx: BenchContext) -> dict:
+    async def request(client, number):
+        return await _get(client, "/search/text", q=f"group{ctx.random.randrange(COMMENT_GROUPS)}")
+    return await ctx.load(request)
+
+
+async def scenario_download(ctx: BenchContext) -> Optional[dict]:
+    if not ctx.files:
+        return None
+
+    async def request(client, number):
+        return await _download(client, seed_name(ctx.random.randrange(ctx.files)))
+    return await ctx.load(request)
+
+
+async def scenario_upload(ctx: BenchContext) -> dict:
+    async def request(client, number):
+        name = f"bench-{ctx.run_id}-{number:08d}.bin"
+        # Содержимое зависит от run_id: загрузки повторного запуска в той же рабочей директории
+        # не совпадают с загрузками прошлых запусков и не ускоряются дедупликацией
+        return await _upload(client, name, synthetic_content(number, SMALL_FILE_SIZE, seed=int(ctx.run_id, 16)))
+    return await ctx.load(request)
+
+
+async def scenario_upload_large(ctx: BenchContext) -> dict:
+    """Загрузка больших файлов по одному: замеряется пропускная способность, а не конкурентность."""
+    async def request(client, number):
+        name = f"bench-{ctx.run_id}-large{number}"
+        status, size = await _upload(client, f"{name}.bin", SyntheticFile(ctx.large_size, number))
+        if status == 200:
+            ctx.large_files.append(name)
+        return status, size
+    return await ctx.load(request, total=ctx.large_count, concurrency=1)
+
+
+async def scenario_download_large(ctx: BenchContext) -> Optional[dict]:
+    if not ctx.large_files:
+        return None
+
+    async def request(client, number):
+        return await _download(client, ctx.large_files[number % len(ctx.large_files)])
+    return await ctx.load(request, total=len(ctx.large_files), concurrency=1)
+
+
+def _catalog_count(directory: str) -> int:
+    with engine.connect() as connection:
+        return connection.scalar(select(func.count()).select_from(File).where(File.directory == directory))
+
+
+async def scenario_ingest(ctx: BenchContext) -> dict:
+    """
+    Массовое поступление файлов в наблюдаемую директорию мимо API: requests файлов записываются
+    на диск, затем ожидается, пока наблюдатель добавит их все в каталог.
+    """
+    directory = os.path.join(FILES_DIR, "ingest", ctx.run_id)
+    os.makedirs(directory)
+    normalized = normalize_directory(directory)
+    count = 0
+    with RssSampler(ctx.server_pid) as rss:
+        started = time.perf_counter()
+        for number in range(ctx.requests):
+            with open(os.path.join(directory, f"ingest-{ctx.run_id}-{number:08d}.bin"), "wb") as f:
+                f.write(synthetic_content(number, SMALL_FILE_SIZE))
+        written = time.perf_counter() - started
+        deadline = started + INGEST_TIMEOUT
+        while time.perf_counter() < deadline:
+            count = await asyncio.get_running_loop().run_in_executor(None, _catalog_count, normalized)
+            if count >= ctx.requests:
+                break
+            await asyncio.sleep(INGEST_POLL_INTERVAL)
+        wall = time.perf_counter() - started
+    return {
+        "requests": count,
+        "errors": ctx.requests - count,
+        "seconds": round(wall, 3),
+        "write_seconds": round(written, 3),
+        "files_per_s": round(count / wall, 1),
+        "mb_per_s": round(count * SMALL_FILE_SIZE / wall / 1024 ** 2, 2),
+        "peak_rss_mb": round(rss.peak / 1024 ** 2, 1),
+    }
+
+
+# Сценарии в порядке выполнения: скачивание больших файлов использует результат их загрузки
+SCENARIOS: Dict[str, Callable[[BenchContext], Awaitable[Optional[dict]]]] = {
+    "list": scenario_list,
+    "get": scenario_get,
+    "search": scenario_search,
+    "search_text": scenario_search_text,
+    "download": scenario_download,
+    "upload": scenario_upload,
+    "upload_large": scenario_upload_large,
+    "download_large": scenario_download_large,
+    "ingest": scenario_ingest,
+}
@@ -0,0 +1,94 @@
+import logging
+import os
+import random
+import time
+from datetime import datetime
+
+from sqlalchemy import func, insert, select
+
+from src.config import FILES_DIR
+from src.database import engine, init_db
+from src.models import File
+from src.utils import mtime_to_datetime, parent_directory
+
+# Записей в одном INSERT и в одной директории синтетического каталога
+SEED_BATCH_SIZE = 10000
+FILES_PER_DIRECTORY = 1000
+# Число групп в комментариях: по ним работает сценарий полнотекстового поиска
+COMMENT_GROUPS = 100
+
+SEED_DIR = os.path.join(FILES_DIR, "seed")
+
+
+def seed_name(index: int) -> str:
+    return f"seed{index:08d}"
+
+
+def seed_directory(index: int) -> str:
+    return os.path.join(SEED_DIR, f"d{index // FILES_PER_DIRECTORY:05d}")
+
+
+def seed_path(index: int) -> str:
+    return os.path.join(seed_directory(index), f"{seed_name(index)}.bin")
+
+
+def synthetic_content(index: int, size: int, seed: int = 0) -> bytes:
+    """
+    Несжимаемое содержимое, уникальное для каждого файла (одинаковое не схлопнется дедупликацией).
+    Определяется номером файла и seed: повторное заполнение каталога даёт те же файлы и контрольные суммы.
+    """
+    block = random.Random(seed + index).randbytes(min(size, 64 * 1024))
+    prefix = index.to_bytes(8, "big")
+    return (prefix + block * (size // max(len(block), 1) + 1))[:size]
+
+
+def seeded_count() -> int:
+    with engine.connect() as connection:
+        return connection.scalar(select(func.count()).select_from(File).where(File.name.like("seed%")))
+
+
+def seed_catalog(rows: int, files: int, file_size: int) -> dict:
+    """
+    Заполняет каталог rows синтетическими записями; для первых files из них создаются файлы на диске
+    размером file_size (их скачивает сценарий download). Записи помечены обработанными, чтобы конвейер
+    превью не ставил их в очередь при запуске приложения. Повторный запуск в той же директории
+    ничего не добавляет, если записей уже достаточно.
+    """
+    init_db()
+    existing = seeded_count()
+    if existing >= rows:
+        logging.info(f"Каталог уже содержит {existing} синтетических записей.")
+        return {"rows": existing, "files": files, "seconds": 0.0}
+
+    started = time.perf_counter()
+    files = min(files, rows)
+    now = datetime.utcnow()
+    for index in range(existing, files):
+        path = seed_path(index)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(synthetic_content(index, file_size))
+
+    for start in range(existing, rows, SEED_BATCH_SIZE):
+        batch = []
+        for index in range(start, min(start + SEED_BATCH_SIZE, rows)):
+            path = seed_path(index)
+            on_disk = index < files
+            batch.append({
+                "name": seed_name(index),
+                "extension": ".bin",
+                "size": file_size if on_disk else 0,
+                "path": path,
+                "directory": parent_directory(path),
+                "created_at": now,
+                "comment": f"synthetic file {index} group{index % COMMENT_GROUPS}",
+                "modified_at": mtime_to_datetime(os.stat(path).st_mtime_ns) if on_disk else None,
+                "mime_type": "application/octet-stream",
+                "processed_at": now,
+            })
+        with engine.begin() as connection:
+            connection.execute(insert(File.__table__), batch)
+        logging.info(f"Добавлено синтетических записей: {min(start + SEED_BATCH_SIZE, rows)} из {rows}.")
+
+    seconds = time.perf_counter() - started
+    return {"rows": rows, "files": files, "seconds": round(seconds, 2), "rows_per_s": round((rows - existing) / seconds)}
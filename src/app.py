@@ -1,110 +1,281 @@
+import asyncio
 import datetime
 import logging
 import os
 from threading import Thread
-from typing import List
+from typing import List, Optional, Union
 
-import aiofiles
-from fastapi import Depends, UploadFile, HTTPException
+from fastapi import Depends, Header, Query, UploadFile, HTTPException
 from fastapi import FastAPI
 from fastapi import File as F
-from fastapi import Response
-from sqlalchemy.orm import Session
-
-from src.crud import get_files, create_file, update_file, delete_file, download_file
-from src.database import SessionLocal, init_db
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.blob_store import discard_blobs, store_upload_file
+from src.bulk import bulk_delete, bulk_update, bulk_upload, collect_archive_files, stream_tar, stream_zip
+from src.cache import metadata_cache
+from src.config import FILES_DIR, MAX_UPLOAD_SIZE, RECONCILE_INTERVAL, SCHEMA_CHECK, WATCHER_ENABLED
+from src.crud import (
+    create_file,
+    delete_file,
+    directory_search_queries,
+    download_file,
+    file_list_query,
+    get_file,
+    get_file_metadata,
+    get_files,
+    preview_file,
+    search_files_fulltext,
+    search_files_in_directory,
+    update_file,
+)
+from src.database import AsyncSessionLocal, SessionLocal, async_engine, init_db
+from src.file_operations import FAILED, get_operation, recover_operations, run_operations, run_operations_cleanup
+from src import file_watcher
 from src.file_watcher import start_watching
-from src.models import File
-from src.schemas import FileCreate, FileUpdate, FileResponse
-
-# Инициализация базы данных
-init_db()
-
-app = FastAPI()
+from src.metrics import MetricsMiddleware, render_metrics
+from src.models import File, FileOperation
+from src.previews import preview_pipeline
+from src.profiler import profiler
+from src.rate_limit import RateLimitMiddleware
+from src import reconciler
+from src.reconciler import reconcile, run_reconciler
+from src.schemas import (
+    ArchiveRequest,
+    BulkDeleteRequest,
+    BulkItemResult,
+    BulkUpdateRequest,
+    CacheStats,
+    FileCreate,
+    FileOperationResponse,
+    FileResponse,
+    FileUpdate,
+    ReconcileReport,
+    SlowRequestProfile,
+    UploadChunkResponse,
+    UploadSessionCreate,
+    UploadSessionResponse,
+    WatcherStats,
+)
+from src.serialization import (
+    FILE_RESPONSE_COLUMNS,
+    FastJSONResponse,
+    file_list_response,
+    ndjson_response,
+    wants_ndjson,
+)
+from src.storage import LocalStorage, get_storage
+from src.upload_sessions import (
+    complete_upload_session,
+    create_upload_session,
+    delete_upload_session,
+    get_upload_session,
+    run_session_cleanup,
+    save_chunk,
+)
+
+# Ответы сериализуются через orjson (если установлен), списки файлов - без объектов ORM (src/serialization.py)
+app = FastAPI(default_response_class=FastJSONResponse)
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 
 
-# Зависимость для работы с базой данных
-def get_db():
-    db = SessionLocal()
-    try:
+# Запас на заголовки multipart и прочие поля формы сверх размера самого файла
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Отклоняет заведомо слишком большие загрузки по Content-Length ещё до разбора тела запроса.
+    ASGI-middleware, а не @app.middleware("http"): тот выполняет запрос в отдельной задаче и пропускает
+    тело потокового ответа через промежуточную очередь.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "POST" and scope["path"] == "/upload/":
+            content_length = Headers(scope=scope).get("content-length")
+            if content_length and content_length.isdigit() and int(content_length) > MAX_UPLOAD_SIZE + MULTIPART_OVERHEAD:
+                response = JSONResponse(status_code=413, content={"detail": "Превышен максимальный размер файла."})
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+app.add_middleware(UploadSizeLimitMiddleware)
+# Лимиты клиентов проверяются раньше ограничения размера и обработчиков: отказ не затрагивает базу данных и диск
+app.add_middleware(RateLimitMiddleware)
+# Внешний слой: метрики учитывают и отклонённые запросы
+app.add_middleware(MetricsMiddleware, profiler=profiler if profiler.enabled else None)
+
+
+# Зависимость для работы с базой данных (асинхронная сессия из пула соединений)
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
 # Фоновая задача для наблюдения за директорией
 def start_file_monitoring():
-    directory_to_watch = "src/files"
-    db_session = SessionLocal()
+    if not isinstance(get_storage(), LocalStorage):
+        logging.info("Мониторинг директории отключён: файлы хранятся не на локальной файловой системе.")
+        return
 
-    # Запускаем мониторинг с помощью watchdog
-    start_watching(directory_to_watch, db_session)
+    directory_to_watch = FILES_DIR
+
+    # Запускаем мониторинг с помощью watchdog; изменения записываются через синхронные сессии SessionLocal
+    start_watching(directory_to_watch, SessionLocal)
+
+
+@app.on_event("startup")
+async def check_schema():
+    # Недостающие таблицы и столбцы создаются при запуске, а не при импорте приложения;
+    # SCHEMA_CHECK=0 - схему обновляют отдельно, и запуск не ждёт проверки
+    if SCHEMA_CHECK:
+        await run_in_threadpool(init_db)
 
 
 # Фоновая задача для запуска мониторинга
 @app.on_event("startup")
 def startup_event():
+    if not WATCHER_ENABLED:
+        logging.info("Мониторинг директории отключён (WATCHER_ENABLED=0).")
+        return
     observer_thread = Thread(target=start_file_monitoring, daemon=True)
     observer_thread.start()
     logging.info("Мониторинг директории запущен.")
 
 
+@app.on_event("startup")
+async def start_session_cleanup():
+    # Периодическая очистка просроченных сессий загрузки по частям
+    asyncio.create_task(run_session_cleanup())
+
+
+@app.on_event("startup")
+async def start_file_operations():
+    # Перемещения и удаления, прерванные остановкой приложения, выполняются заново
+    await recover_operations()
+    asyncio.create_task(run_operations_cleanup())
+
+
+@app.on_event("startup")
+async def start_preview_pipeline():
+    # Метаданные и превью извлекаются в пуле процессов; при запуске обрабатываются пропущенные файлы
+    preview_pipeline.start()
+
+
+@app.on_event("startup")
+async def start_reconciler():
+    # Фоновая сверка каталога с хранилищем вместо проверок на диске при каждом чтении
+    if RECONCILE_INTERVAL > 0:
+        asyncio.create_task(run_reconciler())
+
+
+@app.on_event("startup")
+async def start_cache_invalidation():
+    # Инвалидации из потоков наблюдателя и сверки передаются в общий кеш через цикл событий приложения
+    metadata_cache.loop = asyncio.get_running_loop()
+    if metadata_cache.shared is not None:
+        asyncio.create_task(metadata_cache.listen_invalidations())
+
+
+@app.on_event("shutdown")
+async def close_db_connections():
+    # Соединения aiosqlite работают в отдельных потоках и должны быть закрыты явно
+    await async_engine.dispose()
+
+
+@app.on_event("startup")
+async def start_profiler():
+    # Выборочное профилирование медленных запросов включается PROFILE_SLOW_REQUESTS
+    if profiler.enabled:
+        profiler.start()
+
+
+@app.on_event("shutdown")
+def stop_preview_pipeline():
+    preview_pipeline.stop()
+    profiler.stop()
+
+
 @app.get("/files/", response_model=List[FileResponse])
-def list_files(skip: int = 0, limit: int = 10, db: Session = Depends(get_db)):
+async def list_files(skip: int = Query(0, ge=0), limit: Optional[int] = Query(None, ge=1, le=1000),
+                     cursor: Optional[int] = None,
+                     accept: Optional[str] = Header(None), db: AsyncSession = Depends(get_db)):
     """
-    Получить список файлов с возможностью пагинации.
+    Получить список файлов с возможностью пагинации (по умолчанию 10 файлов).
+    Для больших каталогов используйте курсор: значение заголовка X-Next-Cursor передаётся
+    в параметре cursor следующего запроса. Параметр skip оставлен для совместимости.
+    С заголовком Accept: application/x-ndjson файлы передаются потоком, по записи в строке;
+    без limit - все файлы после cursor.
     """
-    return get_files(db, skip=skip, limit=limit)
+    if wants_ndjson(accept):
+        return ndjson_response([file_list_query(skip, cursor, FILE_RESPONSE_COLUMNS)], limit)
+    limit = 10 if limit is None else limit
+    rows = await get_files(db, skip=skip, limit=limit, after_id=cursor, columns=FILE_RESPONSE_COLUMNS)
+    return file_list_response(rows, limit)
 
 
 @app.get("/file/{file_name}", response_model=FileResponse)
-def get_file_by_name(file_name: str, db: Session = Depends(get_db)):
+async def get_file_by_name(file_name: str, db: AsyncSession = Depends(get_db)):
     """
-    Получить файл по имени.
+    Получить файл по имени (метаданные часто запрашиваемых файлов отдаются из кеша).
     """
-    db_file = db.query(File).filter(File.name == file_name).first()
-
-    if not db_file:
+    cached = await get_file_metadata(db, file_name)
+    if cached is None:
         raise HTTPException(status_code=404, detail="Файл не найден")
-
-    return db_file
+    return cached
 
 
 @app.post("/upload/", response_model=FileResponse)
-async def upload_file(uploaded_file: UploadFile = F(...), comment: str = None, db: Session = Depends(get_db)):
+async def upload_file(uploaded_file: UploadFile = F(...), comment: str = None, compression: Optional[str] = None,
+                      db: AsyncSession = Depends(get_db)):
     """
     Загрузить новый файл. Запрещено загружать файл с уже существующим именем.
+    compression - сжатие содержимого в хранилище (gzip, zstd или none); по умолчанию выбирается по расширению.
     """
     try:
         # Получаем имя файла и расширение
         file_base_name, file_extension = os.path.splitext(uploaded_file.filename)
-        directory = "src/files"  # Директория для хранения файлов
+        directory = FILES_DIR  # Директория для хранения файлов
         file_location = os.path.join(directory, uploaded_file.filename)
 
         # Проверка на существование файла с таким именем в базе данных
-        existing_file = db.query(File).filter(File.name == file_base_name).first()
+        existing_file = await db.scalar(select(File.id).where(File.name == file_base_name).limit(1))
         if existing_file:
             raise HTTPException(status_code=400, detail="Файл с таким именем уже существует.")
 
-        os.makedirs(directory, exist_ok=True)
-
-        # Сохраняем файл на диск
-        async with aiofiles.open(file_location, "wb") as f:
-            await f.write(await uploaded_file.read())
+        # Размещаем содержимое в хранилище блобов; уже известное содержимое повторно не записывается
+        blob = await store_upload_file(db, uploaded_file, compression=compression)
 
         # Создаем запись о файле в базе данных
         file_data = FileCreate(
             name=file_base_name,
             extension=file_extension,
-            size=uploaded_file.size,
+            size=blob.size,
             path=directory,  # Сохраняем только директорию
             comment=comment,
+            checksum=blob.hash,
+            encoding=blob.encoding,
+            stored_size=blob.stored_size,
             created_at=datetime.datetime.utcnow()
         )
-        file_record = create_file(db, file_data, file_path=file_location)
+        sha256 = blob.hash
+        try:
+            file_record = await create_file(db, file_data, file_path=file_location, blob_hash=sha256)
+        except BaseException:
+            # Запись о файле не создана: ссылка на содержимое откатывается, объект без ссылок удаляется
+            await db.rollback()
+            await discard_blobs(db, [sha256])
+            raise
         logging.info(f"Файл '{file_record.name}{file_record.extension}' загружен и сохранен в базе данных.")
         return file_record
 
@@ -116,33 +287,48 @@ async def upload_file(uploaded_file: UploadFile = F(...), comment: str = None, d
         raise HTTPException(status_code=500, detail=f"Ошибка при загрузке файла: {str(e)}")
 
 
-@app.put("/file/{file_name}", response_model=FileResponse)
-def update_file_by_name(file_name: str, file_update: FileUpdate, db: Session = Depends(get_db)):
+def accept_operation(response: Response, operation: FileOperation) -> FileOperation:
+    """Операция не завершилась за FILE_OPS_WAIT секунд: отвечаем 202 со ссылкой на её состояние."""
+    response.status_code = 202
+    response.headers["Location"] = f"/operations/{operation.id}"
+    return operation
+
+
+@app.put("/file/{file_name}", response_model=Union[FileResponse, FileOperationResponse])
+async def update_file_by_name(file_name: str, file_update: FileUpdate, response: Response,
+                              db: AsyncSession = Depends(get_db)):
     """
     Обновить информацию о файле. Запрещено изменять имя файла на уже существующее.
+    Если перемещение файла на диске не завершилось быстро, возвращается 202 и состояние операции,
+    которое можно отслеживать по адресу из заголовка Location.
     """
-    db_file = db.query(File).filter(File.name == file_name).first()
-
-    if db_file is None:
-        raise HTTPException(status_code=404, detail="Файл не найден")
+    db_file = await get_file(db, file_name)
 
     # Проверка на наличие файла с таким именем в базе данных (кроме самого обновляемого файла)
     if file_update.name and file_update.name != db_file.name:
-        existing_file = db.query(File).filter(File.name == file_update.name).first()
+        existing_file = await db.scalar(select(File.id).where(File.name == file_update.name).limit(1))
         if existing_file:
             raise HTTPException(status_code=400, detail="Файл с таким именем уже существует.")
 
-    updated_file = update_file(db, db_file, file_update)  # Передаем обновленные данные файла
-    logging.info(f"Файл '{db_file.name}' обновлён.")
+    updated_file, operation = await update_file(db, db_file, file_update)  # Передаем обновленные данные файла
+    if operation:
+        status = (await run_operations([operation]))[operation.id]
+        if status is None:
+            logging.info(f"Перемещение файла '{updated_file.name}' продолжается в фоне.")
+            return accept_operation(response, operation)
+        if status == FAILED:
+            raise HTTPException(status_code=500, detail="Ошибка при перемещении файла на диске.")
+    logging.info(f"Файл '{updated_file.name}' обновлён.")
     return updated_file
 
 
-@app.delete("/file/{file_name}", response_model=dict)
-def delete_file_by_name(file_name: str, db: Session = Depends(get_db)):
+@app.delete("/file/{file_name}", response_model=Union[dict, FileOperationResponse])
+async def delete_file_by_name(file_name: str, response: Response, db: AsyncSession = Depends(get_db)):
     """
     Удалить файл по имени.
+    Если удаление файла с диска не завершилось быстро, возвращается 202 и состояние операции.
     """
-    db_file = db.query(File).filter(File.name == file_name).first()
+    db_file = await db.scalar(select(File).where(File.name == file_name).limit(1))
 
     if db_file:
         # Формируем полный путь к файлу
@@ -151,20 +337,17 @@ def delete_file_by_name(file_name: str, db: Session = Depends(get_db)):
         # Логируем полный путь к файлу
         logging.info(f"Попытка удалить файл по пути: {file_path}")
 
-        # Проверяем существование файла на диске
-        if os.path.exists(file_path):
-            try:
-                os.remove(file_path)  # Удаляем файл с диска
-                logging.info(f"Файл {file_path} успешно удалён.")
-            except Exception as e:
-                logging.error(f"Ошибка при удалении файла {file_path}: {e}")
-                raise HTTPException(status_code=500, detail="Ошибка при удалении файла с диска.")
-        else:
-            logging.warning(f"Файл {file_path} не найден на диске. Удаление записи из базы данных продолжается.")
-
-        # Удаление записи из базы данных
-        delete_file(db, db_file.id)
+        # Запись удаляется сразу; содержимое из хранилища блобов удаляется вместе с последней ссылкой,
+        # а файл, лежащий по своему пути, - фоновой операцией из журнала
+        operation = await delete_file(db, db_file.id)
         logging.info(f"Запись о файле '{file_name}' была удалена из базы данных.")
+        if operation:
+            status = (await run_operations([operation]))[operation.id]
+            if status is None:
+                logging.info(f"Удаление файла {file_path} продолжается в фоне.")
+                return accept_operation(response, operation)
+            if status == FAILED:
+                raise HTTPException(status_code=500, detail="Ошибка при удалении файла с диска.")
         return {"message": f"Файл '{file_name}' был успешно удалён"}
 
     # Если файл не найден в базе данных
@@ -172,22 +355,206 @@ def delete_file_by_name(file_name: str, db: Session = Depends(get_db)):
 
 
 @app.get("/search/", response_model=List[FileResponse])
-def search_files(directory: str, db: Session = Depends(get_db)):
+async def search_files(directory: str, recursive: bool = False, extension: Optional[str] = None,
+                       min_size: Optional[int] = None, max_size: Optional[int] = None,
+                       created_after: Optional[datetime.datetime] = None, created_before: Optional[datetime.datetime] = None,
+                       cursor: Optional[int] = None, limit: Optional[int] = Query(None, ge=1, le=1000),
+                       accept: Optional[str] = Header(None), db: AsyncSession = Depends(get_db)):
     """
-    Поиск файлов в базе данных по указанной директории.
+    Поиск файлов в базе данных по указанной директории (по умолчанию 100 файлов на странице).
+    recursive=true - искать во всех поддиректориях. Дополнительно можно фильтровать по расширению,
+    размеру (min_size/max_size, байты) и дате создания (created_after/created_before).
+    Следующая страница запрашивается с cursor из заголовка X-Next-Cursor.
+    С заголовком Accept: application/x-ndjson найденные файлы передаются потоком, по записи в строке;
+    без limit - все найденные файлы после cursor (пустой ответ вместо 404, если ничего не найдено).
     """
-    found_files = db.query(File).filter(File.path.like(f"%{directory}%")).all()
-
-    if not found_files:
+    filters = dict(recursive=recursive, extension=extension, min_size=min_size, max_size=max_size,
+                   created_after=created_after, created_before=created_before, after_id=cursor)
+    if wants_ndjson(accept):
+        queries = await directory_search_queries(db, directory, columns=FILE_RESPONSE_COLUMNS, **filters)
+        return ndjson_response(queries, limit)
+
+    limit = 100 if limit is None else limit
+    found_files = await search_files_in_directory(db, directory, limit=limit, columns=FILE_RESPONSE_COLUMNS,
+                                                  **filters)
+    if not found_files and cursor is None:
         raise HTTPException(status_code=404, detail="Файлы в указанной директории не найдены")
 
     logging.info(f"Найдено {len(found_files)} файлов в директории '{directory}'.")
-    return found_files
+    return file_list_response(found_files, limit)
+
+
+@app.get("/search/text", response_model=List[FileResponse])
+async def search_files_text(q: str, limit: int = Query(20, ge=1, le=100), offset: int = Query(0, ge=0),
+                            db: AsyncSession = Depends(get_db)):
+    """
+    Полнотекстовый поиск файлов по фрагментам имени и комментария.
+    Каждое слово запроса ищется по началу слова, результаты отсортированы по релевантности.
+    """
+    rows = await search_files_fulltext(db, q, limit=limit, offset=offset, columns=FILE_RESPONSE_COLUMNS)
+    return file_list_response(rows)
 
 
 @app.get("/download/{file_name}", response_class=Response)
-def download_file_endpoint(file_name: str, db: Session = Depends(get_db)):
+async def download_file_endpoint(file_name: str, request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    Скачивание файла по имени. Поддерживаются заголовки Range, If-Range,
+    If-None-Match и If-Modified-Since.
+    """
+    return await download_file(db, file_name, request.headers)
+
+
+@app.get("/preview/{file_name}", response_class=Response)
+async def preview_file_endpoint(file_name: str, request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    Превью файла (JPEG): для изображений и, при установленном PyMuPDF, для первой страницы PDF.
+    Поддерживается If-None-Match; пока файл обрабатывается, возвращается 404.
+    """
+    return await preview_file(db, file_name, request.headers)
+
+
+@app.post("/bulk/upload/", response_model=List[BulkItemResult])
+async def bulk_upload_files(uploaded_files: List[UploadFile] = F(...), comment: str = None,
+                            compression: Optional[str] = None, db: AsyncSession = Depends(get_db)):
+    """
+    Загрузить несколько файлов одним запросом. Результат возвращается по каждому файлу в порядке загрузки:
+    ошибка в одном файле (занятое имя, превышение размера) не мешает сохранить остальные.
+    """
+    return await bulk_upload(db, uploaded_files, comment, compression=compression)
+
+
+@app.post("/bulk/delete/", response_model=List[BulkItemResult])
+async def bulk_delete_files(data: BulkDeleteRequest, db: AsyncSession = Depends(get_db)):
+    """
+    Удалить несколько файлов по именам одной транзакцией. Для отсутствующих файлов возвращается статус 404.
+    """
+    return await bulk_delete(db, data.names)
+
+
+@app.post("/bulk/update/", response_model=List[BulkItemResult])
+async def bulk_update_files(data: BulkUpdateRequest, db: AsyncSession = Depends(get_db)):
+    """
+    Переименовать, переместить или изменить комментарий нескольких файлов одной транзакцией.
+    Каждый элемент задаёт текущее имя файла (file_name) и новые значения полей, как в PUT /file/{file_name}.
+    """
+    return await bulk_update(db, data.items)
+
+
+@app.post("/archive/", response_class=StreamingResponse)
+async def download_archive(data: ArchiveRequest, db: AsyncSession = Depends(get_db)):
+    """
+    Скачать несколько файлов одним архивом (zip или tar) по списку имён или по директории.
+    Архив формируется на лету по мере отправки, без временных файлов на сервере.
+    """
+    db_files = await collect_archive_files(db, data.names, data.directory, data.recursive)
+    if data.format == "tar":
+        body, media_type = stream_tar(db_files), "application/x-tar"
+    else:
+        body, media_type = stream_zip(db_files), "application/zip"
+    logging.info(f"Архив {data.format}: {len(db_files)} файлов.")
+    return StreamingResponse(body, media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="files.{data.format}"'})
+
+
+@app.post("/uploads/", response_model=UploadSessionResponse, status_code=201)
+async def create_upload_session_endpoint(data: UploadSessionCreate, db: AsyncSession = Depends(get_db)):
+    """
+    Создать сессию загрузки файла по частям. Части можно отправлять в любом порядке и параллельно.
+    """
+    return await create_upload_session(db, data)
+
+
+@app.get("/uploads/{session_id}", response_model=UploadSessionResponse)
+async def get_upload_session_endpoint(session_id: str, db: AsyncSession = Depends(get_db)):
+    """
+    Получить состояние сессии загрузки, в том числе список принятых частей для возобновления.
+    """
+    return await get_upload_session(db, session_id, active=False)
+
+
+@app.put("/uploads/{session_id}/chunks/{index}", response_model=UploadChunkResponse)
+async def upload_chunk(session_id: str, index: int, request: Request,
+                       x_chunk_sha256: str = Header(None), db: AsyncSession = Depends(get_db)):
+    """
+    Загрузить часть файла с номером index (с нуля). Тело запроса - сырые байты части,
+    заголовок X-Chunk-SHA256 - необязательная контрольная сумма части.
+    """
+    upload_session = await get_upload_session(db, session_id)
+    return await save_chunk(db, upload_session, index, request.stream(), x_chunk_sha256)
+
+
+@app.post("/uploads/{session_id}/complete", response_model=FileResponse)
+async def complete_upload(session_id: str, db: AsyncSession = Depends(get_db)):
+    """
+    Завершить сессию: собрать файл из частей и создать запись о нём.
+    """
+    upload_session = await get_upload_session(db, session_id)
+    return await complete_upload_session(db, upload_session)
+
+
+@app.delete("/uploads/{session_id}", response_model=dict)
+async def abort_upload(session_id: str, db: AsyncSession = Depends(get_db)):
+    """
+    Отменить сессию загрузки и удалить принятые части.
+    """
+    upload_session = await get_upload_session(db, session_id, active=False)
+    await delete_upload_session(db, upload_session)
+    return {"message": f"Сессия загрузки '{session_id}' отменена"}
+
+
+@app.get("/operations/{operation_id}", response_model=FileOperationResponse)
+async def get_operation_status(operation_id: int, db: AsyncSession = Depends(get_db)):
+    """
+    Состояние фоновой операции перемещения или удаления файла: pending, done или failed.
+    """
+    return await get_operation(db, operation_id)
+
+
+@app.post("/reconcile/", response_model=ReconcileReport)
+async def reconcile_now():
+    """
+    Запустить сверку каталога с хранилищем немедленно и получить отчёт о внесённых исправлениях.
+    """
+    return await reconcile()
+
+
+@app.get("/reconcile/", response_model=Optional[ReconcileReport])
+async def get_reconcile_report():
+    """
+    Отчёт о последней фоновой сверке каталога с хранилищем.
+    """
+    return reconciler.last_report
+
+
+@app.get("/watcher/", response_model=Optional[WatcherStats])
+async def get_watcher_stats():
+    """
+    Счётчики конвейера наблюдателя за директорией: очередь событий, ожидание записи файлов, пакеты изменений.
+    """
+    return file_watcher.pipeline.stats if file_watcher.pipeline else None
+
+
+@app.get("/cache/", response_model=CacheStats)
+async def get_cache_stats():
+    """
+    Счётчики кеша метаданных файлов: попадания, промахи, вытеснения и инвалидации.
+    """
+    return metadata_cache.stats
+
+
+@app.get("/metrics", response_class=Response, include_in_schema=False)
+async def get_metrics():
+    """
+    Метрики в формате Prometheus: длительность и объём запросов, SQL-запросы, наблюдатель, кеш и фоновые очереди.
+    """
+    data, content_type = render_metrics()
+    return Response(content=data, media_type=content_type)
+
+
+@app.get("/profiles/", response_model=List[SlowRequestProfile])
+async def get_slow_request_profiles():
     """
-    Скачивание файла по имени.
+    Профили последних медленных запросов (PROFILE_SLOW_REQUESTS): стеки вызовов в свёрнутом формате
+    flame graph с числом выборок; "cpu" - код выполнялся в цикле событий, "wait" - запрос ожидал.
     """
-    return download_file(db, file_name)
+    return list(profiler.recent)
@@ -0,0 +1,132 @@
+import logging
+import os
+from typing import Iterable, Optional
+
+from fastapi import HTTPException, UploadFile
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from src.compression import CompressingStream, choose_encoding
+from src.config import BLOBS_DIR, MAX_UPLOAD_SIZE
+from src.models import Blob
+from src.storage import get_storage
+from src.utils import hash_stream, iter_upload, temp_key
+
+
+def blob_path(sha256: str) -> str:
+    """Ключ содержимого в хранилище: .blobs/ab/cd/abcd..."""
+    return os.path.join(BLOBS_DIR, sha256[:2], sha256[2:4], sha256)
+
+
+def _insert_blob(db: AsyncSession):
+    """INSERT записи о блобе, который ничего не делает, если такое содержимое уже записано."""
+    if db.bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(Blob).on_conflict_do_nothing(index_elements=[Blob.hash])
+
+
+async def acquire_blob(db: AsyncSession, sha256: str, size: int, source_key: Optional[str] = None,
+                       encoding: Optional[str] = None, stored_size: Optional[int] = None) -> Blob:
+    """
+    Добавляет ссылку на содержимое с хешем sha256.
+
+    Если такое содержимое уже есть, увеличивается счётчик ссылок, а временный объект source_key
+    удаляется. Иначе source_key переносится в хранилище под ключом содержимого;
+    encoding и stored_size описывают сжатие объекта source_key (см. src/compression.py).
+    Транзакцию фиксирует вызывающий код вместе с созданием записи о файле; если она откатывается,
+    перенесённый объект удаляет discard_blobs.
+    """
+    storage = get_storage()
+    if not await has_blob(db, sha256):
+        if source_key is None:
+            raise FileNotFoundError(f"Содержимое {sha256} отсутствует в хранилище")
+        await storage.move(source_key, blob_path(sha256))
+        # Конфликт (такое же содержимое параллельно загрузили в другом запросе) не прерывает транзакцию
+        # вызывающего кода: в этом случае добавляется ссылка на уже записанный блоб
+        result = await db.execute(_insert_blob(db).values(
+            hash=sha256, size=size, encoding=encoding,
+            stored_size=size if stored_size is None else stored_size, refcount=1,
+        ))
+        source_key = None
+        if result.rowcount:
+            return await _get_blob(db, sha256)
+
+    if source_key is not None:
+        await storage.delete(source_key)
+    await db.execute(update(Blob).where(Blob.hash == sha256).values(refcount=Blob.refcount + 1))
+    return await _get_blob(db, sha256)
+
+
+async def _get_blob(db: AsyncSession, sha256: str) -> Blob:
+    blob = await db.get(Blob, sha256)
+    await db.refresh(blob)
+    return blob
+
+
+async def has_blob(db: AsyncSession, sha256: str) -> bool:
+    return await db.scalar(select(Blob.hash).where(Blob.hash == sha256)) is not None
+
+
+async def release_blob(db: AsyncSession, sha256: str) -> bool:
+    """
+    Уменьшает счётчик ссылок на содержимое; когда исчезает последняя ссылка, запись о блобе удаляется.
+    Транзакцию фиксирует вызывающий код, после чего удаляет объект через discard_blobs.
+    Возвращает True, если запись о блобе была удалена.
+    """
+    await db.execute(update(Blob).where(Blob.hash == sha256).values(refcount=Blob.refcount - 1))
+    result = await db.execute(
+        delete(Blob).where(Blob.hash == sha256, Blob.refcount <= 0).execution_options(synchronize_session=False)
+    )
+    return bool(result.rowcount)
+
+
+async def discard_blobs(db: AsyncSession, hashes: Iterable[str]) -> None:
+    """
+    Удаляет из хранилища объекты содержимого, для которых нет записи о блобе: после фиксации удаления
+    последней ссылки (release_blob) или после отката транзакции, в которой ссылку добавил acquire_blob.
+    """
+    hashes = set(hashes)
+    if not hashes:
+        return
+    # Содержимое могли загрузить заново между фиксацией и удалением объекта
+    kept = set(await db.scalars(select(Blob.hash).where(Blob.hash.in_(hashes))))
+    storage = get_storage()
+    for sha256 in hashes - kept:
+        if await storage.delete(blob_path(sha256)):
+            logging.info(f"Содержимое {sha256} удалено из хранилища: ссылок не осталось.")
+
+
+async def store_upload_file(db: AsyncSession, upload: UploadFile, max_size: int = MAX_UPLOAD_SIZE,
+                            compression: Optional[str] = None) -> Blob:
+    """
+    Размещает загруженный файл в хранилище и добавляет ссылку на его содержимое.
+
+    Сначала содержимое только хешируется; если оно уже известно, запись в хранилище не выполняется.
+    Новое содержимое потоково записывается (и сжимается, см. choose_encoding) во временный объект
+    и переносится под ключ содержимого.
+    """
+    if upload.size is not None and upload.size > max_size:
+        raise HTTPException(status_code=413, detail="Превышен максимальный размер файла.")
+
+    await upload.seek(0)
+    size, sha256 = await run_in_threadpool(hash_stream, upload.file, max_size)
+    encoding = choose_encoding(upload.filename or "", size, compression)
+    if await has_blob(db, sha256):
+        try:
+            return await acquire_blob(db, sha256, size)
+        except FileNotFoundError:
+            pass  # Последняя ссылка была удалена параллельно, записываем содержимое заново
+
+    await upload.seek(0)
+    storage = get_storage()
+    tmp_key = temp_key()
+    stream = CompressingStream(iter_upload(upload), encoding)
+    try:
+        await storage.write(tmp_key, stream)
+    except BaseException:
+        await storage.delete(tmp_key)
+        raise
+    return await acquire_blob(db, sha256, size, tmp_key, stream.encoding, stream.stored_size)
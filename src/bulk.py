@@ -0,0 +1,422 @@
+import logging
+import os
+import tarfile
+import time
+import zipfile
+from collections import Counter
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from fastapi import HTTPException, UploadFile
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from src.blob_store import acquire_blob, blob_path, discard_blobs, has_blob
+from src.cache import metadata_cache
+from src.compression import CompressingStream, choose_encoding, read_content
+from src.config import BULK_MAX_ITEMS, FILES_DIR, MAX_UPLOAD_SIZE
+from src.crud import apply_file_update, create_file, search_files_in_directory, stored_path
+from src.file_operations import FAILED, add_operation, run_operations
+from src.models import Blob, File, FileOperation
+from src.previews import delete_previews, preview_pipeline
+from src.schemas import BulkUpdateItem, FileCreate
+from src.storage import get_storage
+from src.utils import hash_stream, iter_upload, temp_key, to_utc
+
+
+def check_batch_size(count: int) -> None:
+    if count > BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Не больше {BULK_MAX_ITEMS} элементов в одном запросе.")
+
+
+# Результаты по отдельным файлам собираются словарями: запись File в поле file
+# приводится к BulkItemResult/FileResponse при формировании ответа (orm_mode)
+def _ok(name: str, db_file: Optional[File] = None) -> dict:
+    return {"name": name, "status": 200, "file": db_file}
+
+
+def _error(name: str, status: int, detail: str) -> dict:
+    return {"name": name, "status": status, "detail": detail}
+
+
+async def _files_by_name(db: AsyncSession, names) -> Tuple[Dict[str, File], Set[str]]:
+    """
+    Записи о файлах с указанными именами (имя -> запись) и имена, которым соответствует больше одной записи:
+    элементы запроса с такими именами отклоняются, а не применяются к произвольной из записей.
+    """
+    found: Dict[str, List[File]] = {}
+    for db_file in await db.scalars(select(File).where(File.name.in_(set(names)))):
+        found.setdefault(db_file.name, []).append(db_file)
+    ambiguous = {name for name, db_files in found.items() if len(db_files) > 1}
+    return {name: db_files[0] for name, db_files in found.items() if name not in ambiguous}, ambiguous
+
+
+def _lookup_error(name: str, ambiguous: Set[str]) -> dict:
+    if name in ambiguous:
+        return _error(name, 409, "Имени соответствует несколько файлов.")
+    return _error(name, 404, "Файл не найден")
+
+
+async def _report_operations(results: List[dict], operations: Dict[int, FileOperation], failure: str) -> None:
+    """
+    Запускает операции с файлами из журнала (индекс результата -> операция) и отражает их состояние
+    в результатах: 202 - операция продолжается в фоне, 500 - операция не удалась.
+    """
+    statuses = await run_operations(list(operations.values()))
+    for index, operation in operations.items():
+        status = statuses[operation.id]
+        if status is None:
+            results[index].update(status=202, detail=f"Операция продолжается: /operations/{operation.id}")
+        elif status == FAILED:
+            results[index].update(status=500, detail=failure, file=None)
+
+
+async def bulk_upload(db: AsyncSession, uploads: List[UploadFile], comment: Optional[str] = None,
+                      max_size: int = MAX_UPLOAD_SIZE, compression: Optional[str] = None) -> List[dict]:
+    """
+    Загружает несколько файлов одной транзакцией.
+
+    Содержимое сначала хешируется; уже известное (в базе или в этом же запросе) повторно не записывается,
+    новое пишется (со сжатием, см. src/compression.py) во временные объекты.
+    Затем ссылки на блобы и записи о файлах создаются одним COMMIT.
+    Если транзакция не прошла из-за параллельного изменения, файлы сохраняются по одному.
+    """
+    check_batch_size(len(uploads))
+    results: Dict[int, dict] = {}
+    names = [os.path.splitext(upload.filename or "")[0] for upload in uploads]
+    existing = set(await db.scalars(select(File.name).where(File.name.in_(set(names)))))
+    seen = set()
+    staged = []  # (индекс, загрузка, размер, SHA-256)
+    for index, (upload, name) in enumerate(zip(uploads, names)):
+        if not name:
+            results[index] = _error(upload.filename or "", 400, "Некорректное имя файла.")
+        elif name in existing or name in seen:
+            results[index] = _error(upload.filename, 400, "Файл с таким именем уже существует.")
+        elif upload.size is not None and upload.size > max_size:
+            results[index] = _error(upload.filename, 413, "Превышен максимальный размер файла.")
+        else:
+            seen.add(name)
+            await upload.seek(0)
+            try:
+                size, sha256 = await run_in_threadpool(hash_stream, upload.file, max_size)
+            except HTTPException as e:
+                results[index] = _error(upload.filename, e.status_code, e.detail)
+                continue
+            staged.append((index, upload, size, sha256))
+
+    storage = get_storage()
+    hashes = {sha256 for _, _, _, sha256 in staged}
+    # SHA-256 -> (сжатие, размер в хранилище) для известного и нового содержимого
+    layouts: Dict[str, Tuple[Optional[str], int]] = {
+        row.hash: (row.encoding, row.size if row.stored_size is None else row.stored_size)
+        for row in await db.execute(
+            select(Blob.hash, Blob.encoding, Blob.size, Blob.stored_size).where(Blob.hash.in_(hashes))
+        )
+    } if hashes else {}
+    known = set(layouts)
+    temp_keys: Dict[str, str] = {}  # SHA-256 нового содержимого -> временный объект
+    try:
+        for _, upload, size, sha256 in staged:
+            if sha256 in known or sha256 in temp_keys:
+                continue
+            stream = CompressingStream(iter_upload(upload), choose_encoding(upload.filename, size, compression))
+            await upload.seek(0)
+            temp_keys[sha256] = temp_key()
+            await storage.write(temp_keys[sha256], stream)
+            layouts[sha256] = (stream.encoding, stream.stored_size)
+
+        created = await _commit_uploads(db, staged, known, temp_keys, layouts, comment)
+        if created is None:
+            created = await _upload_one_by_one(db, staged, temp_keys, layouts, comment)
+            # Содержимое файлов, которые не удалось сохранить, осталось в хранилище без записи о блобе
+            await discard_blobs(db, temp_keys)
+    except BaseException:
+        await db.rollback()
+        await discard_blobs(db, temp_keys)
+        raise
+    finally:
+        for key in temp_keys.values():
+            await storage.delete(key)  # Перенесённые в хранилище блобов объекты уже не существуют
+
+    results.update(created)
+    logging.info(f"Пакетная загрузка: сохранено {sum(r['status'] == 200 for r in created.values())} из {len(uploads)} файлов.")
+    return [results[index] for index in range(len(uploads))]
+
+
+async def _commit_uploads(db: AsyncSession, staged, known, temp_keys, layouts, comment) -> Optional[Dict[int, dict]]:
+    """Создаёт все ссылки на блобы и записи о файлах одной транзакцией; None, если она не удалась."""
+    storage = get_storage()
+    references = Counter(sha256 for _, _, _, sha256 in staged)
+    sizes = {sha256: size for _, _, size, sha256 in staged}
+    try:
+        for sha256, count in references.items():
+            if sha256 in known:
+                await db.execute(update(Blob).where(Blob.hash == sha256).values(refcount=Blob.refcount + count))
+            else:
+                await storage.move(temp_keys[sha256], blob_path(sha256))
+                encoding, stored_size = layouts[sha256]
+                db.add(Blob(hash=sha256, size=sizes[sha256], encoding=encoding, stored_size=stored_size,
+                            refcount=count))
+        db_files = {}
+        for index, upload, size, sha256 in staged:
+            name, extension = os.path.splitext(upload.filename)
+            encoding, stored_size = layouts[sha256]
+            db_files[index] = File(name=name, extension=extension, size=size,
+                                   path=os.path.join(FILES_DIR, upload.filename), comment=comment,
+                                   checksum=sha256, blob_hash=sha256, encoding=encoding, stored_size=stored_size)
+        db.add_all(db_files.values())
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        return None
+    await metadata_cache.invalidate(*(db_file.name for db_file in db_files.values()))
+    preview_pipeline.schedule(db_file.id for db_file in db_files.values())
+    return {index: _ok(upload.filename, db_files[index]) for index, upload, _, _ in staged}
+
+
+async def _upload_one_by_one(db: AsyncSession, staged, temp_keys, layouts, comment) -> Dict[int, dict]:
+    storage = get_storage()
+    results = {}
+    for index, upload, size, sha256 in staged:
+        name, extension = os.path.splitext(upload.filename)
+        source_key = temp_keys.get(sha256)
+        try:
+            if source_key is not None and not await storage.exists(source_key):
+                source_key = None  # Неудавшаяся транзакция уже перенесла содержимое в хранилище блобов
+            if source_key is None and not await has_blob(db, sha256):
+                source_key = temp_key()
+                await storage.move(blob_path(sha256), source_key)
+            blob = await acquire_blob(db, sha256, size, source_key, *layouts[sha256])
+            db_file = await create_file(db, FileCreate(
+                name=name, extension=extension, size=size, path=FILES_DIR, comment=comment, checksum=sha256,
+                encoding=blob.encoding, stored_size=blob.stored_size,
+            ), file_path=os.path.join(FILES_DIR, upload.filename), blob_hash=blob.hash)
+            results[index] = _ok(upload.filename, db_file)
+        except HTTPException as e:
+            results[index] = _error(upload.filename, e.status_code, e.detail)
+        except FileNotFoundError:
+            results[index] = _error(upload.filename, 409, "Содержимое было удалено параллельно, повторите загрузку.")
+    return results
+
+
+async def bulk_delete(db: AsyncSession, names: List[str]) -> List[dict]:
+    """
+    Удаляет файлы по именам одной транзакцией. Содержимое из хранилища удаляется после фиксации:
+    файлы, лежащие по своему пути, и блобы, на которые не осталось ссылок.
+    """
+    check_batch_size(len(names))
+    db_files, ambiguous = await _files_by_name(db, names)
+    references = Counter(db_file.blob_hash for db_file in db_files.values() if db_file.blob_hash)
+    # Файлы, лежащие по своему пути, удаляются с диска фоновыми операциями из журнала
+    operations = {
+        db_file.name: add_operation(db, "delete", db_file.path, file_id=db_file.id)
+        for db_file in db_files.values() if not db_file.blob_hash
+    }
+    results = [_ok(name) if name in db_files else _lookup_error(name, ambiguous) for name in names]
+
+    if db_files:
+        await db.execute(delete(File).where(File.id.in_([db_file.id for db_file in db_files.values()])))
+        for sha256, count in references.items():
+            await db.execute(update(Blob).where(Blob.hash == sha256).values(refcount=Blob.refcount - count))
+        released = list(await db.scalars(
+            delete(Blob).where(Blob.hash.in_(list(references)), Blob.refcount <= 0).returning(Blob.hash)
+        )) if references else []
+        await db.commit()
+        await metadata_cache.invalidate(*db_files)
+
+        await discard_blobs(db, released)
+        await delete_previews(db_file.preview_key for db_file in db_files.values())
+        logging.info(f"Пакетное удаление: удалено {len(db_files)} файлов, освобождено блобов: {len(released)}.")
+
+        first_index = {}
+        for index, name in enumerate(names):
+            first_index.setdefault(name, index)
+        await _report_operations(
+            results, {first_index[name]: operation for name, operation in operations.items()},
+            "Ошибка при удалении файла с диска.",
+        )
+    return results
+
+
+async def bulk_update(db: AsyncSession, items: List[BulkUpdateItem]) -> List[dict]:
+    """
+    Переименовывает, перемещает и изменяет комментарии нескольких файлов одной транзакцией.
+    Перемещения на диске записываются в журнал в той же транзакции и выполняются после фиксации.
+    """
+    check_batch_size(len(items))
+    db_files, ambiguous = await _files_by_name(db, {item.file_name for item in items})
+    # Новые имена без расширения, как их сохранит apply_file_update
+    new_names = {
+        index: _target_name(db_files[item.file_name], item.name)
+        for index, item in enumerate(items) if item.name and item.file_name in db_files
+    }
+    taken = set(await db.scalars(select(File.name).where(File.name.in_(set(new_names.values()))))) if new_names else set()
+    # Имена, которые освобождаются переименованием в этом же запросе
+    taken -= {items[index].file_name for index, name in new_names.items() if name != items[index].file_name}
+
+    results: List[dict] = []
+    updated, operations, changed_names = set(), {}, set()
+    for index, item in enumerate(items):
+        db_file = db_files.get(item.file_name)
+        if db_file is None:
+            results.append(_lookup_error(item.file_name, ambiguous))
+            continue
+        if db_file.id in updated:
+            results.append(_error(item.file_name, 400, "Файл указан в запросе несколько раз."))
+            continue
+        new_name = new_names.get(index)
+        if new_name and new_name != db_file.name:
+            if new_name in taken:
+                results.append(_error(item.file_name, 400, "Файл с таким именем уже существует."))
+                continue
+            taken.add(new_name)
+        changed_names.add(db_file.name)  # Прежнее имя
+        moved = apply_file_update(db_file, item)
+        if moved:
+            operations[index] = add_operation(db, "move", *moved, file_id=db_file.id)
+        changed_names.add(db_file.name)  # Новое имя
+        updated.add(db_file.id)
+        results.append(_ok(item.file_name, db_file))
+
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Файлы были изменены параллельно, повторите запрос.")
+    await metadata_cache.invalidate(*changed_names)
+    await _report_operations(results, operations, "Ошибка при перемещении файла на диске.")
+    return results
+
+
+def _target_name(db_file: File, name: str) -> str:
+    if db_file.extension and name.endswith(db_file.extension):
+        return name[:-len(db_file.extension)]
+    return name
+
+
+class _ArchiveBuffer:
+    """Файлоподобный объект без поиска: накапливает записанные архиватором байты до отправки клиенту."""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.position = 0
+
+    def write(self, data: bytes) -> int:
+        self.buffer.extend(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self) -> None:
+        pass
+
+    def take(self) -> bytes:
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+async def collect_archive_files(db: AsyncSession, names: Optional[List[str]] = None,
+                                directory: Optional[str] = None, recursive: bool = False) -> List[File]:
+    """Файлы для архива: по списку имён или из директории (как в /search/)."""
+    if names:
+        check_batch_size(len(names))
+        found, ambiguous = await _files_by_name(db, names)
+        if ambiguous:
+            raise HTTPException(status_code=409,
+                                detail=f"Именам соответствует несколько файлов: {', '.join(sorted(ambiguous)[:20])}")
+        missing = [name for name in names if name not in found]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Файлы не найдены: {', '.join(missing[:20])}")
+        return [found[name] for name in dict.fromkeys(names)]
+    if directory is None:
+        raise HTTPException(status_code=400, detail="Укажите имена файлов или директорию.")
+
+    db_files: List[File] = []
+    after_id = None
+    while True:
+        page = await search_files_in_directory(db, directory, recursive=recursive, after_id=after_id, limit=1000)
+        db_files += page
+        if len(page) < 1000:
+            break
+        after_id = page[-1].id
+    if not db_files:
+        raise HTTPException(status_code=404, detail="Файлы в указанной директории не найдены")
+    return db_files
+
+
+async def _archive_entries(db_files: List[File]):
+    """Имя в архиве, исходный размер, время изменения, ключ и сжатие содержимого каждого файла."""
+    storage = get_storage()
+    for db_file in db_files:
+        key = stored_path(db_file)
+        size = db_file.size
+        if not db_file.blob_hash:
+            # Файлы вне хранилища блобов могли измениться после последней сверки
+            stat = await storage.stat(key)
+            if stat is None:
+                logging.warning(f"Файл {key} не найден в хранилище и пропущен в архиве.")
+                continue
+            size = stat.size
+        modified = db_file.updated_at or db_file.created_at
+        yield f"{db_file.name}{db_file.extension}", size, modified, key, db_file.encoding
+
+
+# Диапазон дат, представимый в заголовке zip (формат даты MS-DOS)
+ZIP_MIN_DATE = datetime(1980, 1, 1)
+ZIP_MAX_DATE = datetime(2107, 12, 31, 23, 59, 58)
+
+
+def _zip_date_time(modified: Optional[datetime]) -> Tuple[int, ...]:
+    """
+    Время изменения для заголовка zip. Даты вне диапазона формата (например, mtime 0 у файла,
+    найденного сверкой) приводятся к ближайшей границе: иначе ZipInfo бросит ValueError
+    посреди уже начатого ответа.
+    """
+    if modified is None:
+        return time.localtime()[:6]
+    return min(max(to_utc(modified).replace(tzinfo=None), ZIP_MIN_DATE), ZIP_MAX_DATE).timetuple()[:6]
+
+
+async def stream_zip(db_files: List[File]) -> AsyncIterator[bytes]:
+    """Формирует zip-архив на лету: содержимое читается блоками и сразу отдаётся клиенту без временных файлов."""
+    storage = get_storage()
+    buffer = _ArchiveBuffer()
+    with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        async for arcname, size, modified, key, encoding in _archive_entries(db_files):
+            info = zipfile.ZipInfo(arcname, date_time=_zip_date_time(modified))
+            info.file_size = size
+            with archive.open(info, mode="w", force_zip64=size > 0xFFFFFFFF) as entry:
+                async for chunk in read_content(storage, key, encoding):
+                    entry.write(chunk)
+                    if buffer.buffer:
+                        yield buffer.take()
+            if buffer.buffer:
+                yield buffer.take()
+    yield buffer.take()  # Центральный каталог архива
+
+
+async def stream_tar(db_files: List[File]) -> AsyncIterator[bytes]:
+    """Формирует tar-архив на лету: заголовок, содержимое блоками и выравнивание до 512 байт."""
+    storage = get_storage()
+    async for arcname, size, modified, key, encoding in _archive_entries(db_files):
+        info = tarfile.TarInfo(arcname)
+        info.size = size
+        # Даты в базе - naive UTC: без явного приведения timestamp() считал бы их местным временем сервера
+        info.mtime = int(to_utc(modified).timestamp()) if modified else int(time.time())
+        yield info.tobuf(format=tarfile.PAX_FORMAT)
+        written = 0
+        if size:
+            async for chunk in read_content(storage, key, encoding, 0, size - 1):
+                chunk = chunk[:size - written]
+                written += len(chunk)
+                yield chunk
+        if written < size:  # Файл укоротился во время чтения: дополняем до заявленного размера
+            yield bytes(size - written)
+        if size % tarfile.BLOCKSIZE:
+            yield bytes(tarfile.BLOCKSIZE - size % tarfile.BLOCKSIZE)
+    yield bytes(tarfile.BLOCKSIZE * 2)
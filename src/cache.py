@@ -0,0 +1,225 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Iterable, NamedTuple, Optional
+
+from src.config import CACHE_MAX_ENTRIES, CACHE_REDIS_TTL, CACHE_REDIS_URL, CACHE_TTL
+from src.schemas import CacheStats
+
+# Канал, через который реплики сообщают друг другу об изменённых файлах
+INVALIDATION_CHANNEL = "files:invalidate"
+KEY_PREFIX = "files:meta:"
+
+
+class CachedFile(NamedTuple):
+    """Метаданные файла, отвязанные от сессии базы данных (достаточно для FileResponse и скачивания)."""
+    id: int
+    name: str
+    extension: str
+    size: int
+    path: str
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+    comment: Optional[str]
+    checksum: Optional[str]
+    blob_hash: Optional[str]
+    mime_type: Optional[str]
+    width: Optional[int]
+    height: Optional[int]
+    page_count: Optional[int]
+    preview_key: Optional[str]
+    processed_at: Optional[datetime]
+    encoding: Optional[str]
+    stored_size: Optional[int]
+
+    @classmethod
+    def from_file(cls, db_file) -> "CachedFile":
+        return cls(*(getattr(db_file, field) for field in cls._fields))
+
+    def dumps(self) -> str:
+        return json.dumps([value.isoformat() if isinstance(value, datetime) else value for value in self])
+
+    @property
+    def has_preview(self) -> bool:
+        return self.preview_key is not None
+
+    @classmethod
+    def loads(cls, data) -> "CachedFile":
+        # Записи, сохранённые предыдущей версией, могут не содержать последних полей
+        values = dict.fromkeys(cls._fields)
+        values.update(zip(cls._fields, json.loads(data)))
+        for field in ("created_at", "updated_at", "processed_at"):
+            if values[field]:
+                values[field] = datetime.fromisoformat(values[field])
+        return cls(**values)
+
+
+class LRUCache:
+    """
+    LRU-кеш с ограничением числа записей и временем жизни записи.
+    Потокобезопасен: записи инвалидируются и из потоков наблюдателя и сверки.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL, stats: CacheStats = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()  # ключ -> (значение, момент устаревания)
+        self.lock = threading.Lock()
+        self.stats = stats or CacheStats()
+
+    def get(self, key: str):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.stats.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                self.stats.expirations += 1
+                self.stats.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.stats.hits += 1
+            return value
+
+    def put(self, key: str, value) -> None:
+        if self.max_entries <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.stats.evictions += 1
+            self.stats.size = len(self.entries)
+
+    def invalidate(self, keys: Iterable[str]) -> None:
+        with self.lock:
+            for key in keys:
+                if self.entries.pop(key, None) is not None:
+                    self.stats.invalidations += 1
+            self.stats.size = len(self.entries)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.stats.size = 0
+
+
+class RedisTier:
+    """
+    Общий для реплик уровень кеша в Redis (или любом сервере с протоколом Redis).
+    client - асинхронный клиент redis.asyncio.Redis или совместимый (например, fakeredis для проверки).
+    """
+
+    def __init__(self, client, ttl: int = CACHE_REDIS_TTL):
+        self.client = client
+        self.ttl = ttl
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisTier":
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("Для CACHE_REDIS_URL необходимо установить пакет redis") from e
+        return cls(redis.from_url(url))
+
+    async def get(self, name: str) -> Optional[CachedFile]:
+        data = await self.client.get(KEY_PREFIX + name)
+        return CachedFile.loads(data) if data else None
+
+    async def set(self, cached: CachedFile) -> None:
+        await self.client.set(KEY_PREFIX + cached.name, cached.dumps(), ex=self.ttl)
+
+    async def invalidate(self, names: list) -> None:
+        await self.client.delete(*(KEY_PREFIX + name for name in names))
+        await self.client.publish(INVALIDATION_CHANNEL, json.dumps(names))
+
+
+class MetadataCache:
+    """
+    Кеш метаданных файлов по имени: локальный LRU и необязательный общий уровень в Redis.
+
+    Записи инвалидируются при создании, изменении и удалении файла через API, а также при изменениях,
+    найденных наблюдателем за директорией и сверкой. Другие реплики узнают об изменениях через
+    канал Redis. Счётчик поколений не даёт сохранить в кеш запись, прочитанную до параллельной инвалидации.
+    """
+
+    def __init__(self, local: LRUCache, shared: Optional[RedisTier] = None):
+        self.local = local
+        self.shared = shared
+        self.stats = local.stats
+        self.generation = 0
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def get(self, name: str) -> Optional[CachedFile]:
+        cached = self.local.get(name)
+        if cached is not None or self.shared is None:
+            return cached
+        try:
+            cached = await self.shared.get(name)
+        except Exception as e:
+            logging.warning(f"Кеш Redis недоступен: {e}")
+            return None
+        if cached is None:
+            self.stats.shared_misses += 1
+            return None
+        self.stats.shared_hits += 1
+        self.local.put(name, cached)
+        return cached
+
+    async def put(self, cached: CachedFile, generation: int) -> None:
+        """Сохраняет запись, если с момента чтения из базы (generation) не было инвалидаций."""
+        if generation != self.generation:
+            return
+        self.local.put(cached.name, cached)
+        if self.shared is not None:
+            try:
+                await self.shared.set(cached)
+            except Exception as e:
+                logging.warning(f"Кеш Redis недоступен: {e}")
+
+    def _invalidate_local(self, names: list) -> None:
+        self.generation += 1
+        self.local.invalidate(names)
+
+    async def invalidate(self, *names: str) -> None:
+        names = [name for name in names if name]
+        if not names:
+            return
+        self._invalidate_local(names)
+        if self.shared is not None:
+            try:
+                await self.shared.invalidate(names)
+            except Exception as e:
+                logging.warning(f"Кеш Redis недоступен: {e}")
+
+    def invalidate_threadsafe(self, names: Iterable[str]) -> None:
+        """Инвалидация из потоков наблюдателя и сверки, где нет цикла событий."""
+        names = [name for name in names if name]
+        if not names:
+            return
+        self._invalidate_local(names)
+        if self.shared is not None and self.loop is not None:
+            asyncio.run_coroutine_threadsafe(self.invalidate(*names), self.loop)
+
+    async def listen_invalidations(self) -> None:
+        """Фоновая задача: применяет инвалидации, опубликованные другими репликами."""
+        pubsub = self.shared.client.pubsub()
+        await pubsub.subscribe(INVALIDATION_CHANNEL)
+        async for message in pubsub.listen():
+            if message.get("type") == "message":
+                self._invalidate_local(json.loads(message["data"]))
+
+
+def create_metadata_cache() -> MetadataCache:
+    shared = RedisTier.from_url(CACHE_REDIS_URL) if CACHE_REDIS_URL else None
+    return MetadataCache(LRUCache(), shared)
+
+
+metadata_cache = create_metadata_cache()
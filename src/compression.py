@@ -0,0 +1,184 @@
+import logging
+import os
+import zlib
+from typing import AsyncIterable, AsyncIterator, Optional
+
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+
+from src.config import (
+    CHUNK_SIZE,
+    COMPRESSION,
+    COMPRESSION_EXTENSIONS,
+    COMPRESSION_LEVEL,
+    COMPRESSION_MAX_RATIO,
+    COMPRESSION_MIN_SIZE,
+)
+
+try:
+    import zstandard
+except ImportError:  # zstd необязателен, gzip доступен всегда
+    zstandard = None
+
+GZIP, ZSTD = "gzip", "zstd"
+ENCODINGS = (GZIP, ZSTD)
+
+# Объём образца из начала файла, по которому оценивается выигрыш от сжатия
+PROBE_SIZE = 64 * 1024
+# Сколько сжатых байт zstd распаковывается за один вызов: ограничивает объём памяти
+# на блок распакованных данных (zstandard не умеет ограничивать размер результата сам)
+ZSTD_INPUT_SIZE = 16 * 1024
+
+
+def available_encodings():
+    return [encoding for encoding in ENCODINGS if encoding != ZSTD or zstandard is not None]
+
+
+def choose_encoding(file_name: str, size: int, requested: Optional[str] = None) -> Optional[str]:
+    """
+    Алгоритм сжатия содержимого при загрузке: явно запрошенный для файла (gzip, zstd или none)
+    либо COMPRESSION для расширений из COMPRESSION_EXTENSIONS. Маленькие файлы не сжимаются.
+    """
+    if requested is not None:
+        requested = requested.lower()
+        if requested == "none":
+            return None
+        if requested not in available_encodings():
+            raise HTTPException(
+                status_code=400,
+                detail=f"Неподдерживаемый алгоритм сжатия. Доступны: none, {', '.join(available_encodings())}.",
+            )
+        encoding = requested
+    else:
+        if os.path.splitext(file_name)[1].lower() not in COMPRESSION_EXTENSIONS:
+            return None
+        encoding = default_encoding()
+    return encoding if size >= COMPRESSION_MIN_SIZE else None
+
+
+def default_encoding() -> Optional[str]:
+    if COMPRESSION in ("", "none"):
+        return None
+    if COMPRESSION == ZSTD and zstandard is None:
+        logging.warning("Пакет zstandard не установлен: содержимое сжимается gzip.")
+        return GZIP
+    return COMPRESSION
+
+
+def _compressor(encoding: str):
+    if encoding == ZSTD:
+        return zstandard.ZstdCompressor(level=COMPRESSION_LEVEL or 3).compressobj()
+    # wbits=31: формат gzip, который можно отдать клиенту как есть с Content-Encoding: gzip
+    return zlib.compressobj(COMPRESSION_LEVEL or 6, zlib.DEFLATED, 31)
+
+
+def _compressed_ratio(encoding: str, sample: bytes) -> float:
+    compressor = _compressor(encoding)
+    return len(compressor.compress(sample) + compressor.flush()) / len(sample)
+
+
+class CompressingStream:
+    """
+    Асинхронный поток блоков, сжимающий проходящие через него данные.
+
+    Выигрыш оценивается по первым PROBE_SIZE байтам: если они сжимаются хуже COMPRESSION_MAX_RATIO
+    (уже сжатые форматы), данные передаются без изменений и encoding становится None.
+    После чтения потока stored_size - размер записанных данных.
+    """
+
+    def __init__(self, chunks: AsyncIterable[bytes], encoding: Optional[str]):
+        self.chunks = chunks
+        self.encoding = encoding
+        self.stored_size = 0
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        compressor = None
+        async for chunk in self.chunks:
+            if compressor is None and self.encoding:
+                ratio = await run_in_threadpool(_compressed_ratio, self.encoding, chunk[:PROBE_SIZE])
+                if ratio > COMPRESSION_MAX_RATIO:
+                    self.encoding = None
+                else:
+                    compressor = _compressor(self.encoding)
+            if compressor is not None:
+                chunk = await run_in_threadpool(compressor.compress, chunk)
+            if chunk:
+                self.stored_size += len(chunk)
+                yield chunk
+        if compressor is not None:
+            tail = compressor.flush()
+            self.stored_size += len(tail)
+            yield tail
+        else:
+            self.encoding = None  # Пустой файл или сжатие не дало выигрыша
+
+
+async def decompress(chunks: AsyncIterable[bytes], encoding: str) -> AsyncIterator[bytes]:
+    """Распаковывает поток блоками не больше CHUNK_SIZE, не держа в памяти распакованный файл целиком."""
+    if encoding == ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Для чтения содержимого, сжатого zstd, нужен пакет zstandard")
+        decompressor = zstandard.ZstdDecompressor().decompressobj()
+        async for chunk in chunks:
+            for start in range(0, len(chunk), ZSTD_INPUT_SIZE):
+                data = await run_in_threadpool(decompressor.decompress, chunk[start:start + ZSTD_INPUT_SIZE])
+                if data:
+                    yield data
+        return
+
+    decompressor = zlib.decompressobj(31)
+    async for chunk in chunks:
+        data = chunk
+        while data:
+            output = await run_in_threadpool(decompressor.decompress, data, CHUNK_SIZE)
+            if output:
+                yield output
+            data = decompressor.unconsumed_tail
+    tail = decompressor.flush()
+    if tail:
+        yield tail
+
+
+async def read_content(storage, key: str, encoding: Optional[str], start: int = 0,
+                       end: Optional[int] = None) -> AsyncIterator[bytes]:
+    """
+    Исходное содержимое объекта key (байты start..end включительно) с распаковкой на лету.
+    Для несжатого содержимого диапазон читается из хранилища напрямую, для сжатого
+    распаковка идёт с начала и байты до start пропускаются.
+    """
+    if not encoding:
+        async for chunk in storage.open_read(key, start, end):
+            yield chunk
+        return
+
+    position = 0
+    async for chunk in decompress(storage.open_read(key), encoding):
+        chunk_end = position + len(chunk)
+        if chunk_end > start:
+            low = max(start - position, 0)
+            high = len(chunk) if end is None else min(len(chunk), end + 1 - position)
+            if high > low:
+                yield chunk[low:high]
+        position = chunk_end
+        if end is not None and position > end:
+            break
+
+
+def accepts_encoding(accept_encoding: Optional[str], encoding: str) -> bool:
+    """Принимает ли клиент содержимое в кодировке encoding согласно Accept-Encoding (q=0 - запрет)."""
+    if not accept_encoding:
+        return False
+    accepted = {}
+    for item in accept_encoding.split(","):
+        token, _, params = item.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[token.strip().lower()] = quality
+    quality = accepted.get(encoding, accepted.get("*", 0.0))
+    return quality > 0
@@ -0,0 +1,130 @@
+import os
+
+# Размер блока при потоковом чтении и записи файлов (байты)
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", 1024 * 1024))
+
+# Директория хранения файлов и служебная поддиректория для временных файлов загрузок.
+# Временные файлы лежат на той же файловой системе, что и итоговые, чтобы переименование было атомарным.
+FILES_DIR = os.getenv("FILES_DIR", "src/files")
+UPLOAD_TMP_DIR = os.path.join(FILES_DIR, ".uploads")
+
+# Контентно-адресуемое хранилище: содержимое загруженных файлов хранится один раз,
+# под именем SHA-256 в поддиректориях по первым символам хеша (.blobs/ab/cd/abcd...)
+BLOBS_DIR = os.path.join(FILES_DIR, ".blobs")
+
+# Максимальный размер загружаемого файла (байты)
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", 10 * 1024 ** 3))
+
+# Сессии возобновляемой загрузки: размер части по умолчанию, допустимые границы,
+# время жизни незавершённой сессии и период очистки просроченных сессий (секунды)
+UPLOAD_SESSION_CHUNK_SIZE = int(os.getenv("UPLOAD_SESSION_CHUNK_SIZE", 8 * 1024 * 1024))
+UPLOAD_SESSION_MIN_CHUNK_SIZE = 256 * 1024
+UPLOAD_SESSION_MAX_CHUNK_SIZE = 512 * 1024 * 1024
+UPLOAD_SESSION_TTL = int(os.getenv("UPLOAD_SESSION_TTL", 24 * 60 * 60))
+UPLOAD_SESSION_CLEANUP_INTERVAL = int(os.getenv("UPLOAD_SESSION_CLEANUP_INTERVAL", 10 * 60))
+# Сколько секунд сессия может оставаться в состоянии сборки; дольше - сборка прервана (например, процесс
+# приложения перезапущен), и сессия снова принимает части и запрос на завершение
+UPLOAD_SESSION_ASSEMBLY_TIMEOUT = int(os.getenv("UPLOAD_SESSION_ASSEMBLY_TIMEOUT", 60 * 60))
+
+# Хранилище содержимого файлов: local (локальная ФС) или s3 (S3-совместимое объектное хранилище)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")
+S3_BUCKET = os.getenv("S3_BUCKET", "files")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")  # Например, http://localhost:9000 для MinIO
+S3_REGION = os.getenv("S3_REGION")
+S3_PART_SIZE = int(os.getenv("S3_PART_SIZE", 8 * 1024 * 1024))  # Не меньше 5 МБ по требованиям S3
+
+# Фоновая сверка каталога с хранилищем: период (секунды, 0 - отключена), размер пакета записей
+# и число одновременных обращений к хранилищу
+RECONCILE_INTERVAL = int(os.getenv("RECONCILE_INTERVAL", 5 * 60))
+RECONCILE_BATCH_SIZE = int(os.getenv("RECONCILE_BATCH_SIZE", 1000))
+RECONCILE_CONCURRENCY = int(os.getenv("RECONCILE_CONCURRENCY", 32))
+# Сверка локальной директории: полный обход (без пропуска неизменённых директорий) каждые N проходов
+# и сравнение SHA-256 при обнаружении изменённых и переименованных файлов
+RECONCILE_FULL_SCAN_EVERY = int(os.getenv("RECONCILE_FULL_SCAN_EVERY", 12))
+RECONCILE_VERIFY_HASH = os.getenv("RECONCILE_VERIFY_HASH", "0").lower() in ("1", "true", "yes")
+
+# Наблюдатель за директорией FILES_DIR (WATCHER_ENABLED=0 - отключён, каталог обновляют только через API и сверку):
+# ёмкость очереди событий (при заполнении наблюдатель ждёт обработки),
+# время без новых событий и изменений размера, после которого файл считается записанным (секунды),
+# число потоков для stat и максимальный размер пакета изменений в одной транзакции
+WATCHER_ENABLED = os.getenv("WATCHER_ENABLED", "1").lower() in ("1", "true", "yes")
+WATCHER_QUEUE_SIZE = int(os.getenv("WATCHER_QUEUE_SIZE", 10000))
+WATCHER_DEBOUNCE = float(os.getenv("WATCHER_DEBOUNCE", 1.0))
+WATCHER_WORKERS = int(os.getenv("WATCHER_WORKERS", 4))
+WATCHER_BATCH_SIZE = int(os.getenv("WATCHER_BATCH_SIZE", 500))
+
+# База данных: URL в синхронной форме (sqlite:///..., postgresql://...). Запросы API выполняются
+# через асинхронный драйвер того же диалекта (aiosqlite, asyncpg), фоновые потоки - через синхронный.
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./test.db")
+# Пул соединений: постоянные соединения, дополнительные при пиковой нагрузке и ожидание свободного (секунды)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 20))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))
+# Сколько миллисекунд SQLite ждёт снятия блокировки другим писателем, прежде чем вернуть "database is locked"
+SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", 5000))
+# Создание недостающих таблиц, столбцов и индексов при запуске приложения (0 - схему обновляют отдельно)
+SCHEMA_CHECK = os.getenv("SCHEMA_CHECK", "1").lower() in ("1", "true", "yes")
+
+# Кеш метаданных файлов по имени: число записей в памяти процесса (0 - кеш отключён) и время жизни записи
+# (секунды). CACHE_REDIS_URL включает общий для реплик уровень кеша в Redis, например redis://localhost:6379/0
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 10000))
+CACHE_TTL = float(os.getenv("CACHE_TTL", 60))
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL")
+CACHE_REDIS_TTL = int(os.getenv("CACHE_REDIS_TTL", 5 * 60))
+
+# Наибольшее число файлов в одном пакетном запросе (загрузка, удаление, изменение, архив по списку имён)
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", 1000))
+
+# Фоновые операции с файлами (перемещение и удаление): число потоков выделенного пула ввода-вывода,
+# сколько секунд запрос ждёт завершения операции, прежде чем ответить 202, и сколько секунд
+# хранятся записи о завершённых операциях
+FILE_OPS_WORKERS = int(os.getenv("FILE_OPS_WORKERS", 4))
+FILE_OPS_WAIT = float(os.getenv("FILE_OPS_WAIT", 2))
+FILE_OPS_TTL = int(os.getenv("FILE_OPS_TTL", 24 * 60 * 60))
+
+# Превью и метаданные файлов (тип, размеры изображения, число страниц) извлекаются после загрузки
+# в пуле процессов из PREVIEW_WORKERS процессов; PREVIEW_QUEUE_SIZE - наибольшее число файлов в очереди.
+# Превью - JPEG со стороной не больше PREVIEW_SIZE пикселей, клиенты кешируют его PREVIEW_MAX_AGE секунд
+PREVIEWS_DIR = os.path.join(FILES_DIR, ".previews")
+PREVIEW_WORKERS = int(os.getenv("PREVIEW_WORKERS", 2))
+PREVIEW_QUEUE_SIZE = int(os.getenv("PREVIEW_QUEUE_SIZE", 10000))
+PREVIEW_SIZE = int(os.getenv("PREVIEW_SIZE", 256))
+PREVIEW_MAX_AGE = int(os.getenv("PREVIEW_MAX_AGE", 24 * 60 * 60))
+
+# Сжатие содержимого в хранилище блобов при загрузке: алгоритм (gzip, zstd или none), расширения файлов,
+# которые сжимаются без явного указания, минимальный размер сжимаемого файла (байты) и уровень сжатия
+# (по умолчанию 6 для gzip и 3 для zstd). Если начало файла сжимается хуже COMPRESSION_MAX_RATIO,
+# файл сохраняется без сжатия. Сжатое содержимое отдаётся клиенту как есть (Content-Encoding),
+# если клиент его принимает, иначе распаковывается на лету
+COMPRESSION = os.getenv("COMPRESSION", "gzip").lower()
+COMPRESSION_EXTENSIONS = {
+    extension.strip().lower()
+    for extension in os.getenv(
+        "COMPRESSION_EXTENSIONS", ".txt,.log,.json,.jsonl,.csv,.tsv,.xml,.html,.md,.yaml,.yml,.sql,.js,.css,.svg"
+    ).split(",")
+    if extension.strip()
+}
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))
+COMPRESSION_LEVEL = int(os.getenv("COMPRESSION_LEVEL", 0)) or None
+COMPRESSION_MAX_RATIO = float(os.getenv("COMPRESSION_MAX_RATIO", 0.9))
+
+# Профилирование медленных запросов: запросы дольше PROFILE_SLOW_REQUESTS секунд (0 - отключено) записываются
+# в журнал вместе со стеками вызовов, которые снимаются каждые PROFILE_SAMPLE_INTERVAL секунд,
+# последние PROFILE_KEEP профилей доступны в /profiles/. Метрики Prometheus отдаются в /metrics
+PROFILE_SLOW_REQUESTS = float(os.getenv("PROFILE_SLOW_REQUESTS", 0))
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", 0.01))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", 50))
+
+# Ограничения для клиентов. Клиент - ключ API из заголовка RATE_LIMIT_KEY_HEADER (ключ не проверяется),
+# без него - IP-адрес (за прокси запускайте uvicorn с --proxy-headers). RATE_LIMIT_REQUESTS - запросов в секунду
+# с запасом RATE_LIMIT_BURST (по умолчанию - запросы одной секунды), RATE_LIMIT_TRANSFERS - одновременных загрузок
+# и скачиваний; сверх них запрос получает 429. RATE_LIMIT_BANDWIDTH - скорость загрузки и скачивания одного клиента
+# (байт/с) с запасом RATE_LIMIT_BANDWIDTH_BURST байт: быстрее передача не идёт. 0 - без ограничения.
+# RATE_LIMIT_REDIS_URL - лимиты, общие для всех процессов и реплик, иначе каждый процесс считает их отдельно
+RATE_LIMIT_KEY_HEADER = os.getenv("RATE_LIMIT_KEY_HEADER", "X-API-Key")
+RATE_LIMIT_REQUESTS = float(os.getenv("RATE_LIMIT_REQUESTS", 0))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", 0)) or max(1, int(RATE_LIMIT_REQUESTS))
+RATE_LIMIT_TRANSFERS = int(os.getenv("RATE_LIMIT_TRANSFERS", 0))
+RATE_LIMIT_BANDWIDTH = int(os.getenv("RATE_LIMIT_BANDWIDTH", 0))
+RATE_LIMIT_BANDWIDTH_BURST = int(os.getenv("RATE_LIMIT_BANDWIDTH_BURST", 0)) or RATE_LIMIT_BANDWIDTH
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL")
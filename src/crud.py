@@ -1,43 +1,41 @@
 import logging
 import os
-import shutil
+import re
 from datetime import datetime
-from typing import List
+from typing import List, Mapping, Optional, Sequence, Tuple
 
 from fastapi import HTTPException, Response
-from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import Session
-
-from src.models import File
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, select, text, tuple_
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+
+from src.blob_store import blob_path, discard_blobs, release_blob
+from src.cache import CachedFile, metadata_cache
+from src.compression import accepts_encoding, read_content
+from src.config import PREVIEW_MAX_AGE
+from src.file_operations import add_operation, pending_move_source
+from src.models import File, FileOperation
+from src.previews import delete_previews, preview_pipeline
 from src.schemas import FileCreate, FileUpdate
+from src.storage import get_storage
+from src.utils import etag_matches, http_date, normalize_directory, parse_http_date, parse_range_header, to_utc
 
 
-def create_file_record(db_session: Session, file_data: FileCreate) -> File:
-    """Создаёт запись о файле в базе данных."""
-    db_file = File(
-        name=file_data.name,
-        extension=file_data.extension,
-        size=file_data.size,
-        path=file_data.path
-    )
-    db_session.add(db_file)
-    db_session.commit()
-    db_session.refresh(db_file)
-    return db_file
-
+def stored_path(db_file: File) -> str:
+    """Ключ содержимого файла в хранилище: в хранилище блобов или по пути path."""
+    if db_file.blob_hash:
+        return blob_path(db_file.blob_hash)
+    return db_file.path
 
-def get_file(db: Session, file_name: str) -> File:
-    """Получает файл из базы данных по имени."""
-    db_file = db.query(File).filter(File.name == file_name).first()
 
-    if db_file:
-        # Проверяем существование файла на диске
-        if not os.path.exists(db_file.path):
-            # Если файл отсутствует, удаляем запись из БД
-            db.delete(db_file)
-            db.commit()
-            logging.info(f"Файл {file_name} был удалён из базы данных, так как его не существует на диске.")
-            raise HTTPException(status_code=404, detail="Файл не найден на диске, запись удалена из базы данных")
+async def get_file(db: AsyncSession, file_name: str) -> File:
+    """
+    Получает файл из базы данных по имени.
+    Наличие содержимого на диске не проверяется: расхождения устраняет фоновая сверка (src/reconciler.py).
+    """
+    db_file = await db.scalar(select(File).where(File.name == file_name).limit(1))
 
     if not db_file:
         raise HTTPException(status_code=404, detail="Файл не найден")
@@ -45,45 +43,213 @@ def get_file(db: Session, file_name: str) -> File:
     return db_file
 
 
-def get_files(db: Session, skip: int = 0, limit: int = 10) -> List[File]:
-    """Получает список файлов с возможностью пагинации."""
-    files = db.query(File).offset(skip).limit(limit).all()
-
-    # Проверка всех файлов на наличие на диске
-    for file in files:
-        if not os.path.exists(file.path):
-            # Если файла нет, удаляем запись из БД
-            db.delete(file)
-            db.commit()
-            logging.info(f"Файл с ID {file.id} был удалён из базы данных, так как его не существует на диске.")
-
-    return files
+async def get_file_metadata(db: AsyncSession, file_name: str) -> Optional[CachedFile]:
+    """Метаданные файла по имени через кеш (src/cache.py); None, если файла нет."""
+    cached = await metadata_cache.get(file_name)
+    if cached is None:
+        generation = metadata_cache.generation
+        db_file = await db.scalar(select(File).where(File.name == file_name).limit(1))
+        if db_file is None:
+            return None
+        cached = CachedFile.from_file(db_file)
+        await metadata_cache.put(cached, generation)
+    return cached
+
+
+def _select_files(columns: Optional[Sequence] = None) -> Select:
+    return select(*columns) if columns else select(File)
+
+
+async def _fetch(db: AsyncSession, query: Select, columns: Optional[Sequence] = None) -> list:
+    if columns:
+        return list(await db.execute(query))
+    return list(await db.scalars(query))
+
+
+def file_list_query(skip: int = 0, after_id: Optional[int] = None, columns: Optional[Sequence] = None) -> Select:
+    """Запрос списка файлов по возрастанию id, без ограничения числа записей."""
+    query = _select_files(columns).order_by(File.id)
+    if after_id is not None:
+        query = query.where(File.id > after_id)
+    elif skip:
+        query = query.offset(skip)
+    return query
+
+
+async def get_files(db: AsyncSession, skip: int = 0, limit: int = 10, after_id: Optional[int] = None,
+                    columns: Optional[Sequence] = None) -> list:
+    """
+    Получает список файлов с возможностью пагинации.
+    after_id - курсор (id последнего файла предыдущей страницы): страница читается диапазоном
+    по первичному ключу, и её стоимость не зависит от номера. skip оставлен для совместимости.
+    columns - читать только эти столбцы: вместо объектов File возвращаются кортежи.
+    """
+    return await _fetch(db, file_list_query(skip, after_id, columns).limit(limit), columns)
+
+
+async def directory_search_queries(db: AsyncSession, directory: str, recursive: bool = False,
+                                   extension: Optional[str] = None, min_size: Optional[int] = None,
+                                   max_size: Optional[int] = None, created_after: Optional[datetime] = None,
+                                   created_before: Optional[datetime] = None, after_id: Optional[int] = None,
+                                   columns: Optional[Sequence] = None) -> List[Select]:
+    """
+    Запросы поиска файлов непосредственно в директории или (recursive=True) во всём её поддереве;
+    результат поиска - результаты запросов по очереди.
+
+    Поиск выполняется диапазонами по индексу files.directory: поддерево "a/b" - это
+    directory = "a/b" и затем "a/b/" <= directory < "a/b0" ("0" следует за "/" в ASCII).
+    Результаты упорядочены по (directory, id), как и индекс, поэтому страница читается без сортировки;
+    after_id - id последнего файла предыдущей страницы.
+    """
+    directory = normalize_directory(directory)
+
+    filters = []
+    if extension:
+        filters.append(File.extension == (extension if extension.startswith(".") else "." + extension))
+    if min_size is not None:
+        filters.append(File.size >= min_size)
+    if max_size is not None:
+        filters.append(File.size <= max_size)
+    if created_after is not None:
+        filters.append(File.created_at >= created_after)
+    if created_before is not None:
+        filters.append(File.created_at < created_before)
+
+    if after_id is not None:
+        last_directory = await db.scalar(select(File.directory).where(File.id == after_id))
+        if last_directory is not None:
+            filters.append(tuple_(File.directory, File.id) > tuple_(last_directory, after_id))
+
+    # Диапазоны индекса в порядке возрастания directory
+    if not recursive:
+        ranges = [File.directory == directory]
+    elif directory == ".":  # Поддерево "." - все относительные пути
+        ranges = [File.directory.isnot(None)]
+    else:
+        prefix = directory if directory.endswith("/") else directory + "/"
+        ranges = [
+            File.directory == directory,
+            and_(File.directory >= prefix, File.directory < prefix[:-1] + "0"),
+        ]
+    return [
+        _select_files(columns).where(directory_range, *filters).order_by(File.directory, File.id)
+        for directory_range in ranges
+    ]
+
+
+async def search_files_in_directory(db: AsyncSession, directory: str, limit: int = 100,
+                                    columns: Optional[Sequence] = None, **filters) -> list:
+    """
+    Ищет не больше limit файлов в директории; filters - условия поиска directory_search_queries.
+    columns - читать только эти столбцы: вместо объектов File возвращаются кортежи.
+    """
+    found_files = []
+    for query in await directory_search_queries(db, directory, columns=columns, **filters):
+        found_files += await _fetch(db, query.limit(limit - len(found_files)), columns)
+        if len(found_files) >= limit:
+            break
+    return found_files
 
 
-def create_file(db: Session, file: FileCreate, file_path: str) -> File:
-    """Создание файла в базе данных с использованием транзакции."""
+def fulltext_query(text_query: str) -> str:
+    """
+    Преобразует пользовательский запрос в запрос FTS5: каждое слово ищется по префиксу,
+    слова объединяются через AND. Спецсимволы синтаксиса FTS5 в запрос не попадают.
+    """
+    terms = re.findall(r"\w+", text_query)
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+async def search_files_fulltext(db: AsyncSession, text_query: str, limit: int = 20, offset: int = 0,
+                                columns: Optional[Sequence] = None) -> list:
+    """
+    Полнотекстовый поиск по имени и комментарию файла с ранжированием BM25
+    (совпадение в имени весит больше, чем в комментарии).
+    columns - читать только эти столбцы: вместо объектов File возвращаются кортежи.
+    """
+    if db.bind.dialect.name != "sqlite":
+        raise HTTPException(status_code=501, detail="Полнотекстовый поиск доступен только для SQLite.")
+
+    match = fulltext_query(text_query)
+    if not match:
+        raise HTTPException(status_code=400, detail="Поисковый запрос не содержит слов.")
+
+    selected = ", ".join(f"files.{column.name}" for column in columns) if columns else "files.*"
+    statement = text(
+        f"SELECT {selected} FROM files_fts JOIN files ON files.id = files_fts.rowid "
+        "WHERE files_fts MATCH :match ORDER BY bm25(files_fts, 10.0, 1.0), files.id "
+        "LIMIT :limit OFFSET :offset"
+    )
+    parameters = {"match": match, "limit": limit, "offset": offset}
+    if columns:
+        # Типы столбцов задаются явно: иначе даты из SQLite вернулись бы строками
+        return list(await db.execute(statement.columns(*columns), parameters))
+    return list(await db.scalars(select(File).from_statement(statement), parameters))
+
+
+async def create_file(db: AsyncSession, file: FileCreate, file_path: str, blob_hash: Optional[str] = None) -> File:
+    """
+    Создание файла в базе данных с использованием транзакции.
+    blob_hash - ссылка на содержимое в хранилище блобов, file_path в этом случае только логический путь.
+    """
     db_file = File(
         name=file.name,
         extension=file.extension,
         size=file.size,
         path=file_path,
         comment=file.comment,
+        checksum=file.checksum,
+        blob_hash=blob_hash,
+        encoding=file.encoding,
+        stored_size=file.stored_size,
         created_at=datetime.utcnow(),
     )
     try:
         db.add(db_file)
-        db.commit()
-        db.refresh(db_file)
+        await db.commit()
+        await metadata_cache.invalidate(db_file.name)
+        await db.refresh(db_file)
+        preview_pipeline.schedule([db_file.id])  # Метаданные и превью извлекаются в фоне
         return db_file
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Файл с таким именем уже существует.")
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         logging.error(f"Ошибка при создании записи о файле в базе данных: {e}")
         raise HTTPException(status_code=500, detail="Ошибка при сохранении информации о файле в базе данных")
 
 
-def update_file(db: Session, db_file: File, file_update: FileUpdate) -> File:
-    """Обновляет информацию о файле в базе данных и на диске."""
+async def update_file(db: AsyncSession, db_file: File,
+                      file_update: FileUpdate) -> Tuple[File, Optional[FileOperation]]:
+    """
+    Обновляет информацию о файле в базе данных.
+    Перемещение содержимого на диске записывается в журнал в той же транзакции и выполняется
+    в фоне (src/file_operations.py); операция возвращается вместе с файлом.
+    Для файлов из хранилища блобов переименование и перемещение меняют только метаданные.
+    """
+    old_name = db_file.name
+    moved = apply_file_update(db_file, file_update)
+    operation = add_operation(db, "move", *moved, file_id=db_file.id) if moved else None
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Файл с таким именем уже существует.")
+    await metadata_cache.invalidate(old_name, db_file.name)
+    await db.refresh(db_file)
+
+    return db_file, operation
+
+
+def apply_file_update(db_file: File, file_update: FileUpdate) -> Optional[Tuple[str, str]]:
+    """
+    Меняет поля записи без фиксации транзакции.
+    Возвращает пару (старый путь, новый путь), если содержимое нужно переместить в хранилище.
+    """
     old_path = db_file.path  # Сохраняем старый путь для перемещения файла
+    on_disk = db_file.blob_hash is None
+    moved = None
 
     # Если нужно изменить имя файла
     if file_update.name:
@@ -95,9 +261,9 @@ def update_file(db: Session, db_file: File, file_update: FileUpdate) -> File:
         # Если нужно изменить директорию файла
         new_path = handle_file_path_change(file_update.path, new_name, db_file.extension, old_path)
 
-        # Переименовываем и перемещаем файл на уровне файловой системы
-        if os.path.exists(old_path):
-            shutil.move(old_path, new_path)  # Заменяем os.rename на shutil.move
+        # Файл, лежащий по своему пути, нужно переименовать и переместить в хранилище
+        if on_disk and new_path != old_path:
+            moved = (old_path, new_path)
 
         # Обновляем путь и имя в базе данных
         db_file.name = new_name  # Имя без расширения
@@ -107,9 +273,9 @@ def update_file(db: Session, db_file: File, file_update: FileUpdate) -> File:
     elif file_update.path and not file_update.name:
         new_path = handle_file_path_change(file_update.path, db_file.name, db_file.extension, old_path)
 
-        # Перемещаем файл
-        if os.path.exists(old_path):
-            shutil.move(old_path, new_path)  # Заменяем os.rename на shutil.move
+        # Файл нужно переместить
+        if on_disk and new_path != old_path:
+            moved = (old_path, new_path)
 
         # Обновляем путь в базе данных
         db_file.path = new_path
@@ -119,76 +285,197 @@ def update_file(db: Session, db_file: File, file_update: FileUpdate) -> File:
         db_file.comment = file_update.comment
 
     db_file.updated_at = datetime.utcnow()  # Обновляем дату изменения
-    db.commit()
-    db.refresh(db_file)
-
-    return db_file
+    return moved
 
 
 def handle_file_path_change(new_dir: str, file_name: str, extension: str, old_path: str) -> str:
-    """Обрабатывает изменение пути и имени файла."""
+    """Обрабатывает изменение пути и имени файла (директории создаёт хранилище при перемещении)."""
     if new_dir:
-        if not os.path.exists(new_dir):
-            os.makedirs(new_dir)  # Создаём директорию, если она не существует
         return os.path.join(new_dir, file_name + extension)  # Возвращаем новый путь
     else:
         # Если директория не изменена, сохраняем в текущей директории
         return os.path.join(os.path.dirname(old_path), file_name + extension)
 
 
-def delete_file(db: Session, file_id: int) -> dict:
-    """Удаляет запись о файле из базы данных."""
-    deleted_file = db.query(File).filter(File.id == file_id).first()
+async def delete_file(db: AsyncSession, file_id: int) -> Optional[FileOperation]:
+    """
+    Удаляет запись о файле из базы данных.
+    Удаление файла, лежащего по своему пути, записывается в журнал в той же транзакции
+    и выполняется в фоне; операция возвращается вызывающему коду.
+    """
+    deleted_file = await db.get(File, file_id)
 
     if not deleted_file:
         raise HTTPException(status_code=404, detail="Файл не найден")
 
     # Удаляем информацию о файле из базы данных
-    db.delete(deleted_file)
-    db.commit()
+    blob_hash, file_name, preview = deleted_file.blob_hash, deleted_file.name, deleted_file.preview_key
+    operation = None
+    await db.delete(deleted_file)
+    released = False
+    if blob_hash:
+        released = await release_blob(db, blob_hash)
+    else:
+        operation = add_operation(db, "delete", deleted_file.path, file_id=file_id)
+    await db.commit()
+    if released:
+        # Содержимое удаляется из хранилища вместе с последней ссылкой на него
+        await discard_blobs(db, [blob_hash])
+    await delete_previews([preview])
+    await metadata_cache.invalidate(file_name)
     logging.info(f"Запись о файле с ID {file_id} удалена из базы данных")
 
-    return {"message": f"Запись о файле с ID {file_id} была успешно удалена"}
+    return operation
+
+
+def file_etag(db_file: CachedFile, encoding: Optional[str] = None) -> str:
+    """
+    Формирует ETag по метаданным из базы данных, не обращаясь к диску.
+    Сжатое представление (encoding) - другая последовательность байт, поэтому у него свой ETag.
+    """
+    modified = db_file.updated_at or db_file.created_at
+    timestamp = int(to_utc(modified).timestamp()) if modified else 0
+    suffix = f"-{encoding}" if encoding else ""
+    return f'"{db_file.id}-{db_file.size}-{timestamp}{suffix}"'
+
+
+def is_not_modified(db_file: CachedFile, headers: Mapping[str, str], etag: Optional[str] = None) -> bool:
+    """Проверяет условные заголовки If-None-Match / If-Modified-Since."""
+    if_none_match = headers.get("if-none-match")
+    if if_none_match:
+        return etag_matches(if_none_match, etag or file_etag(db_file))
+
+    if_modified_since = headers.get("if-modified-since")
+    modified = db_file.updated_at or db_file.created_at
+    if if_modified_since and modified:
+        since = parse_http_date(if_modified_since)
+        return since is not None and to_utc(modified) <= since
+
+    return False
 
 
-def download_file(db: Session, file_name: str) -> Response:
-    """Скачивает файл из базы данных по имени."""
-    db_file = db.query(File).filter(File.name == file_name).first()
+async def download_file(db: AsyncSession, file_name: str, headers: Optional[Mapping[str, str]] = None) -> Response:
+    """
+    Скачивает файл по имени потоково, блоками по CHUNK_SIZE.
+
+    Поддерживает докачку и параллельную загрузку частей (Range / 206 Partial Content)
+    и условные запросы (ETag / Last-Modified), на которые отвечает 304 без обращения к диску.
+    Сжатое в хранилище содержимое отдаётся как есть с Content-Encoding, если клиент принимает
+    это сжатие (диапазоны тогда относятся к сжатым байтам), иначе распаковывается на лету.
+    """
+    headers = headers or {}
+    db_file = await get_file_metadata(db, file_name)
     if not db_file:
         raise HTTPException(status_code=404, detail="Файл не найден в базе данных.")
 
-    file_path = db_file.path  # Получаем полный путь к файлу
-
-    # Проверяем существование файла на диске
-    if not os.path.exists(file_path):
+    # Сжатие, в котором содержимое будет отправлено клиенту без распаковки
+    encoding = db_file.encoding
+    if encoding and not accepts_encoding(headers.get("accept-encoding"), encoding):
+        encoding = None
+    etag = file_etag(db_file, encoding)
+    modified = db_file.updated_at or db_file.created_at
+    response_headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Content-Disposition": f"attachment; filename={db_file.name}{db_file.extension}",
+    }
+    if modified:
+        response_headers["Last-Modified"] = http_date(modified)
+    if db_file.encoding:
+        # Ответ зависит от Accept-Encoding: кеши не должны отдавать сжатое представление другим клиентам
+        response_headers["Vary"] = "Accept-Encoding"
+
+    if is_not_modified(db_file, headers, etag):
+        response_headers.pop("Content-Disposition")
+        return Response(status_code=304, headers=response_headers)
+
+    storage = get_storage()
+    file_path = stored_path(db_file)  # Получаем ключ содержимого файла в хранилище
+
+    # Проверяем существование файла в хранилище и получаем его актуальный размер
+    file_stat = await storage.stat(file_path)
+    if file_stat is None and not db_file.blob_hash:
+        # Файл ещё перемещается в фоне: отдаём его с прежнего места
+        source = await pending_move_source(db, file_path)
+        if source:
+            file_path = source
+            file_stat = await storage.stat(file_path)
+    if file_stat is None:
         raise HTTPException(status_code=404, detail="Файл не найден на диске.")
-
-    # Открываем файл для чтения в бинарном режиме
-    with open(file_path, 'rb') as file:
-        content = file.read()
-
-    # Возвращаем файл в качестве ответа
-    return Response(
-        content=content,  # Указываем content как именованный параметр
-        media_type='application/octet-stream',
-        headers={
-            "Content-Disposition": f"attachment; filename={db_file.name}{db_file.extension}"
-        }
+    if encoding:
+        response_headers["Content-Encoding"] = encoding
+    # Распаковка нужна, только если клиент не принимает сжатие, с которым хранится файл;
+    # размер представления в этом случае - исходный размер файла
+    decode = None if encoding else db_file.encoding
+    size = db_file.size if decode else file_stat.size
+
+    byte_range = None
+    range_header = headers.get("range")
+    if range_header and _if_range_matches(headers.get("if-range"), etag, modified):
+        try:
+            byte_range = parse_range_header(range_header, size)
+        except ValueError:
+            raise HTTPException(
+                status_code=416,
+                detail="Запрошенный диапазон не может быть удовлетворён.",
+                headers={"Content-Range": f"bytes */{size}"},
+            )
+
+    if byte_range is None:
+        response_headers["Content-Length"] = str(size)
+        return StreamingResponse(
+            read_content(storage, file_path, decode),
+            media_type="application/octet-stream",
+            headers=response_headers,
+        )
+
+    start, end = byte_range
+    response_headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response_headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        read_content(storage, file_path, decode, start, end),
+        status_code=206,
+        media_type="application/octet-stream",
+        headers=response_headers,
     )
 
 
-def find_files_in_directory(directory: str) -> List[dict]:
-    """Находит все файлы в заданной директории и возвращает информацию о них."""
-    found_files = []
-    for root, _, files in os.walk(directory):
-        for file_name in files:
-            file_path = os.path.join(root, file_name)
-            found_files.append({
-                'name': file_name,
-                'path': file_path,
-                'extension': os.path.splitext(file_name)[1],
-                'size': os.path.getsize(file_path),
-                'created_at': datetime.fromtimestamp(os.path.getctime(file_path)),
-                'updated_at': datetime.fromtimestamp(os.path.getmtime(file_path))
-            })
-    return found_files
+async def preview_file(db: AsyncSession, file_name: str, headers: Optional[Mapping[str, str]] = None) -> Response:
+    """
+    Отдаёт превью файла (JPEG), построенное в фоне после загрузки (src/previews.py).
+    Превью меняется только при повторной обработке, поэтому разрешено долгое кеширование на клиенте.
+    """
+    headers = headers or {}
+    db_file = await get_file_metadata(db, file_name)
+    if not db_file:
+        raise HTTPException(status_code=404, detail="Файл не найден в базе данных.")
+    if not db_file.preview_key:
+        detail = "Файл ещё обрабатывается." if db_file.processed_at is None else "Превью для этого файла недоступно."
+        raise HTTPException(status_code=404, detail=detail)
+
+    etag = f'"preview-{db_file.id}-{int(to_utc(db_file.processed_at).timestamp())}"'
+    response_headers = {
+        "ETag": etag,
+        "Last-Modified": http_date(db_file.processed_at),
+        "Cache-Control": f"public, max-age={PREVIEW_MAX_AGE}",
+    }
+    if_none_match = headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=response_headers)
+
+    storage = get_storage()
+    file_stat = await storage.stat(db_file.preview_key)
+    if file_stat is None:
+        raise HTTPException(status_code=404, detail="Превью для этого файла недоступно.")
+    response_headers["Content-Length"] = str(file_stat.size)
+    return StreamingResponse(storage.open_read(db_file.preview_key), media_type="image/jpeg", headers=response_headers)
+
+
+def _if_range_matches(if_range: Optional[str], etag: str, modified: Optional[datetime]) -> bool:
+    """Если If-Range не совпадает с текущей версией файла, Range игнорируется и отдаётся весь файл."""
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        return if_range == etag
+    since = parse_http_date(if_range)
+    return since is not None and modified is not None and to_utc(modified) <= since
@@ -1,13 +1,78 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
-DATABASE_URL = "sqlite:///./test.db"
+from src.config import DATABASE_URL, DB_MAX_OVERFLOW, DB_POOL_SIZE, DB_POOL_TIMEOUT, SQLITE_BUSY_TIMEOUT
+from src.metrics import instrument_engine
 
-engine = create_engine(DATABASE_URL)
+# Асинхронные драйверы для поддерживаемых диалектов
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+
+def sync_url(url: URL) -> URL:
+    return url.set(drivername=url.get_backend_name())
+
+
+def async_url(url: URL) -> URL:
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise RuntimeError(f"Асинхронный драйвер для базы данных {backend} не поддерживается")
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+
+
+def engine_options(url: URL) -> dict:
+    """Параметры пула соединений; для SQLite в памяти пул не настраивается."""
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_pre_ping": url.get_backend_name() != "sqlite",
+    }
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    WAL позволяет читателям работать параллельно с писателем, busy_timeout - ждать блокировку
+    вместо немедленной ошибки, synchronous=NORMAL в режиме WAL безопасен и не делает fsync на каждую транзакцию.
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+url = make_url(DATABASE_URL)
+
+# Синхронный движок: миграции, наблюдатель за директорией и сверка, работающие в отдельных потоках
+engine = create_engine(sync_url(url), **engine_options(url))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Асинхронный движок для обработчиков запросов. aiosqlite по умолчанию открывает соединение
+# на каждый запрос (NullPool), поэтому пул соединений задаётся явно
+async_options = engine_options(url)
+if async_options and url.get_backend_name() == "sqlite":
+    async_options["poolclass"] = AsyncAdaptedQueuePool
+async_engine = create_async_engine(async_url(url), **async_options)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+if url.get_backend_name() == "sqlite":
+    event.listen(engine, "connect", set_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", set_sqlite_pragmas)
+
+# Длительность SQL-запросов и занятые соединения для /metrics
+instrument_engine(engine, "sync")
+instrument_engine(async_engine.sync_engine, "async")
+
 Base = declarative_base()
 
 def init_db():
+    from src.migrations import migrate
+
     Base.metadata.create_all(bind=engine)
+    migrate(engine)
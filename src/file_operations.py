@@ -0,0 +1,204 @@
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Set
+
+from fastapi import HTTPException
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from src.cache import metadata_cache
+from src.config import FILE_OPS_TTL, FILE_OPS_WAIT, FILE_OPS_WORKERS
+from src.database import AsyncSessionLocal, SessionLocal
+from src.models import File, FileOperation
+from src.storage import StorageEngine, get_storage
+
+PENDING, DONE, FAILED = "pending", "done", "failed"
+
+
+def add_operation(db: AsyncSession, kind: str, source: str, target: Optional[str] = None,
+                  file_id: Optional[int] = None) -> FileOperation:
+    """
+    Записывает намерение переместить или удалить содержимое в текущую транзакцию.
+    После фиксации операция передаётся исполнителю через run_operations.
+    """
+    operation = FileOperation(kind=kind, source=source, target=target, file_id=file_id, status=PENDING)
+    db.add(operation)
+    return operation
+
+
+async def get_operation(db: AsyncSession, operation_id: int) -> FileOperation:
+    operation = await db.get(FileOperation, operation_id)
+    if operation is None:
+        raise HTTPException(status_code=404, detail="Операция не найдена")
+    return operation
+
+
+def pending_paths_statement():
+    """Пути незавершённых операций: сверка не должна считать их расхождениями каталога и хранилища."""
+    return select(FileOperation.source, FileOperation.target).where(FileOperation.status == PENDING)
+
+
+def collect_paths(rows) -> Set[str]:
+    return {os.path.normpath(path) for row in rows for path in row if path}
+
+
+async def pending_move_source(db: AsyncSession, target: str) -> Optional[str]:
+    """Прежний путь файла, перемещение которого в target ещё не завершено."""
+    return await db.scalar(
+        select(FileOperation.source)
+        .where(FileOperation.status == PENDING, FileOperation.kind == "move", FileOperation.target == target)
+        .order_by(FileOperation.id.desc())
+        .limit(1)
+    )
+
+
+def _move(storage: StorageEngine, source: str, target: str) -> None:
+    # При повторе после сбоя перемещение могло уже завершиться
+    if storage.stat_sync(source) is None and storage.stat_sync(target) is not None:
+        return
+    storage.move_sync(source, target)
+
+
+def _revert_move(db: Session, storage: StorageEngine, operation: FileOperation) -> None:
+    """Перемещение не удалось, а содержимое осталось на прежнем месте: возвращаем прежние имя и путь."""
+    if operation.file_id is None or storage.stat_sync(operation.source) is None:
+        return
+    db_file = db.get(File, operation.file_id)
+    if db_file is None or db_file.path != operation.target:
+        return  # Запись уже изменена или удалена после этой операции
+    name = os.path.splitext(os.path.basename(operation.source))[0]
+    taken = db.query(File.id).filter(File.name == name, File.id != db_file.id).first()
+    if taken:
+        logging.error(f"Запись о файле {db_file.name} не возвращена к пути {operation.source}: имя {name} уже занято.")
+        return
+    metadata_cache.invalidate_threadsafe([db_file.name, name])
+    db_file.name = name
+    db_file.path = operation.source
+
+
+class FileOperationRunner:
+    """
+    Исполнитель операций из журнала в выделенном пуле потоков: долгие копирования между файловыми
+    системами или хранилищами не занимают общий пул потоков, обслуживающий запросы.
+    Операции над одним файлом выполняются строго в порядке записи в журнал.
+    """
+
+    def __init__(self, workers: int = FILE_OPS_WORKERS, session_factory: Callable[[], Session] = SessionLocal):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="file-ops")
+        self.session_factory = session_factory
+        self.tasks: Dict[int, asyncio.Task] = {}
+        self.tails: Dict[object, asyncio.Task] = {}  # Последняя операция над файлом (id записи или путь)
+
+    def submit(self, operation_id: int, key) -> asyncio.Task:
+        task = self.tasks.get(operation_id)
+        if task is not None:
+            return task
+        task = asyncio.create_task(self._run(operation_id, self.tails.get(key)))
+        self.tasks[operation_id] = task
+        self.tails[key] = task
+        task.add_done_callback(lambda _: self._forget(operation_id, key, task))
+        return task
+
+    def _forget(self, operation_id: int, key, task: asyncio.Task) -> None:
+        self.tasks.pop(operation_id, None)
+        if self.tails.get(key) is task:
+            del self.tails[key]
+        if not task.cancelled() and task.exception() is not None:
+            logging.error(f"Операция {operation_id} не выполнена и будет повторена при перезапуске: {task.exception()}")
+
+    async def _run(self, operation_id: int, previous: Optional[asyncio.Task]) -> str:
+        if previous is not None:
+            await asyncio.wait({previous})
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.execute, operation_id)
+
+    def execute(self, operation_id: int) -> str:
+        """Выполняет операцию в потоке пула и отмечает результат в журнале."""
+        storage = get_storage()
+        db = self.session_factory()
+        try:
+            operation = db.get(FileOperation, operation_id)
+            if operation is None or operation.status != PENDING:
+                return operation.status if operation else DONE
+            try:
+                if operation.kind == "move":
+                    _move(storage, operation.source, operation.target)
+                else:
+                    storage.delete_sync(operation.source)
+                operation.status = DONE
+            except Exception as e:
+                logging.error(f"Ошибка при выполнении операции {operation.kind} для {operation.source}: {e}")
+                operation.status = FAILED
+                operation.error = str(e)
+                if operation.kind == "move":
+                    _revert_move(db, storage, operation)
+            operation.finished_at = datetime.utcnow()
+            db.commit()
+            return operation.status
+        finally:
+            db.close()
+
+    async def wait(self, operation_ids: List[int], timeout: float) -> Dict[int, Optional[str]]:
+        """Ждёт операции не дольше timeout; None - операция ещё выполняется."""
+        tasks = {operation_id: self.tasks[operation_id] for operation_id in operation_ids if operation_id in self.tasks}
+        if tasks:
+            await asyncio.wait(tasks.values(), timeout=timeout)
+        statuses = {}
+        for operation_id in operation_ids:
+            task = tasks.get(operation_id)
+            if task is None:
+                statuses[operation_id] = DONE
+            elif task.done() and not task.cancelled() and task.exception() is None:
+                statuses[operation_id] = task.result()
+            else:
+                statuses[operation_id] = None
+        return statuses
+
+
+runner = FileOperationRunner()
+
+
+async def run_operations(operations: List[FileOperation], wait: float = FILE_OPS_WAIT) -> Dict[int, Optional[str]]:
+    """
+    Передаёт зафиксированные в журнале операции исполнителю и ждёт их не дольше wait секунд.
+    Возвращает статус каждой операции; None - операция продолжается в фоне.
+    """
+    for operation in operations:
+        runner.submit(operation.id, operation.file_id or operation.source)
+    return await runner.wait([operation.id for operation in operations], wait)
+
+
+async def purge_finished_operations(db: AsyncSession, ttl: int = FILE_OPS_TTL) -> None:
+    cutoff = datetime.utcnow() - timedelta(seconds=ttl)
+    await db.execute(delete(FileOperation).where(FileOperation.status != PENDING, FileOperation.finished_at < cutoff))
+    await db.commit()
+
+
+async def recover_operations() -> None:
+    """Повторяет операции, не завершённые до остановки приложения, в порядке записи в журнал."""
+    async with AsyncSessionLocal() as db:
+        await purge_finished_operations(db)
+        rows = (await db.execute(
+            select(FileOperation.id, FileOperation.file_id, FileOperation.source)
+            .where(FileOperation.status == PENDING)
+            .order_by(FileOperation.id)
+        )).all()
+    for row in rows:
+        runner.submit(row.id, row.file_id or row.source)
+    if rows:
+        logging.info(f"Возобновлено незавершённых операций с файлами: {len(rows)}.")
+
+
+async def run_operations_cleanup(interval: int = 60 * 60) -> None:
+    """Фоновая задача: удаляет из журнала записи о давно завершённых операциях."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with AsyncSessionLocal() as db:
+                await purge_finished_operations(db)
+        except Exception as e:
+            logging.error(f"Ошибка при очистке журнала операций с файлами: {e}", exc_info=True)
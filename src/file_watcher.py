@@ -1,79 +1,368 @@
 import logging
 import os
+import queue
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, NamedTuple, Optional, Set, Tuple
 
+from sqlalchemy import and_, insert, or_, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from watchdog.events import FileSystemEventHandler
+from watchdog.events import FileSystemEvent, FileSystemEventHandler
 from watchdog.observers import Observer
 
-from src.crud import create_file_record
+from src.cache import metadata_cache
+from src.config import (
+    FILES_DIR,
+    WATCHER_BATCH_SIZE,
+    WATCHER_DEBOUNCE,
+    WATCHER_QUEUE_SIZE,
+    WATCHER_WORKERS,
+)
+from src.database import SessionLocal
+from src.metrics import WATCHER_EVENT_LAG
 from src.models import File
-from src.schemas import FileCreate
+from src.previews import delete_previews_sync, preview_pipeline
+from src.schemas import WatcherStats
+from src.utils import mtime_to_datetime, normalize_directory, parent_directory
 
-import datetime
+
+class FileStat(NamedTuple):
+    size: int
+    mtime_ns: int
+
+
+def stat_file(path: str) -> Optional[FileStat]:
+    """stat файла; None, если файла уже нет."""
+    try:
+        st = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    return FileStat(st.st_size, st.st_mtime_ns)
+
+
+class PendingChange:
+    """
+    Накопленное изменение пути: upsert (файл создан или изменён), delete (файл удалён)
+    или delete_tree (удалена директория). moved_from - прежний путь переименованного файла,
+    received - время получения первого события изменения (для метрики задержки наблюдателя).
+    """
+
+    __slots__ = ("kind", "moved_from", "last_event", "last_size", "received")
+
+    def __init__(self, kind: str, moved_from: Optional[str] = None, received: Optional[float] = None):
+        self.kind = kind
+        self.moved_from = moved_from
+        self.last_event = time.monotonic()
+        self.last_size: Optional[int] = None
+        self.received = received or self.last_event
 
 
 class FileEventHandler(FileSystemEventHandler):
     """
-    Обработчик событий для файловой системы, который реагирует на события создания новых файлов
-    и добавляет их в базу данных.
+    Обработчик событий файловой системы: только складывает события в ограниченную очередь.
+    Если очередь заполнена, поток наблюдателя ждёт, пока конвейер её разберёт.
+    События служебных путей (части загрузок, блобы, превью) отбрасываются сразу и не занимают очередь.
     """
 
-    def __init__(self, db_session: Session):
-        self.db_session = db_session
-        self.root_dir = "src/files"
-
-    def on_created(self, event):
-        """
-        Метод, вызываемый при создании файла в отслеживаемой директории.
-        """
-        if not event.is_directory:
-            file_path = event.src_path
-            relative_file_path = os.path.relpath(file_path, self.root_dir)
-            file_name = os.path.basename(file_path)
-            file_base_name, file_extension = os.path.splitext(file_name)
-            file_size = os.path.getsize(file_path)
-
-            time.sleep(1)  # Даем системе время на завершение копирования файла
-
-            # Проверка на существование файла в базе данных
-            existing_file = self.db_session.query(File).filter(
-                File.name == file_base_name,
-                File.extension == file_extension
-            ).first()
-
-            if existing_file:  # Если файл уже есть в базе данных, выходим
-                logging.info(f"Файл {file_base_name} уже существует в базе данных.")
+    def __init__(self, pipeline: "WatcherPipeline"):
+        self.pipeline = pipeline
+
+    def on_any_event(self, event: FileSystemEvent):
+        if event.event_type not in ("created", "modified", "deleted", "moved"):
+            return
+        if self.pipeline.ignored(event.src_path) and (
+            event.event_type != "moved" or self.pipeline.ignored(event.dest_path)
+        ):
+            return
+        self.pipeline.put(event)
+
+
+class WatcherPipeline:
+    """
+    Конвейер обработки событий наблюдателя за директорией.
+
+    События по одному пути объединяются, пока файл не перестанет меняться: после WATCHER_DEBOUNCE
+    секунд без событий пул потоков делает stat, и если размер с прошлой проверки изменился
+    (файл ещё копируется), проверка откладывается. Готовые изменения применяются пакетами
+    INSERT/UPDATE/DELETE, по одной транзакции на пакет.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal, root_dir: str = FILES_DIR, queue_size: int = WATCHER_QUEUE_SIZE,
+                 debounce: float = WATCHER_DEBOUNCE, workers: int = WATCHER_WORKERS,
+                 batch_size: int = WATCHER_BATCH_SIZE):
+        self.session_factory = session_factory  # Своя сессия на каждый пакет изменений
+        self.root_dir = os.path.normpath(root_dir)
+        # События вместе со временем их получения
+        self.events: "queue.Queue[Tuple[float, FileSystemEvent]]" = queue.Queue(maxsize=queue_size)
+        self.debounce = debounce
+        self.batch_size = batch_size
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="watcher-stat")
+        self.pending: Dict[str, PendingChange] = {}
+        self.stopped = threading.Event()
+        self.stats = WatcherStats()
+
+    def ignored(self, path: str) -> bool:
+        """Служебные файлы и директории (.uploads, .blobs, временные файлы редакторов) не отслеживаются."""
+        relative = os.path.relpath(path, self.root_dir)
+        return relative.startswith("..") or any(part.startswith(".") for part in relative.split(os.sep))
+
+    def put(self, event: FileSystemEvent) -> None:
+        self.stats.events_received += 1
+        item = (time.monotonic(), event)
+        try:
+            self.events.put_nowait(item)
+        except queue.Full:
+            self.stats.backpressure_waits += 1
+            self.events.put(item)
+        self.stats.queue_max_depth = max(self.stats.queue_max_depth, self.events.qsize())
+
+    def _coalesce(self, item: Tuple[float, FileSystemEvent]) -> None:
+        received, event = item
+        src_path = os.path.normpath(event.src_path)
+        if event.event_type == "moved":
+            dest_path = os.path.normpath(event.dest_path)
+            if event.is_directory:
+                return  # Для файлов внутри директории приходят отдельные события перемещения
+            if self.ignored(dest_path):
+                if not self.ignored(src_path):
+                    self._add(src_path, PendingChange("delete", received=received))
+                return
+            if self.ignored(src_path):
+                # Файл переименован из временного имени (например, при атомарной записи)
+                self._add(dest_path, PendingChange("upsert", received=received))
                 return
+            previous = self.pending.pop(src_path, None)
+            if previous is None or previous.kind != "upsert":
+                moved_from = src_path
+            else:
+                # Если файл ещё не попал в базу данных, достаточно добавить новый путь
+                moved_from, received = previous.moved_from, previous.received
+            self._add(dest_path, PendingChange("upsert", moved_from=moved_from, received=received))
+            return
+
+        if self.ignored(src_path):
+            return
+        if event.is_directory:
+            if event.event_type == "deleted":
+                self._add(src_path, PendingChange("delete_tree", received=received))
+            return
+        if event.event_type == "deleted":
+            self._add(src_path, PendingChange("delete", received=received))
+            return
+        previous = self.pending.get(src_path)
+        if previous is not None and previous.kind == "upsert":
+            previous.last_event = time.monotonic()  # Файл ещё записывается: откладываем проверку
+            return
+        self._add(src_path, PendingChange("upsert", received=received))
+
+    def _add(self, path: str, change: PendingChange) -> None:
+        if path in self.pending:
+            self.stats.events_coalesced += 1
+        self.pending[path] = change
+
+    def _due(self) -> List[str]:
+        deadline = time.monotonic() - self.debounce
+        return [path for path, change in self.pending.items() if change.last_event <= deadline]
+
+    def _collect_ready(self) -> List[Tuple[str, PendingChange, Optional[FileStat]]]:
+        """Проверяет размеры отложенных файлов в пуле потоков и возвращает изменения, готовые к записи."""
+        due = self._due()
+        stats = self.executor.map(stat_file, due)
+        ready = []
+        now = time.monotonic()
+        for path, stat in zip(due, stats):
+            change = self.pending[path]
+            if change.kind == "upsert" and stat is not None and stat.size != change.last_size:
+                change.last_size = stat.size  # Размер ещё меняется: проверим ещё раз позже
+                change.last_event = now
+                continue
+            del self.pending[path]
+            ready.append((path, change, stat))
+        return ready
+
+    def apply(self, db: Session, changes: List[Tuple[str, PendingChange, Optional[FileStat]]]) -> None:
+        """Применяет пакет изменений одной транзакцией."""
+        started = time.monotonic()
+        lookup = {path for path, change, _ in changes} | {change.moved_from for _, change, _ in changes
+                                                           if change.moved_from}
+        rows = {
+            row.path: row for row in db.query(
+                File.id, File.path, File.name, File.extension, File.size, File.modified_at, File.blob_hash,
+                File.preview_key,
+            ).filter(File.path.in_(lookup))
+        }
+
+        deleted_ids: Set[int] = set()
+        released: Set[str] = set()  # Имена удаляемых и переименовываемых записей
+        previews: List[Optional[str]] = []  # Превью удаляемых записей
+        updates, inserts, trees = [], [], []
+        changed_names: Set[str] = set()  # Имена, записи кеша метаданных которых нужно сбросить
+        processing: List[str] = []  # Пути файлов с новым содержимым для извлечения метаданных и превью
+        now = datetime.utcnow()
+        for path, change, stat in changes:
+            row = rows.get(path)
+            if change.kind == "delete_tree":
+                trees.append(path)
+            elif change.kind == "delete" or stat is None:
+                source = rows.get(change.moved_from) if change.moved_from else None
+                for gone in (row, source):
+                    if gone is not None and gone.blob_hash is None:
+                        deleted_ids.add(gone.id)
+                        released.add(gone.name)
+                        previews.append(gone.preview_key)
+            elif row is not None:
+                # Путь уже есть в каталоге: файл изменён или перезаписан переименованием
+                if row.blob_hash is None and (row.size != stat.size
+                                              or row.modified_at != mtime_to_datetime(stat.mtime_ns)):
+                    updates.append({"id": row.id, "size": stat.size, "checksum": None, "updated_at": now,
+                                    "modified_at": mtime_to_datetime(stat.mtime_ns), "processed_at": None})
+                    changed_names.add(row.name)
+                    processing.append(path)
+                source = rows.get(change.moved_from) if change.moved_from else None
+                if source is not None and source.blob_hash is None:
+                    deleted_ids.add(source.id)
+                    released.add(source.name)
+                    previews.append(source.preview_key)
+            else:
+                inserts.append((path, change, stat))
 
-            # Если файла нет в базе данных, создаем новую запись
-            new_file = FileCreate(
-                name=file_base_name,
-                extension=file_extension,
-                size=file_size,
-                path=f"src/files/{file_name}",
-                created_at=datetime.datetime.utcnow()
+        # Переименования и новые файлы: проверяем, что имя не занято другой записью
+        names = {os.path.splitext(os.path.basename(path))[0] for path, _, _ in inserts}
+        taken = {row.name for row in db.query(File.name).filter(File.name.in_(names))}
+        taken -= released
+        new_rows = []
+        renamed = 0
+        for path, change, stat in inserts:
+            name, extension = os.path.splitext(os.path.basename(path))
+            source = rows.get(change.moved_from) if change.moved_from else None
+            if source is not None and source.blob_hash is None:
+                if name in taken and name != source.name:
+                    logging.warning(f"Файл {path} не добавлен: имя {name} уже занято.")
+                    continue
+                taken.discard(source.name)
+                taken.add(name)
+                changed_names.update((source.name, name))
+                updates.append({"id": source.id, "name": name, "extension": extension, "path": path,
+                                "directory": parent_directory(path), "size": stat.size, "updated_at": now,
+                                "modified_at": mtime_to_datetime(stat.mtime_ns)})
+                renamed += 1
+                continue
+            if name in taken:
+                logging.info(f"Файл {name}{extension} не добавлен: имя {name} уже существует в базе данных.")
+                continue
+            taken.add(name)
+            new_rows.append({"name": name, "extension": extension, "size": stat.size, "path": path,
+                             "directory": parent_directory(path), "created_at": now,
+                             "modified_at": mtime_to_datetime(stat.mtime_ns)})
+            processing.append(path)
+
+        if deleted_ids:
+            db.query(File).filter(File.id.in_(deleted_ids)).delete(synchronize_session=False)
+        for directory in trees:
+            directory = normalize_directory(directory)
+            subtree = db.query(File).filter(
+                File.blob_hash.is_(None),
+                or_(File.directory == directory,
+                    and_(File.directory >= directory + "/", File.directory < directory + "0")),
+            )
+            for row in subtree.with_entities(File.name, File.preview_key):
+                changed_names.add(row.name)
+                previews.append(row.preview_key)
+            subtree.delete(synchronize_session=False)
+        if updates:
+            db.execute(update(File), updates)
+        if new_rows:
+            db.execute(insert(File), new_rows)
+        db.commit()
+        committed = time.monotonic()
+        for _, change, _ in changes:
+            WATCHER_EVENT_LAG.observe(committed - change.received)
+        metadata_cache.invalidate_threadsafe(changed_names | released)
+        delete_previews_sync(previews)
+        preview_pipeline.schedule_paths_threadsafe(processing)
+
+        self.stats.batches += 1
+        self.stats.files_added += len(new_rows)
+        self.stats.files_updated += len(updates) - renamed
+        self.stats.files_renamed += renamed
+        self.stats.files_deleted += len(deleted_ids)
+        self.stats.last_batch_size = len(changes)
+        self.stats.last_batch_duration = round(time.monotonic() - started, 3)
+        if new_rows or updates or deleted_ids or trees:
+            logging.info(
+                f"Наблюдатель: добавлено {len(new_rows)}, изменено {len(updates) - renamed}, "
+                f"переименовано {renamed}, удалено {len(deleted_ids)} файлов."
             )
 
-            # Сохраняем новую запись файла в базе данных
-            create_file_record(self.db_session, new_file)
-            logging.info(f"Файл {file_base_name} добавлен в базу данных с расширением {file_extension}.")
+    def _apply_batch(self, changes) -> None:
+        with self.session_factory() as db:
+            try:
+                self.apply(db, changes)
+                return
+            except IntegrityError:
+                # Запись успели изменить параллельно (API или сверка): применяем изменения по одному
+                db.rollback()
+            for change in changes:
+                try:
+                    self.apply(db, [change])
+                except IntegrityError:
+                    db.rollback()
+                    logging.warning(f"Наблюдатель: изменение {change[0]} пропущено из-за конфликта.")
+
+    def run(self) -> None:
+        """Цикл конвейера: разбирает очередь событий и записывает готовые изменения пакетами."""
+        tick = min(self.debounce, 0.5) or 0.1
+        while not self.stopped.is_set():
+            try:
+                self._coalesce(self.events.get(timeout=tick))
+                # Забираем всё, что накопилось, не дожидаясь следующего тика
+                while True:
+                    self._coalesce(self.events.get_nowait())
+            except queue.Empty:
+                pass
+            if self.pending:
+                try:
+                    ready = self._collect_ready()
+                    for start in range(0, len(ready), self.batch_size):
+                        self._apply_batch(ready[start:start + self.batch_size])
+                except Exception as e:
+                    logging.error(f"Ошибка при обработке событий наблюдателя: {e}", exc_info=True)
+            self.stats.queue_depth = self.events.qsize()
+            self.stats.pending = len(self.pending)
 
+    def stop(self) -> None:
+        self.stopped.set()
+        self.executor.shutdown(wait=False)
 
-def start_watching(directory, db_session):
+
+# Конвейер запущенного наблюдателя (для метрик)
+pipeline: Optional[WatcherPipeline] = None
+
+
+def start_watching(directory, session_factory: Callable[[], Session] = SessionLocal):
     """
-    Функция для запуска наблюдателя за изменениями в директории.
+    Функция для запуска наблюдателя за изменениями в директории (рекурсивно).
+    Блокирует вызывающий поток до остановки наблюдателя.
     """
-    event_handler = FileEventHandler(db_session)
+    global pipeline
+    pipeline = WatcherPipeline(session_factory, root_dir=directory)
+    worker = threading.Thread(target=pipeline.run, name="watcher-pipeline", daemon=True)
+    worker.start()
+
     observer = Observer()
-    observer.schedule(event_handler, directory, recursive=False)
+    observer.schedule(FileEventHandler(pipeline), directory, recursive=True)
     observer.start()
     logging.info(f"Мониторинг директории: {directory}")
 
     try:
-        while True:
-            pass
+        while observer.is_alive():
+            observer.join(1)
     except KeyboardInterrupt:
         observer.stop()
+    finally:
+        pipeline.stop()
 
-    observer.join() 
+    observer.join()
@@ -0,0 +1,105 @@
+import mimetypes
+import mmap
+import re
+from typing import Optional
+
+# Функции модуля выполняются в процессах пула (src/previews.py),
+# поэтому здесь нет импортов базы данных и приложения
+
+# Сигнатуры форматов для определения MIME-типа по содержимому
+SIGNATURES = [
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+    (b"%PDF-", "application/pdf"),
+    (b"PK\x03\x04", "application/zip"),
+    (b"\x1f\x8b", "application/gzip"),
+    (b"\x28\xb5\x2f\xfd", "application/zstd"),
+]
+
+# Объект страницы PDF (но не /Pages - узел дерева страниц)
+PDF_PAGE = re.compile(rb"/Type\s*/Page(?![a-zA-Z])")
+
+
+def sniff_mime_type(header: bytes, file_name: str) -> str:
+    """MIME-тип по первым байтам содержимого, иначе по расширению имени файла."""
+    for signature, mime_type in SIGNATURES:
+        if header.startswith(signature):
+            return mime_type
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp"
+    guessed, _ = mimetypes.guess_type(file_name)
+    return guessed or "application/octet-stream"
+
+
+def extract_metadata(source: str, file_name: str, preview_path: str, preview_size: int) -> dict:
+    """
+    Определяет тип содержимого файла source, размеры изображения или число страниц PDF
+    и, если возможно, сохраняет превью в preview_path (JPEG).
+    """
+    with open(source, "rb") as f:
+        header = f.read(16)
+    mime_type = sniff_mime_type(header, file_name)
+    result = {"mime_type": mime_type, "width": None, "height": None, "page_count": None, "preview": False}
+    if mime_type.startswith("image/"):
+        result.update(_image_metadata(source, preview_path, preview_size))
+    elif mime_type == "application/pdf":
+        result["page_count"] = _pdf_page_count(source)
+        result["preview"] = _pdf_preview(source, preview_path, preview_size)
+    return result
+
+
+def _image_metadata(source: str, preview_path: str, preview_size: int) -> dict:
+    try:
+        from PIL import Image
+    except ImportError:
+        return {}  # Без Pillow известен только тип изображения
+
+    with Image.open(source) as image:
+        width, height = image.size
+        # Для JPEG декодер сразу уменьшает изображение в 2-8 раз, не распаковывая его целиком
+        image.draft("RGB", (preview_size, preview_size))
+        image.thumbnail((preview_size, preview_size))
+        if image.mode not in ("RGB", "L"):
+            # JPEG не поддерживает прозрачность: накладываем изображение на белый фон
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, "white")
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        image.save(preview_path, "JPEG", quality=85)
+    return {"width": width, "height": height, "preview": True}
+
+
+def _pdf_page_count(source: str) -> Optional[int]:
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        return _count_pdf_pages(source)
+    try:
+        return len(PdfReader(source).pages)
+    except Exception:
+        return _count_pdf_pages(source)
+
+
+def _count_pdf_pages(source: str) -> Optional[int]:
+    """Без pypdf: подсчёт объектов страниц (не находит страницы в сжатых потоках объектов)."""
+    with open(source, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        return len(PDF_PAGE.findall(data)) or None
+
+
+def _pdf_preview(source: str, preview_path: str, preview_size: int) -> bool:
+    try:
+        import fitz
+    except ImportError:
+        return False  # Для превью PDF нужен PyMuPDF
+
+    with fitz.open(source) as document:
+        if not document.page_count:
+            return False
+        page = document[0]
+        zoom = preview_size / max(page.rect.width, page.rect.height)
+        page.get_pixmap(matrix=fitz.Matrix(zoom, zoom)).save(preview_path, output="jpeg")
+    return True
@@ -0,0 +1,219 @@
+import os
+import time
+from typing import Optional, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Длительность запросов: скачивание и загрузка больших файлов занимают минуты
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+RATE_BUCKETS = tuple(2 ** power for power in range(16, 32, 2))  # 64 КиБ/с ... 512 МиБ/с
+LAG_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60, 300)
+
+# Скорость передачи считается только для тел запросов и ответов не меньше этого размера
+TRANSFER_RATE_MIN_BYTES = 1024 * 1024
+
+REQUESTS = Counter("http_requests_total", "Запросы по маршрутам и кодам ответа", ["method", "route", "status"])
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Длительность запроса до отправки последнего байта ответа",
+    ["method", "route"], buckets=LATENCY_BUCKETS,
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "Выполняющиеся запросы", ["method"], multiprocess_mode="livesum",
+)
+REQUEST_BYTES = Counter("http_request_body_bytes", "Принятые байты тел запросов", ["route"])
+RESPONSE_BYTES = Counter("http_response_body_bytes", "Отправленные байты тел ответов", ["route"])
+TRANSFER_RATE = Histogram(
+    "http_transfer_rate_bytes_per_second", "Скорость загрузки (upload) и скачивания (download) тел больше 1 МиБ",
+    ["direction"], buckets=RATE_BUCKETS,
+)
+
+RATE_LIMITED = Counter("http_requests_rate_limited", "Запросы, отклонённые ограничениями клиента (429)", ["reason"])
+TRANSFER_THROTTLED = Counter(
+    "transfer_throttled_seconds", "Задержка передачи ограничением скорости клиента", ["direction"],
+)
+
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds", "Длительность SQL-запросов", ["engine", "statement"], buckets=QUERY_BUCKETS,
+)
+DB_QUERY_ERRORS = Counter("db_query_errors", "SQL-запросы, завершившиеся ошибкой", ["engine"])
+DB_CONNECTIONS_IN_USE = Gauge(
+    "db_pool_connections_in_use", "Соединения, выданные пулом", ["engine"], multiprocess_mode="livesum",
+)
+
+WATCHER_EVENT_LAG = Histogram(
+    "watcher_event_lag_seconds", "Время от события файловой системы до фиксации изменения в базе данных",
+    buckets=LAG_BUCKETS,
+)
+
+# Первое слово SQL-запроса, по которому запросы группируются в метриках
+STATEMENT_KINDS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "BEGIN", "COMMIT", "ROLLBACK", "PRAGMA"}
+
+
+def statement_kind(statement: str) -> str:
+    words = statement.lstrip().split(None, 1)
+    kind = words[0].upper() if words else ""
+    return kind if kind in STATEMENT_KINDS else "OTHER"
+
+
+def instrument_engine(engine: Engine, name: str) -> None:
+    """Замеряет SQL-запросы и выданные соединения движка через события SQLAlchemy."""
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        DB_QUERY_DURATION.labels(name, statement_kind(statement)).observe(time.perf_counter() - started)
+
+    def handle_error(context):
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
+        DB_QUERY_ERRORS.labels(name).inc()
+
+    in_use = DB_CONNECTIONS_IN_USE.labels(name)
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(engine, "handle_error", handle_error)
+    event.listen(engine, "checkout", lambda *args: in_use.inc())
+    event.listen(engine, "checkin", lambda *args: in_use.dec())
+
+
+class MetricsMiddleware:
+    """
+    ASGI-middleware: длительность и число запросов по шаблону маршрута, выполняющиеся запросы,
+    объём и скорость передачи тел запросов и ответов. Длительность считается до отправки
+    последнего байта, поэтому для потоковых ответов включает всю передачу.
+    Если включено профилирование (src/profiler.py), медленные запросы профилируются здесь же.
+    """
+
+    def __init__(self, app, profiler=None):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        started = time.perf_counter()
+        received = sent = 0
+        status = 500
+
+        async def counting_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message):
+            nonlocal sent, status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                sent += len(message.get("body", b""))
+            await send(message)
+
+        in_progress = REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        profile = self.profiler.begin(method, scope["path"]) if self.profiler else None
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            duration = time.perf_counter() - started
+            in_progress.dec()
+            if profile is not None:
+                self.profiler.end(profile, duration)
+            route = _route_template(scope)
+            REQUESTS.labels(method, route, str(status)).inc()
+            REQUEST_DURATION.labels(method, route).observe(duration)
+            if received:
+                REQUEST_BYTES.labels(route).inc(received)
+            if sent:
+                RESPONSE_BYTES.labels(route).inc(sent)
+            if duration > 0:
+                if received >= TRANSFER_RATE_MIN_BYTES:
+                    TRANSFER_RATE.labels("upload").observe(received / duration)
+                if sent >= TRANSFER_RATE_MIN_BYTES:
+                    TRANSFER_RATE.labels("download").observe(sent / duration)
+
+
+def _route_template(scope) -> str:
+    """Шаблон маршрута (/file/{file_name}), а не путь: число значений метки не зависит от имён файлов."""
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class StatsCollector:
+    """Счётчики, которые компоненты уже собирают сами: очередь наблюдателя, кеш метаданных, превью, операции."""
+
+    def describe(self):
+        return []  # Без describe реестр вызвал бы collect при регистрации, до импорта компонентов
+
+    def collect(self):
+        # Импорт при сборе: модули компонентов сами импортируют базу данных, которая импортирует этот модуль
+        from src import file_watcher
+        from src.cache import metadata_cache
+        from src.file_operations import runner
+        from src.previews import preview_pipeline
+
+        pipeline = file_watcher.pipeline
+        if pipeline is not None:
+            stats = pipeline.stats
+            yield _gauge("watcher_queue_depth", "События в очереди наблюдателя", pipeline.events.qsize())
+            yield _gauge("watcher_pending_paths", "Пути, ожидающие окончания записи файла", len(pipeline.pending))
+            yield _counter("watcher_events", "События файловой системы", stats.events_received)
+            yield _counter("watcher_events_coalesced", "События, объединённые с необработанными", stats.events_coalesced)
+            yield _counter("watcher_backpressure_waits", "Ожидания места в очереди наблюдателя", stats.backpressure_waits)
+            yield _counter("watcher_batches", "Пакеты изменений наблюдателя", stats.batches)
+
+        cache = metadata_cache.stats
+        for field in ("hits", "misses", "expirations", "evictions", "invalidations", "shared_hits", "shared_misses"):
+            yield _counter(f"metadata_cache_{field}", f"Кеш метаданных: {field}", getattr(cache, field))
+        yield _gauge("metadata_cache_size", "Записи в кеше метаданных", cache.size)
+
+        if preview_pipeline.queue is not None:
+            yield _gauge("preview_queue_depth", "Файлы в очереди извлечения метаданных и превью",
+                         preview_pipeline.queue.qsize())
+        yield _gauge("file_operations_in_progress", "Выполняющиеся операции перемещения и удаления",
+                     len(runner.tasks))
+
+
+def _gauge(name: str, documentation: str, value) -> GaugeMetricFamily:
+    return GaugeMetricFamily(name, documentation, value=value)
+
+
+def _counter(name: str, documentation: str, value) -> CounterMetricFamily:
+    return CounterMetricFamily(name, documentation, value=value)
+
+
+REGISTRY.register(StatsCollector())
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """
+    Метрики в текстовом формате Prometheus. При запуске нескольких процессов (uvicorn --workers)
+    prometheus_client собирает их из PROMETHEUS_MULTIPROC_DIR.
+    """
+    registry: Optional[CollectorRegistry] = REGISTRY
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(StatsCollector())
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,161 @@
+import logging
+
+from sqlalchemy import Column, inspect, text
+from sqlalchemy.engine import Connection, Dialect, Engine
+from sqlalchemy.exc import OperationalError
+
+from src.models import Base
+from src.utils import parent_directory
+
+# Колонки, добавленные в таблицы после первой версии схемы.
+# create_all не изменяет существующие таблицы, поэтому для старых баз (например, test.db)
+# недостающие nullable-колонки добавляются через ALTER TABLE. Тип колонки берётся из модели
+# и компилируется для диалекта базы (DATETIME в SQLite, TIMESTAMP в PostgreSQL).
+ADDED_COLUMNS = {
+    "files": [
+        "checksum", "blob_hash", "directory", "modified_at", "mime_type", "width", "height",
+        "page_count", "preview_key", "processed_at", "encoding", "stored_size",
+    ],
+    "blobs": ["encoding", "stored_size"],
+    "upload_sessions": ["assembling_at"],
+}
+
+# Индексы, отсутствующие в старых базах: (имя индекса, таблица, колонки, уникальный)
+ADDED_INDEXES = [
+    ("ix_files_blob_hash", "files", "blob_hash", False),
+    ("ix_files_directory", "files", "directory", False),
+    ("ix_files_created_at", "files", "created_at", False),
+    ("ix_files_processed_at", "files", "processed_at", False),
+    ("ix_files_path", "files", "path", False),
+    ("uq_files_name", "files", "name", True),
+]
+
+# Индексы прежних версий схемы, которые больше не нужны
+DROPPED_INDEXES = [
+    "uq_files_name_extension",  # Заменён уникальным индексом по имени без расширения
+]
+
+# Размер пакета при заполнении новых колонок
+BATCH_SIZE = 1000
+
+
+def column_ddl(column: Column, dialect: Dialect) -> str:
+    """Описание колонки модели для ALTER TABLE ADD COLUMN: тип и внешний ключ."""
+    ddl = column.type.compile(dialect=dialect)
+    for foreign_key in column.foreign_keys:
+        ddl += f" REFERENCES {foreign_key.column.table.name}({foreign_key.column.name})"
+    return ddl
+
+
+def add_missing_columns(engine: Engine) -> None:
+    """Добавляет в существующие таблицы колонки, появившиеся в моделях позже."""
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table, columns in ADDED_COLUMNS.items():
+            if not inspector.has_table(table):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table)}
+            for name in columns:
+                if name not in existing:
+                    ddl = column_ddl(Base.metadata.tables[table].c[name], engine.dialect)
+                    connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+                    logging.info(f"Миграция: в таблицу {table} добавлена колонка {name}.")
+
+
+def fill_file_directories(connection: Connection) -> None:
+    """Заполняет files.directory для записей, созданных до появления колонки."""
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            text("SELECT id, path FROM files WHERE directory IS NULL AND id > :last_id ORDER BY id LIMIT :limit"),
+            {"last_id": last_id, "limit": BATCH_SIZE},
+        ).fetchall()
+        if not rows:
+            break
+        connection.execute(
+            text("UPDATE files SET directory = :directory WHERE id = :id"),
+            [{"id": row.id, "directory": parent_directory(row.path)} for row in rows],
+        )
+        last_id = rows[-1].id
+
+
+def rename_duplicate_files(connection: Connection) -> None:
+    """
+    Перед созданием уникального индекса переименовывает записи с одинаковым именем, которые могли
+    появиться в старых базах из-за гонки проверки и вставки или как файлы с разными расширениями.
+    Первая запись сохраняет имя, к остальным добавляется суффикс с их id; если такое имя уже занято
+    (например, другим файлом "report_7"), к суффиксу добавляется номер.
+    """
+    duplicates = connection.execute(text(
+        "SELECT name, MIN(id) AS keep_id FROM files GROUP BY name HAVING COUNT(*) > 1"
+    )).fetchall()
+    for row in duplicates:
+        file_ids = connection.execute(
+            text("SELECT id FROM files WHERE name = :name AND id != :keep_id ORDER BY id"),
+            {"name": row.name, "keep_id": row.keep_id},
+        ).scalars().all()
+        for file_id in file_ids:
+            new_name = f"{row.name}_{file_id}"
+            attempt = 1
+            while connection.execute(text("SELECT 1 FROM files WHERE name = :name"), {"name": new_name}).first():
+                attempt += 1
+                new_name = f"{row.name}_{file_id}_{attempt}"
+            connection.execute(text("UPDATE files SET name = :name WHERE id = :id"), {"name": new_name, "id": file_id})
+        logging.warning(f"Миграция: переименовано дубликатов файла '{row.name}': {len(file_ids)}.")
+
+
+def add_missing_indexes(engine: Engine) -> None:
+    """Создаёт индексы, отсутствующие в старых базах, и удаляет устаревшие."""
+    with engine.begin() as connection:
+        for name in DROPPED_INDEXES:
+            connection.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        for name, table, columns, unique in ADDED_INDEXES:
+            connection.execute(text(
+                f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} ON {table} ({columns})"
+            ))
+
+
+# Полнотекстовый индекс SQLite FTS5 по имени и комментарию файла. Таблица files_fts хранит
+# только индекс (external content), а триггеры поддерживают его при любых изменениях files,
+# откуда бы они ни пришли: API, наблюдатель за директорией или ручные правки базы.
+FULLTEXT_SCHEMA = [
+    """CREATE VIRTUAL TABLE files_fts USING fts5(
+        name, comment, content='files', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    """CREATE TRIGGER files_fts_insert AFTER INSERT ON files BEGIN
+        INSERT INTO files_fts(rowid, name, comment) VALUES (new.id, new.name, new.comment);
+    END""",
+    """CREATE TRIGGER files_fts_delete AFTER DELETE ON files BEGIN
+        INSERT INTO files_fts(files_fts, rowid, name, comment) VALUES ('delete', old.id, old.name, old.comment);
+    END""",
+    """CREATE TRIGGER files_fts_update AFTER UPDATE OF name, comment ON files BEGIN
+        INSERT INTO files_fts(files_fts, rowid, name, comment) VALUES ('delete', old.id, old.name, old.comment);
+        INSERT INTO files_fts(rowid, name, comment) VALUES (new.id, new.name, new.comment);
+    END""",
+    # Индексируем записи, созданные до появления полнотекстового поиска
+    "INSERT INTO files_fts(files_fts) VALUES ('rebuild')",
+]
+
+
+def create_fulltext_index(engine: Engine) -> None:
+    """Создаёт полнотекстовый индекс files_fts, если его ещё нет (только для SQLite)."""
+    if engine.dialect.name != "sqlite" or inspect(engine).has_table("files_fts"):
+        return
+    try:
+        with engine.begin() as connection:
+            for statement in FULLTEXT_SCHEMA:
+                connection.execute(text(statement))
+        logging.info("Миграция: создан полнотекстовый индекс files_fts.")
+    except OperationalError as e:
+        logging.warning(f"Полнотекстовый поиск недоступен (SQLite собран без FTS5?): {e}")
+
+
+def migrate(engine: Engine) -> None:
+    """Приводит схему существующей базы данных к текущим моделям."""
+    add_missing_columns(engine)
+    with engine.begin() as connection:
+        fill_file_directories(connection)
+        rename_duplicate_files(connection)
+    add_missing_indexes(engine)
+    create_fulltext_index(engine)
@@ -1,16 +1,115 @@
-from sqlalchemy import Column, Integer, String, DateTime, func
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, func
+from sqlalchemy.orm import relationship, validates
 
 from src.database import Base
+from src.utils import parent_directory
 
 
 class File(Base):
     __tablename__ = "files"
+    __table_args__ = (
+        # Файлы адресуются по имени без расширения (/file/{name}, /download/{name}), поэтому имя уникально
+        # независимо от расширения. Уникальность гарантирует база данных; индекс также обслуживает поиск по имени
+        Index("uq_files_name", "name", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
     extension = Column(String, nullable=False)
     size = Column(Integer, nullable=False)
-    path = Column(String, nullable=False)
-    created_at = Column(DateTime, default=func.now())
+    path = Column(String, nullable=False, index=True)  # Наблюдатель и сверка ищут записи по пути
+    # Нормализованная родительская директория path, заполняется автоматически при изменении path
+    directory = Column(String, nullable=True, index=True)
+    created_at = Column(DateTime, default=func.now(), index=True)
     updated_at = Column(DateTime, onupdate=func.now(), nullable=True)
     comment = Column(String, nullable=True)
+    checksum = Column(String(64), nullable=True)  # SHA-256 содержимого
+    # Время изменения содержимого на диске при последней сверке (см. src/reconciler.py)
+    modified_at = Column(DateTime, nullable=True)
+    # Ссылка на содержимое в контентно-адресуемом хранилище; NULL - файл лежит по пути path
+    blob_hash = Column(String(64), ForeignKey("blobs.hash"), nullable=True, index=True)
+    # Сжатие содержимого в хранилище (копия полей блоба): алгоритм gzip/zstd и размер хранимых данных;
+    # size - исходный размер файла. NULL - содержимое хранится без сжатия
+    encoding = Column(String, nullable=True)
+    stored_size = Column(Integer, nullable=True)
+    # Метаданные и превью, извлекаемые в фоне после загрузки (см. src/previews.py);
+    # processed_at IS NULL - файл ещё не обработан или его содержимое изменилось
+    mime_type = Column(String, nullable=True)
+    width = Column(Integer, nullable=True)
+    height = Column(Integer, nullable=True)
+    page_count = Column(Integer, nullable=True)
+    preview_key = Column(String, nullable=True)  # Ключ превью в хранилище
+    processed_at = Column(DateTime, nullable=True, index=True)
+
+    @property
+    def has_preview(self) -> bool:
+        return self.preview_key is not None
+
+    @validates("path")
+    def _set_directory(self, key, path):
+        self.directory = parent_directory(path)
+        return path
+
+class Blob(Base):
+    """Уникальное содержимое файла в контентно-адресуемом хранилище."""
+    __tablename__ = "blobs"
+
+    hash = Column(String(64), primary_key=True)  # SHA-256 содержимого
+    size = Column(Integer, nullable=False)  # Исходный размер содержимого
+    encoding = Column(String, nullable=True)  # gzip или zstd; NULL - хранится без сжатия
+    stored_size = Column(Integer, nullable=True)  # Размер объекта в хранилище
+    refcount = Column(Integer, nullable=False, default=0)  # Количество записей File, ссылающихся на блоб
+    created_at = Column(DateTime, default=func.now())
+
+
+class UploadSession(Base):
+    """Сессия возобновляемой загрузки файла по частям."""
+    __tablename__ = "upload_sessions"
+
+    id = Column(String(32), primary_key=True)
+    file_name = Column(String, nullable=False)  # Имя файла вместе с расширением
+    size = Column(Integer, nullable=False)
+    chunk_size = Column(Integer, nullable=False)
+    total_chunks = Column(Integer, nullable=False)
+    checksum = Column(String(64), nullable=True)  # Ожидаемый SHA-256 всего файла
+    comment = Column(String, nullable=True)
+    status = Column(String, nullable=False, default="active")
+    created_at = Column(DateTime, default=func.now())
+    expires_at = Column(DateTime, nullable=False)
+    assembling_at = Column(DateTime, nullable=True)  # Начало сборки файла (status = "assembling")
+
+    chunks = relationship("UploadChunk", cascade="all, delete-orphan", lazy="selectin")
+
+    @property
+    def received_chunks(self):
+        """Номера уже принятых частей по возрастанию."""
+        return sorted(chunk.index for chunk in self.chunks)
+
+
+class UploadChunk(Base):
+    """Принятая часть файла в рамках сессии загрузки."""
+    __tablename__ = "upload_chunks"
+
+    session_id = Column(String(32), ForeignKey("upload_sessions.id", ondelete="CASCADE"), primary_key=True)
+    index = Column(Integer, primary_key=True)
+    size = Column(Integer, nullable=False)
+    checksum = Column(String(64), nullable=False)
+
+
+class FileOperation(Base):
+    """
+    Журнал перемещений и удалений содержимого файлов, выполняемых в фоне (см. src/file_operations.py).
+    Запись создаётся в одной транзакции с изменением метаданных файла и переводится в done/failed
+    после выполнения; незавершённые операции повторяются при запуске приложения.
+    """
+    __tablename__ = "file_operations"
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)  # move или delete
+    file_id = Column(Integer, nullable=True, index=True)  # Запись File (после удаления её уже нет)
+    source = Column(String, nullable=False)
+    target = Column(String, nullable=True)  # Новый путь при перемещении
+    status = Column(String, nullable=False, default="pending", index=True)  # pending, done или failed
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=func.now())
+    finished_at = Column(DateTime, nullable=True)
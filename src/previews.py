@@ -0,0 +1,236 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Iterable, List, Optional, Set
+
+import aiofiles
+from sqlalchemy import select, update
+
+from src.blob_store import blob_path
+from src.cache import metadata_cache
+from src.compression import read_content
+from src.config import PREVIEW_QUEUE_SIZE, PREVIEW_SIZE, PREVIEW_WORKERS, PREVIEWS_DIR
+from src.database import AsyncSessionLocal
+from src.media import extract_metadata, sniff_mime_type
+from src.models import File
+from src.storage import LocalStorage, get_storage
+
+# Размер страницы при поиске необработанных файлов
+BACKFILL_BATCH_SIZE = 1000
+
+
+def preview_key(file_id: int) -> str:
+    return os.path.join(PREVIEWS_DIR, f"{file_id}.jpg")
+
+
+async def delete_previews(keys: Iterable[Optional[str]]) -> None:
+    """Удаляет превью (ключи preview_key) удалённых записей о файлах; вызывается после фиксации удаления."""
+    storage = get_storage()
+    for key in keys:
+        if key:
+            await storage.delete(key)
+
+
+def delete_previews_sync(keys: Iterable[Optional[str]]) -> None:
+    """delete_previews для кода, выполняющегося в потоке (наблюдатель, сверка)."""
+    storage = get_storage()
+    for key in keys:
+        if key:
+            storage.delete_sync(key)
+
+
+def _type_only(file_name: str) -> dict:
+    """Результат для файлов, которые не удалось разобрать: тип определяется по расширению."""
+    return {"mime_type": sniff_mime_type(b"", file_name), "width": None, "height": None,
+            "page_count": None, "preview": False}
+
+
+def _remove(path: Optional[str]) -> None:
+    if path:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class PreviewPipeline:
+    """
+    Фоновая обработка файлов после загрузки: определение MIME-типа, размеров изображения,
+    числа страниц PDF и построение превью.
+
+    Идентификаторы файлов ставятся в ограниченную очередь; PREVIEW_WORKERS задач передают их
+    в пул процессов такого же размера, так что одновременно обрабатывается не больше PREVIEW_WORKERS
+    файлов, а декодирование изображений не занимает ни цикл событий, ни GIL процесса приложения.
+    Файлы, не поместившиеся в очередь или не обработанные до перезапуска, находятся по processed_at IS NULL.
+    """
+
+    def __init__(self, workers: int = PREVIEW_WORKERS, queue_size: int = PREVIEW_QUEUE_SIZE):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.queue: Optional[asyncio.Queue] = None
+        self.queued: Set[int] = set()
+        self.overflowed = False
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.tasks: List[asyncio.Task] = []
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        # spawn: дочерние процессы не наследуют потоки наблюдателя и соединения с базой данных
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def start(self) -> None:
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self.executor = self._create_executor()
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self.tasks.append(asyncio.create_task(self.backfill()))
+
+    def stop(self) -> None:
+        # Задачи отменяются до сброса очереди и цикла событий, которыми они пользуются
+        for task in self.tasks:
+            task.cancel()
+        self.tasks = []
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        # Цикл событий остановленного приложения закрывается: потоки больше не передают в него файлы
+        self.loop = None
+        self.queue = None
+        self.queued.clear()
+        self.overflowed = False
+
+    def schedule(self, file_ids: Iterable[int]) -> None:
+        """Ставит файлы в очередь обработки, не ожидая (вызывается из обработчиков запросов)."""
+        if self.queue is None:
+            return  # Конвейер не запущен: файлы будут найдены при следующем запуске
+        for file_id in file_ids:
+            if file_id in self.queued:
+                continue
+            try:
+                self.queue.put_nowait(file_id)
+            except asyncio.QueueFull:
+                self.overflowed = True
+                continue
+            self.queued.add(file_id)
+
+    def schedule_paths_threadsafe(self, paths: Iterable[str]) -> None:
+        """Постановка в очередь из потоков наблюдателя и сверки, которые знают только пути файлов."""
+        paths = list(paths)
+        if paths and self.loop is not None:
+            asyncio.run_coroutine_threadsafe(self._schedule_paths(paths), self.loop)
+
+    async def _schedule_paths(self, paths) -> None:
+        async with AsyncSessionLocal() as db:
+            for start in range(0, len(paths), BACKFILL_BATCH_SIZE):
+                self.schedule(await db.scalars(
+                    select(File.id).where(File.path.in_(paths[start:start + BACKFILL_BATCH_SIZE]))
+                ))
+
+    async def backfill(self) -> None:
+        """Ставит в очередь все необработанные файлы, дожидаясь места в очереди."""
+        last_id = 0
+        while True:
+            async with AsyncSessionLocal() as db:
+                file_ids = list(await db.scalars(
+                    select(File.id).where(File.processed_at.is_(None), File.id > last_id)
+                    .order_by(File.id).limit(BACKFILL_BATCH_SIZE)
+                ))
+            for file_id in file_ids:
+                if file_id not in self.queued:
+                    self.queued.add(file_id)
+                    await self.queue.put(file_id)
+            if len(file_ids) < BACKFILL_BATCH_SIZE:
+                break
+            last_id = file_ids[-1]
+
+    async def _worker(self) -> None:
+        while True:
+            if self.queue.empty() and self.overflowed:
+                # Очередь переполнялась: пропущенные файлы находим по processed_at IS NULL
+                self.overflowed = False
+                await self.backfill()
+            file_id = await self.queue.get()
+            self.queued.discard(file_id)
+            try:
+                await self.process(file_id)
+            except Exception as e:
+                logging.error(f"Ошибка при обработке файла с ID {file_id}: {e}", exc_info=True)
+
+    async def process(self, file_id: int) -> None:
+        """Извлекает метаданные файла и строит превью в пуле процессов, затем сохраняет результат."""
+        async with AsyncSessionLocal() as db:
+            row = (await db.execute(
+                select(File.id, File.name, File.extension, File.path, File.blob_hash, File.encoding)
+                .where(File.id == file_id)
+            )).first()
+        if row is None:
+            return
+        storage = get_storage()
+        key = blob_path(row.blob_hash) if row.blob_hash else row.path
+        file_name = f"{row.name}{row.extension}"
+        handle, preview_path = tempfile.mkstemp(suffix=".jpg")
+        os.close(handle)
+        local_copy = None
+        try:
+            result = None
+            if isinstance(storage, LocalStorage) and not row.encoding:
+                source = key
+            else:
+                # Процессы пула читают локальный несжатый файл. Копию делаем, только если по началу
+                # содержимого видно, что из файла можно извлечь что-то кроме типа
+                header = b"".join([chunk async for chunk in read_content(storage, key, row.encoding, 0, 15)])
+                mime_type = sniff_mime_type(header, file_name)
+                if mime_type.startswith("image/") or mime_type == "application/pdf":
+                    handle, local_copy = tempfile.mkstemp()
+                    os.close(handle)
+                    async with aiofiles.open(local_copy, "wb") as f:
+                        async for chunk in read_content(storage, key, row.encoding):
+                            await f.write(chunk)
+                    source = local_copy
+                else:
+                    result = dict(_type_only(file_name), mime_type=mime_type)
+            executor = self.executor
+            try:
+                if result is None:
+                    result = await self.loop.run_in_executor(
+                        executor, extract_metadata, source, file_name, preview_path, PREVIEW_SIZE
+                    )
+            except FileNotFoundError:
+                return  # Файл удалён или перемещён; новое состояние обработает следующее событие
+            except BrokenProcessPool:
+                # Процесс пула аварийно завершился (например, нехватка памяти на огромном изображении)
+                if self.executor is executor:
+                    logging.error(f"Пул обработки файлов перезапущен после сбоя на файле {file_name}.")
+                    self.executor = self._create_executor()
+                result = _type_only(file_name)
+            except Exception as e:
+                logging.warning(f"Не удалось извлечь метаданные файла {file_name}: {e}")
+                result = _type_only(file_name)
+
+            values = {"preview_key": None, "processed_at": datetime.utcnow()}
+            if result.pop("preview"):
+                values["preview_key"] = preview_key(file_id)
+                if isinstance(storage, LocalStorage):
+                    await storage.move(preview_path, values["preview_key"])
+                else:
+                    await storage.write(values["preview_key"], LocalStorage().open_read(preview_path))
+        finally:
+            _remove(preview_path)
+            _remove(local_copy)
+
+        async with AsyncSessionLocal() as db:
+            updated = await db.execute(update(File).where(File.id == file_id).values(**result, **values))
+            await db.commit()
+        if not updated.rowcount:
+            # Запись удалили во время обработки: превью больше не на что сослаться
+            await delete_previews([values["preview_key"]])
+            return
+        await metadata_cache.invalidate(row.name)
+
+
+preview_pipeline = PreviewPipeline()
@@ -0,0 +1,165 @@
+import asyncio
+import logging
+import sys
+import threading
+import weakref
+from collections import Counter, deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional
+
+from src.config import PROFILE_KEEP, PROFILE_SAMPLE_INTERVAL, PROFILE_SLOW_REQUESTS
+
+# Наибольшая глубина стека в выборке и число стеков в сообщении журнала
+MAX_STACK_DEPTH = 64
+LOGGED_STACKS = 5
+
+
+class RequestProfile:
+    """Выборки стеков одного запроса: стек в свёрнутом формате flame graph -> число выборок."""
+
+    def __init__(self, method: str, path: str, task: asyncio.Task):
+        self.method = method
+        self.path = path
+        self.started_at = datetime.utcnow()
+        self.samples: Counter = Counter()
+        # Задачи запроса в порядке создания; слабые ссылки не продлевают жизнь завершённым задачам
+        self.tasks: List[weakref.ref] = [weakref.ref(task)]
+
+
+def _frame_name(frame) -> str:
+    return f"{frame.f_globals.get('__name__', '?')}.{frame.f_code.co_name}"
+
+
+def _thread_stack(frame, outermost=None) -> List[str]:
+    """Стек потока от внешнего вызова к внутреннему, начиная с кадра outermost (корутины задачи)."""
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        if frame is outermost:
+            break
+        frame = frame.f_back
+    return [_frame_name(frame) for frame in reversed(frames[:MAX_STACK_DEPTH])]
+
+
+def _coroutine_stack(coroutine) -> List[str]:
+    """Цепочка await приостановленной корутины: где задача ждёт (база данных, хранилище, клиент)."""
+    stack = []
+    while coroutine is not None and len(stack) < MAX_STACK_DEPTH:
+        frame = getattr(coroutine, "cr_frame", None) or getattr(coroutine, "ag_frame", None) \
+            or getattr(coroutine, "gi_frame", None)
+        if frame is None:
+            break
+        stack.append(_frame_name(frame))
+        coroutine = getattr(coroutine, "cr_await", None) or getattr(coroutine, "ag_await", None) \
+            or getattr(coroutine, "gi_yieldfrom", None)
+    return stack
+
+
+class SlowRequestProfiler:
+    """
+    Выборочный профилировщик медленных запросов.
+
+    Отдельный поток каждые PROFILE_SAMPLE_INTERVAL секунд снимает стек каждого выполняющегося запроса:
+    если одна из задач запроса сейчас выполняется в цикле событий - стек потока цикла ("cpu"),
+    иначе - цепочку await последней созданной задачи запроса ("wait"). Задачи, порождённые запросом
+    (например, передача тела потокового ответа), относятся к нему через фабрику задач цикла событий.
+    Профили запросов дольше PROFILE_SLOW_REQUESTS секунд записываются в журнал и хранятся для /profiles/.
+    """
+
+    def __init__(self, threshold: float = PROFILE_SLOW_REQUESTS, interval: float = PROFILE_SAMPLE_INTERVAL,
+                 keep: int = PROFILE_KEEP):
+        self.threshold = threshold
+        self.interval = interval
+        self.active: Dict[int, RequestProfile] = {}
+        self.owners: "weakref.WeakKeyDictionary[asyncio.Task, RequestProfile]" = weakref.WeakKeyDictionary()
+        self.recent: Deque[dict] = deque(maxlen=keep)
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.loop_thread: Optional[int] = None
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold > 0
+
+    def start(self) -> None:
+        """Вызывается в цикле событий приложения."""
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread = threading.get_ident()
+        previous = self.loop.get_task_factory()
+
+        def task_factory(loop, coroutine, **kwargs):
+            if previous is not None:
+                task = previous(loop, coroutine, **kwargs)
+            else:
+                task = asyncio.Task(coroutine, loop=loop, **kwargs)
+            parent = asyncio.current_task(loop)
+            profile = self.owners.get(parent) if parent is not None else None
+            if profile is not None:
+                self.owners[task] = profile
+                profile.tasks.append(weakref.ref(task))
+            return task
+
+        self.loop.set_task_factory(task_factory)
+        threading.Thread(target=self._run, name="request-profiler", daemon=True).start()
+        logging.info(f"Профилирование запросов дольше {self.threshold} с включено.")
+
+    def stop(self) -> None:
+        self.stopped.set()
+
+    def begin(self, method: str, path: str) -> Optional[RequestProfile]:
+        task = asyncio.current_task()
+        if self.loop is None or task is None:
+            return None
+        profile = RequestProfile(method, path, task)
+        with self.lock:
+            self.owners[task] = profile
+            self.active[id(profile)] = profile
+        return profile
+
+    def end(self, profile: RequestProfile, duration: float) -> None:
+        with self.lock:
+            self.active.pop(id(profile), None)
+        if duration < self.threshold:
+            return
+        total = sum(profile.samples.values())
+        stacks = [{"stack": stack, "count": count} for stack, count in profile.samples.most_common()]
+        self.recent.append({
+            "method": profile.method,
+            "path": profile.path,
+            "started_at": profile.started_at,
+            "duration": round(duration, 3),
+            "samples": total,
+            "stacks": stacks,
+        })
+        top = "\n".join(
+            f"  {item['count'] * 100 // max(total, 1)}% {item['stack']}" for item in stacks[:LOGGED_STACKS]
+        )
+        logging.warning(f"Медленный запрос {profile.method} {profile.path}: {duration:.3f} с, выборок {total}\n{top}")
+
+    def _run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:  # Выборка не должна останавливать поток профилировщика
+                logging.debug(f"Ошибка выборки стеков профилировщика: {e}")
+
+    def sample(self) -> None:
+        with self.lock:
+            profiles = list(self.active.values())
+        if not profiles:
+            return
+        running = asyncio.current_task(self.loop)
+        loop_frame = sys._current_frames().get(self.loop_thread)
+        for profile in profiles:
+            tasks = [task for task in (ref() for ref in list(profile.tasks)) if task is not None and not task.done()]
+            if running is not None and running in tasks and loop_frame is not None:
+                stack = ["cpu"] + _thread_stack(loop_frame, getattr(running.get_coro(), "cr_frame", None))
+            elif tasks:
+                stack = ["wait"] + _coroutine_stack(tasks[-1].get_coro())
+            else:
+                continue
+            profile.samples[";".join(stack)] += 1
+
+
+profiler = SlowRequestProfiler()
@@ -0,0 +1,297 @@
+import asyncio
+import hashlib
+import logging
+import math
+import time
+from typing import Dict, List, Optional
+
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+
+from src.config import (
+    RATE_LIMIT_BANDWIDTH,
+    RATE_LIMIT_BANDWIDTH_BURST,
+    RATE_LIMIT_BURST,
+    RATE_LIMIT_KEY_HEADER,
+    RATE_LIMIT_REDIS_URL,
+    RATE_LIMIT_REQUESTS,
+    RATE_LIMIT_TRANSFERS,
+)
+from src.metrics import RATE_LIMITED, TRANSFER_THROTTLED
+
+UPLOAD = "upload"
+DOWNLOAD = "download"
+
+# Пути, к которым лимиты не применяются: сбор метрик не должен получать 429
+EXEMPT_PATHS = {"/metrics"}
+
+# Сколько хранятся счётчики неактивного клиента (секунды): за это время его лимиты полностью восстанавливаются
+BUCKET_IDLE_TTL = 300
+# Счётчик одновременных передач в Redis удаляется, если процесс, начавший передачу, не завершил её за это время
+SLOT_TTL = 6 * 60 * 60
+KEY_PREFIX = "files:limit:"
+
+
+def transfer_direction(method: str, path: str) -> Optional[str]:
+    """Загрузки и скачивания содержимого файлов: к ним применяются лимиты передач и скорости."""
+    if method == "POST" and path in ("/upload/", "/bulk/upload/"):
+        return UPLOAD
+    if method == "PUT" and path.startswith("/uploads/"):  # Части возобновляемой загрузки
+        return UPLOAD
+    if (method == "GET" and path.startswith("/download/")) or (method == "POST" and path == "/archive/"):
+        return DOWNLOAD
+    return None
+
+
+def client_key(scope) -> str:
+    """Клиент запроса: ключ API (в хранилище лимитов - его хеш) или IP-адрес."""
+    api_key = Headers(scope=scope).get(RATE_LIMIT_KEY_HEADER)
+    if api_key:
+        return "key:" + hashlib.sha256(api_key.encode()).hexdigest()[:32]
+    client = scope.get("client")
+    return "ip:" + (client[0] if client else "unknown")
+
+
+class LocalBackend:
+    """
+    Счётчики лимитов в памяти процесса. Все обращения выполняются в цикле событий, блокировки не нужны.
+    При нескольких процессах uvicorn каждый процесс ограничивает клиента отдельно.
+    """
+
+    def __init__(self):
+        self.buckets: Dict[str, List[float]] = {}  # ключ -> [токены, момент обновления]
+        self.slots: Dict[str, int] = {}
+        self.pruned_at = time.monotonic()
+
+    async def take(self, key: str, rate: float, burst: float, amount: float = 1, debt: bool = False) -> float:
+        now = time.monotonic()
+        self._prune(now)
+        tokens, updated = self.buckets.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        wait = max(0.0, (amount - tokens) / rate)
+        if not wait or debt:
+            tokens -= amount
+        self.buckets[key] = [tokens, now]
+        return wait
+
+    async def acquire_slot(self, key: str, limit: int) -> bool:
+        count = self.slots.get(key, 0)
+        if count >= limit:
+            return False
+        self.slots[key] = count + 1
+        return True
+
+    async def release_slot(self, key: str) -> None:
+        count = self.slots.pop(key, 0) - 1
+        if count > 0:
+            self.slots[key] = count
+
+    def _prune(self, now: float) -> None:
+        # Счётчики клиентов, не обращавшихся дольше BUCKET_IDLE_TTL, удаляются: память не растёт с числом клиентов
+        if now - self.pruned_at < BUCKET_IDLE_TTL:
+            return
+        self.pruned_at = now
+        idle = [key for key, (_, updated) in self.buckets.items() if now - updated > BUCKET_IDLE_TTL]
+        for key in idle:
+            del self.buckets[key]
+
+
+# Корзина токенов в хеше Redis. Время берётся с сервера Redis, чтобы часы реплик не влияли на лимиты.
+# Числа возвращаются строкой: Redis округлил бы дробный результат скрипта до целого
+TAKE_SCRIPT = """
+local rate, burst, amount = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or burst
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = math.max(0, (amount - tokens) / rate)
+if wait == 0 or ARGV[4] == '1' then
+    tokens = tokens - amount
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+return tostring(wait)
+"""
+
+ACQUIRE_SCRIPT = """
+local count = redis.call('INCR', KEYS[1])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+if count > tonumber(ARGV[1]) then
+    redis.call('DECR', KEYS[1])
+    return 0
+end
+return 1
+"""
+
+RELEASE_SCRIPT = """
+if redis.call('DECR', KEYS[1]) <= 0 then
+    redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisBackend:
+    """
+    Счётчики лимитов в Redis (или любом сервере с протоколом Redis), общие для всех процессов и реплик.
+    client - асинхронный клиент redis.asyncio.Redis или совместимый (например, fakeredis для проверки).
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.take_script = client.register_script(TAKE_SCRIPT)
+        self.acquire_script = client.register_script(ACQUIRE_SCRIPT)
+        self.release_script = client.register_script(RELEASE_SCRIPT)
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisBackend":
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("Для RATE_LIMIT_REDIS_URL необходимо установить пакет redis") from e
+        return cls(redis.from_url(url))
+
+    async def take(self, key: str, rate: float, burst: float, amount: float = 1, debt: bool = False) -> float:
+        wait = await self.take_script(
+            keys=[KEY_PREFIX + key], args=[rate, burst, amount, int(debt), BUCKET_IDLE_TTL],
+        )
+        return float(wait)
+
+    async def acquire_slot(self, key: str, limit: int) -> bool:
+        return bool(await self.acquire_script(keys=[KEY_PREFIX + key], args=[limit, SLOT_TTL]))
+
+    async def release_slot(self, key: str) -> None:
+        await self.release_script(keys=[KEY_PREFIX + key])
+
+
+class RateLimiter:
+    """
+    Лимиты клиента: частота запросов и число одновременных передач (сверх них - отказ)
+    и скорость передачи (корзина токенов в байтах: передача ждёт, пока накопятся токены на очередной блок).
+    Если хранилище лимитов недоступно, запросы пропускаются без ограничений.
+    """
+
+    def __init__(self, backend, requests: float = RATE_LIMIT_REQUESTS, burst: int = RATE_LIMIT_BURST,
+                 transfers: int = RATE_LIMIT_TRANSFERS, bandwidth: int = RATE_LIMIT_BANDWIDTH,
+                 bandwidth_burst: int = RATE_LIMIT_BANDWIDTH_BURST):
+        self.backend = backend
+        self.requests = requests
+        self.burst = burst
+        self.transfers = transfers
+        self.bandwidth = bandwidth
+        self.bandwidth_burst = bandwidth_burst or bandwidth
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.requests or self.transfers or self.bandwidth)
+
+    async def limit_requests(self, client: str) -> float:
+        """Учитывает запрос клиента; 0 - запрос принят, иначе через сколько секунд его повторить."""
+        if not self.requests:
+            return 0.0
+        try:
+            return await self.backend.take(f"req:{client}", self.requests, self.burst)
+        except Exception as e:
+            logging.warning(f"Хранилище лимитов недоступно: {e}")
+            return 0.0
+
+    async def acquire_transfer(self, client: str) -> Optional[bool]:
+        """
+        Занимает место одновременной передачи клиента, которое освобождает release.
+        False - свободных мест нет; None - лимит не применён (не задан или хранилище лимитов недоступно).
+        """
+        if not self.transfers:
+            return None
+        try:
+            return await self.backend.acquire_slot(f"slots:{client}", self.transfers)
+        except Exception as e:
+            logging.warning(f"Хранилище лимитов недоступно: {e}")
+            return None
+
+    async def release(self, client: str) -> None:
+        try:
+            await self.backend.release_slot(f"slots:{client}")
+        except Exception as e:
+            logging.warning(f"Хранилище лимитов недоступно: {e}")
+
+    async def throttle(self, client: str, direction: str, size: int) -> None:
+        """Расходует size байт скорости клиента и ждёт, если они превышают накопленный запас."""
+        try:
+            wait = await self.backend.take(f"bw:{direction}:{client}", self.bandwidth, self.bandwidth_burst,
+                                           size, debt=True)
+        except Exception as e:
+            logging.warning(f"Хранилище лимитов недоступно: {e}")
+            return
+        if wait:
+            TRANSFER_THROTTLED.labels(direction).inc(wait)
+            await asyncio.sleep(wait)
+
+
+class RateLimitMiddleware:
+    """
+    ASGI-middleware: отклоняет запросы сверх лимитов клиента ответом 429 до обращения к базе данных и диску
+    и ограничивает скорость загрузок и скачиваний. Скорость ограничивается на границе ASGI: каждый блок тела
+    запроса и ответа ждёт токенов по мере того, как циклы потокового чтения и записи его получают и отправляют.
+    """
+
+    def __init__(self, app, limiter: Optional[RateLimiter] = None):
+        self.app = app
+        self.limiter = limiter or rate_limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.limiter.enabled or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        limiter = self.limiter
+        client = client_key(scope)
+        retry_after = await limiter.limit_requests(client)
+        if retry_after:
+            await self.reject(scope, receive, send, "requests", retry_after)
+            return
+        direction = transfer_direction(scope["method"], scope["path"])
+        if direction is None:
+            await self.app(scope, receive, send)
+            return
+        slot = await limiter.acquire_transfer(client)
+        if slot is False:
+            await self.reject(scope, receive, send, "transfers", 1)
+            return
+
+        async def throttled_receive():
+            message = await receive()
+            if message["type"] == "http.request" and message.get("body"):
+                await limiter.throttle(client, UPLOAD, len(message["body"]))
+            return message
+
+        async def throttled_send(message):
+            if message["type"] == "http.response.body" and message.get("body"):
+                await limiter.throttle(client, DOWNLOAD, len(message["body"]))
+            await send(message)
+
+        try:
+            if limiter.bandwidth:
+                await self.app(scope, throttled_receive, throttled_send)
+            else:
+                await self.app(scope, receive, send)
+        finally:
+            if slot:
+                await limiter.release(client)
+
+    @staticmethod
+    async def reject(scope, receive, send, reason: str, retry_after: float) -> None:
+        RATE_LIMITED.labels(reason).inc()
+        detail = "Слишком много запросов." if reason == "requests" else "Слишком много одновременных загрузок и скачиваний."
+        response = JSONResponse(status_code=429, content={"detail": detail},
+                                headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+        await response(scope, receive, send)
+
+
+def create_rate_limiter() -> RateLimiter:
+    backend = RedisBackend.from_url(RATE_LIMIT_REDIS_URL) if RATE_LIMIT_REDIS_URL else LocalBackend()
+    return RateLimiter(backend)
+
+
+rate_limiter = create_rate_limiter()
@@ -0,0 +1,450 @@
+import asyncio
+import logging
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import and_, delete, insert, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from src.blob_store import blob_path
+from src.cache import metadata_cache
+from src.config import (
+    BLOBS_DIR,
+    FILES_DIR,
+    RECONCILE_BATCH_SIZE,
+    RECONCILE_CONCURRENCY,
+    RECONCILE_FULL_SCAN_EVERY,
+    RECONCILE_INTERVAL,
+    RECONCILE_VERIFY_HASH,
+)
+from src.crud import stored_path
+from src.database import AsyncSessionLocal, SessionLocal
+from src.file_operations import collect_paths, pending_paths_statement
+from src.models import Blob, File
+from src.previews import delete_previews, delete_previews_sync, preview_pipeline
+from src.schemas import ReconcileReport
+from src.storage import LocalStorage, get_storage
+from src.utils import hash_stream, mtime_to_datetime, normalize_directory, parent_directory
+
+# Отчёт о последней завершённой сверке
+last_report: Optional[ReconcileReport] = None
+
+
+async def _missing_keys(keys: List[str]) -> Dict[str, bool]:
+    """Проверяет наличие объектов в хранилище с ограниченной параллельностью."""
+    storage = get_storage()
+    semaphore = asyncio.Semaphore(RECONCILE_CONCURRENCY)
+
+    async def check(key: str) -> bool:
+        async with semaphore:
+            return not await storage.exists(key)
+
+    results = await asyncio.gather(*(check(key) for key in keys))
+    return dict(zip(keys, results))
+
+
+async def remove_missing_records(db: AsyncSession, batch_size: int = RECONCILE_BATCH_SIZE) -> ReconcileReport:
+    """
+    Удаляет записи о файлах, содержимого которых нет в хранилище.
+
+    Записи читаются пакетами по первичному ключу (только нужные колонки), наличие содержимого
+    проверяется параллельно, а все найденные расхождения удаляются одной транзакцией.
+    Используется для хранилищ без локальной файловой системы, где обход директорий недоступен.
+    """
+    started = time.monotonic()
+    checked = 0
+    missing = []
+    last_id = 0
+    # Содержимое файлов с незавершёнными перемещениями ещё не на новом месте
+    busy = collect_paths(await db.execute(pending_paths_statement()))
+    while True:
+        rows = (await db.execute(
+            select(File.id, File.name, File.extension, File.path, File.blob_hash, File.preview_key)
+            .where(File.id > last_id)
+            .order_by(File.id)
+            .limit(batch_size)
+        )).all()
+        if not rows:
+            break
+        absent = await _missing_keys(list({stored_path(row) for row in rows}))
+        missing += [row for row in rows if absent[stored_path(row)] and os.path.normpath(row.path) not in busy]
+        checked += len(rows)
+        last_id = rows[-1].id
+
+    if missing:
+        # Повторная проверка: содержимое могли загрузить и зафиксировать после первой проверки
+        absent = await _missing_keys(list({stored_path(row) for row in missing}))
+        missing = [row for row in missing if absent[stored_path(row)]]
+    if missing:
+        ids = [row.id for row in missing]
+        for start in range(0, len(ids), batch_size):
+            await db.execute(delete(File).where(File.id.in_(ids[start:start + batch_size])))
+        # Пропавшее содержимое блобов больше не на что сослаться: все ссылки на него удалены выше
+        lost_blobs = list({row.blob_hash for row in missing if row.blob_hash})
+        if lost_blobs:
+            await db.execute(delete(Blob).where(Blob.hash.in_(lost_blobs)))
+        await db.commit()
+        await metadata_cache.invalidate(*{row.name for row in missing})
+        await delete_previews(row.preview_key for row in missing)
+
+    report = ReconcileReport(
+        checked=checked,
+        removed=len(missing),
+        removed_files=[f"{row.name}{row.extension}" for row in missing],
+        duration=round(time.monotonic() - started, 3),
+        finished_at=datetime.utcnow(),
+    )
+    if missing:
+        logging.info(
+            f"Сверка: удалено {report.removed} записей о файлах, отсутствующих в хранилище: "
+            f"{', '.join(report.removed_files[:20])}"
+        )
+    return report
+
+
+class DirectoryListing(NamedTuple):
+    """Содержимое директории на момент последнего чтения."""
+    mtime_ns: int
+    files: Dict[str, Tuple[int, int]]  # путь -> (размер, время изменения в наносекундах)
+    subdirs: List[Tuple[str, int]]  # (путь, время изменения в наносекундах)
+
+
+class DirectoryScan(NamedTuple):
+    """Результат обхода директории."""
+    files: Dict[str, Tuple[int, int]]
+    changed_dirs: Set[str]  # Прочитанные заново и исчезнувшие директории
+    scanned_dirs: int
+    skipped_dirs: int
+    duration: float
+
+
+class DirectoryScanner:
+    """
+    Рекурсивный обход директории через os.scandir: один stat на файл или поддиректорию.
+
+    Добавление, удаление и переименование записи в директории меняет её mtime, поэтому
+    при инкрементальном обходе директории с прежним mtime не читаются - их содержимое берётся
+    из прошлого обхода. Изменение содержимого файла mtime директории не меняет: такие изменения
+    обнаруживает наблюдатель за директорией и периодический полный обход.
+    Служебные директории (начинающиеся с точки) пропускаются, кроме хранилища блобов.
+    """
+
+    def __init__(self, root: str = FILES_DIR, blobs_dir: str = BLOBS_DIR):
+        self.root = os.path.normpath(root)
+        self.blobs_dir = os.path.normpath(blobs_dir)
+        self.listings: Dict[str, DirectoryListing] = {}
+
+    def _read(self, directory: str, mtime_ns: int) -> Optional[DirectoryListing]:
+        files: Dict[str, Tuple[int, int]] = {}
+        subdirs: List[Tuple[str, int]] = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name.startswith(".") and entry.path != self.blobs_dir:
+                        continue
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append((entry.path, entry.stat(follow_symlinks=False).st_mtime_ns))
+                        elif entry.is_file():
+                            st = entry.stat()
+                            files[entry.path] = (st.st_size, st.st_mtime_ns)
+                    except FileNotFoundError:  # Удалён во время обхода
+                        continue
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        return DirectoryListing(mtime_ns, files, subdirs)
+
+    def scan(self, full: bool = False) -> DirectoryScan:
+        started = time.monotonic()
+        try:
+            root_mtime = os.stat(self.root).st_mtime_ns
+        except FileNotFoundError:
+            root_mtime = None
+
+        listings: Dict[str, DirectoryListing] = {}
+        changed: Set[str] = set()
+        scanned = skipped = 0
+        stack = [(self.root, root_mtime)] if root_mtime is not None else []
+        while stack:
+            directory, mtime_ns = stack.pop()
+            listing = self.listings.get(directory)
+            if full or listing is None or listing.mtime_ns != mtime_ns:
+                listing = self._read(directory, mtime_ns)
+                scanned += 1
+                if listing is None:
+                    continue
+                changed.add(directory)
+            else:
+                skipped += 1
+                # mtime поддиректорий в прошлом листинге устарел: перечитываем один stat на каждую
+                subdirs = []
+                for path, _ in listing.subdirs:
+                    try:
+                        subdirs.append((path, os.stat(path).st_mtime_ns))
+                    except FileNotFoundError:
+                        pass
+                listing = listing._replace(subdirs=subdirs)
+            listings[directory] = listing
+            stack.extend(listing.subdirs)
+
+        changed |= set(self.listings) - set(listings)
+        self.listings = listings
+        files = {path: stat for listing in listings.values() for path, stat in listing.files.items()}
+        return DirectoryScan(files, changed, scanned, skipped, round(time.monotonic() - started, 3))
+
+
+def _file_sha256(path: str) -> Optional[str]:
+    try:
+        with open(path, "rb") as f:
+            return hash_stream(f, max_size=sys.maxsize)[1]
+    except OSError:
+        return None
+
+
+def _in_chunks(values: List, size: int = RECONCILE_BATCH_SIZE):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _blob_hash_range(directory: str, blobs_dir: str):
+    """Условие на хеши блобов в директории хранилища блобов: .blobs/ab/cd -> хеши с префиксом abcd."""
+    prefix = "" if directory == blobs_dir else os.path.relpath(directory, blobs_dir).replace(os.sep, "")
+    return and_(Blob.hash >= prefix, Blob.hash < prefix + "~")
+
+
+def apply_scan(db: Session, scan: DirectoryScan, scanner: DirectoryScanner, full: bool,
+               verify_hash: bool = RECONCILE_VERIFY_HASH) -> ReconcileReport:
+    """
+    Сравнивает результат обхода с каталогом по размеру и времени изменения и применяет
+    все найденные изменения одной транзакцией пакетными INSERT/UPDATE/DELETE.
+
+    Удаление и добавление пары файлов с одинаковыми размером и mtime считается переименованием
+    (при verify_hash также сравнивается SHA-256). При полном обходе сравниваются все записи,
+    при инкрементальном - только записи из изменившихся директорий.
+    """
+    started = time.monotonic()
+    blobs_prefix = scanner.blobs_dir + os.sep
+    plain_files = {path: stat for path, stat in scan.files.items() if not path.startswith(blobs_prefix)}
+    present_blobs = {os.path.basename(path) for path in scan.files if path.startswith(blobs_prefix)}
+
+    # Записи о файлах, лежащих по своему пути (не в хранилище блобов)
+    columns = (File.id, File.name, File.extension, File.path, File.size, File.modified_at, File.checksum,
+               File.preview_key)
+    query = db.query(*columns).filter(File.blob_hash.is_(None))
+    if full:
+        rows = query.all()
+    else:
+        directories = [normalize_directory(directory) for directory in scan.changed_dirs
+                       if directory != scanner.blobs_dir and not directory.startswith(blobs_prefix)]
+        rows = []
+        for chunk in _in_chunks(directories):
+            rows += query.filter(File.directory.in_(chunk)).all()
+
+    known_paths = {os.path.normpath(row.path) for row in rows}
+    # Пути незавершённых фоновых перемещений и удалений (src/file_operations.py) - не расхождения
+    busy = collect_paths(db.execute(pending_paths_statement()))
+    deleted, updates = [], []
+    changed_names: Set[str] = set()  # Имена, записи кеша метаданных которых нужно сбросить
+    processing: List[str] = []  # Пути файлов с новым содержимым для извлечения метаданных и превью
+    for row in rows:
+        stat = plain_files.get(os.path.normpath(row.path))
+        if stat is None:
+            # Повторная проверка: файл могли создать или переместить через API после обхода
+            if os.path.normpath(row.path) not in busy and not os.path.exists(row.path):
+                deleted.append(row)
+            continue
+        size, mtime_ns = stat
+        modified_at = mtime_to_datetime(mtime_ns)
+        if row.size == size and row.modified_at == modified_at:
+            continue
+        values = {"id": row.id, "size": size, "modified_at": modified_at}
+        if row.size != size or row.modified_at is not None:
+            changed_names.add(row.name)
+            # Содержимое изменилось: прежний SHA-256 больше не действителен
+            values["checksum"] = _file_sha256(row.path) if verify_hash else None
+            values["updated_at"] = datetime.utcnow()
+            values["processed_at"] = None
+            processing.append(row.path)
+        updates.append(values)
+    modified = sum(1 for values in updates if "updated_at" in values)
+
+    if full:
+        new_paths = [path for path in plain_files if path not in known_paths]
+    else:
+        new_paths = [path for directory in scan.changed_dirs if directory in scanner.listings
+                     for path in scanner.listings[directory].files
+                     if path in plain_files and path not in known_paths]
+    if new_paths:
+        # Файлы из неизменённых директорий и записи о блобах с тем же путём уже известны каталогу
+        for chunk in _in_chunks(new_paths):
+            known_paths |= {os.path.normpath(row.path) for row in db.query(File.path).filter(File.path.in_(chunk))}
+        new_paths = [path for path in new_paths
+                     if path not in known_paths and path not in busy and os.path.exists(path)]
+
+    # Переименования: удалённая запись и новый файл с тем же размером и mtime
+    renamed_candidates: Dict[Tuple[int, datetime], List] = {}
+    for row in deleted:
+        if row.modified_at is not None:
+            renamed_candidates.setdefault((row.size, row.modified_at), []).append(row)
+
+    # Имена, которые освободятся после удаления и переименования, и занятые имена новых файлов
+    released = {row.name for row in deleted}
+    candidate_names = [os.path.splitext(os.path.basename(path))[0] for path in new_paths]
+    taken: Set[str] = set()
+    for chunk in _in_chunks(list(set(candidate_names))):
+        taken |= {row.name for row in db.query(File.name).filter(File.name.in_(chunk))}
+    taken -= released
+
+    inserts, renames, now = [], [], datetime.utcnow()
+    for path in new_paths:
+        size, mtime_ns = plain_files[path]
+        modified_at = mtime_to_datetime(mtime_ns)
+        name, extension = os.path.splitext(os.path.basename(path))
+        if name in taken:
+            logging.warning(f"Сверка: файл {path} пропущен, имя {name} уже занято.")
+            continue
+        taken.add(name)
+        values = {"name": name, "extension": extension, "size": size, "path": path,
+                  "directory": parent_directory(path), "modified_at": modified_at}
+        candidates = renamed_candidates.get((size, modified_at))
+        if candidates and verify_hash:
+            checksum = _file_sha256(path)
+            candidates = [row for row in candidates if row.checksum in (None, checksum)]
+        if candidates:
+            row = candidates[0]
+            renamed_candidates[(size, modified_at)].remove(row)
+            deleted.remove(row)
+            changed_names.update((row.name, name))
+            renames.append({"id": row.id, "updated_at": now, **values})
+        else:
+            inserts.append({"created_at": now, **values})
+            processing.append(path)
+
+    # Содержимое блобов: записи о блобах из изменившихся директорий хранилища блобов
+    if full:
+        blob_directories = [scanner.blobs_dir]
+    else:
+        blob_directories = [directory for directory in scan.changed_dirs
+                            if directory == scanner.blobs_dir or directory.startswith(blobs_prefix)]
+    lost_blobs: Set[str] = set()
+    for directory in blob_directories:
+        lost_blobs |= {
+            row.hash for row in db.query(Blob.hash).filter(_blob_hash_range(directory, scanner.blobs_dir))
+            if row.hash not in present_blobs
+        }
+    # Повторная проверка перед удалением: за время сверки файл могли записать заново или переместить
+    # через API, а содержимое блоба - загрузить и зафиксировать после обхода
+    busy = collect_paths(db.execute(pending_paths_statement()))
+    restored = {row.name for row in deleted if os.path.normpath(row.path) in busy or os.path.exists(row.path)}
+    deleted = [row for row in deleted if row.name not in restored]
+    if restored:
+        # Имена восстановленных записей остаются занятыми
+        inserts = [values for values in inserts if values["name"] not in restored]
+        renames = [values for values in renames if values["name"] not in restored]
+    lost_blobs = {sha256 for sha256 in lost_blobs if not os.path.exists(blob_path(sha256))}
+    lost_blob_files = []
+    for chunk in _in_chunks(list(lost_blobs)):
+        lost_blob_files += db.query(File.id, File.name, File.extension, File.preview_key).filter(
+            File.blob_hash.in_(chunk)
+        ).all()
+
+    removed = deleted + lost_blob_files
+    # Записи о файлах по своему пути удаляются, только если путь не изменился после чтения
+    for chunk in _in_chunks([(row.id, row.path) for row in deleted]):
+        db.query(File).filter(tuple_(File.id, File.path).in_(chunk)).delete(synchronize_session=False)
+    for chunk in _in_chunks([row.id for row in lost_blob_files]):
+        db.query(File).filter(File.id.in_(chunk)).delete(synchronize_session=False)
+    for chunk in _in_chunks(list(lost_blobs)):
+        db.query(Blob).filter(Blob.hash.in_(chunk)).delete(synchronize_session=False)
+    for chunk in _in_chunks(updates + renames):
+        db.execute(update(File), chunk)
+    for chunk in _in_chunks(inserts):
+        db.execute(insert(File), chunk)
+    db.commit()
+    metadata_cache.invalidate_threadsafe(changed_names | {row.name for row in removed})
+    delete_previews_sync(row.preview_key for row in removed)
+    preview_pipeline.schedule_paths_threadsafe(processing)
+
+    report = ReconcileReport(
+        checked=len(rows),
+        removed=len(removed),
+        removed_files=[f"{row.name}{row.extension}" for row in removed],
+        added=len(inserts),
+        modified=modified,
+        renamed=len(renames),
+        full_scan=full,
+        scanned_files=len(scan.files),
+        scanned_dirs=scan.scanned_dirs,
+        skipped_dirs=scan.skipped_dirs,
+        scan_duration=scan.duration,
+        duration=round(scan.duration + time.monotonic() - started, 3),
+        finished_at=datetime.utcnow(),
+    )
+    if removed or inserts or modified or renames:
+        logging.info(
+            f"Сверка: добавлено {report.added}, изменено {report.modified}, переименовано {report.renamed}, "
+            f"удалено {report.removed} записей о файлах."
+        )
+    return report
+
+
+class Reconciler:
+    """Периодическая сверка каталога с содержимым хранилища."""
+
+    def __init__(self, full_scan_every: int = RECONCILE_FULL_SCAN_EVERY):
+        self.scanner = DirectoryScanner()
+        self.full_scan_every = max(1, full_scan_every)
+        self.passes = 0
+        self.lock = asyncio.Lock()
+
+    def _reconcile_directory(self) -> ReconcileReport:
+        full = self.passes % self.full_scan_every == 0
+        scan = self.scanner.scan(full=full)
+        db = SessionLocal()
+        try:
+            return apply_scan(db, scan, self.scanner, full)
+        except BaseException:
+            # Следующий проход перечитает все директории заново
+            self.scanner.listings = {}
+            raise
+        finally:
+            db.close()
+
+    async def run_once(self) -> ReconcileReport:
+        async with self.lock:
+            if isinstance(get_storage(), LocalStorage):
+                report = await run_in_threadpool(self._reconcile_directory)
+            else:
+                async with AsyncSessionLocal() as db:
+                    report = await remove_missing_records(db)
+            self.passes += 1
+        logging.debug(
+            f"Сверка завершена за {report.duration} с: файлов на диске {report.scanned_files}, "
+            f"прочитано директорий {report.scanned_dirs}, пропущено {report.skipped_dirs}."
+        )
+        return report
+
+
+reconciler = Reconciler()
+
+
+async def reconcile() -> ReconcileReport:
+    """Выполняет одну сверку каталога с хранилищем и запоминает отчёт."""
+    global last_report
+    last_report = await reconciler.run_once()
+    return last_report
+
+
+async def run_reconciler(interval: int = RECONCILE_INTERVAL) -> None:
+    """Фоновая задача: сверка при запуске приложения и далее раз в interval секунд."""
+    while True:
+        try:
+            await reconcile()
+        except Exception as e:
+            logging.error(f"Ошибка при сверке каталога с хранилищем: {e}", exc_info=True)
+        await asyncio.sleep(interval)
@@ -1,7 +1,7 @@
 import os
 
 from pydantic import BaseModel, validator
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 
@@ -13,6 +13,7 @@ class FileBase(BaseModel):
     created_at: datetime
     updated_at: Optional[datetime] = None
     comment: Optional[str] = None
+    checksum: Optional[str] = None
 
 
 class FileCreate(BaseModel):
@@ -21,6 +22,9 @@ class FileCreate(BaseModel):
     size: int
     path: str
     comment: Optional[str] = None
+    checksum: Optional[str] = None
+    encoding: Optional[str] = None
+    stored_size: Optional[int] = None
 
 
 class FileUpdate(BaseModel):
@@ -30,6 +34,14 @@ class FileUpdate(BaseModel):
 
 
 class FileResponse(FileBase):
+    encoding: Optional[str] = None  # Сжатие в хранилище: gzip, zstd или null
+    stored_size: Optional[int] = None  # Размер в хранилище (size - исходный размер)
+    mime_type: Optional[str] = None
+    width: Optional[int] = None  # Размеры изображения в пикселях
+    height: Optional[int] = None
+    page_count: Optional[int] = None  # Число страниц PDF
+    has_preview: bool = False  # Превью доступно по адресу /preview/{name}
+
     class Config:
         orm_mode = True
 
@@ -37,3 +49,137 @@ class FileResponse(FileBase):
     def remove_filename_from_path(cls, v, values):
         # Удаляем имя файла из пути
         return os.path.dirname(v)
+
+
+class UploadSessionCreate(BaseModel):
+    file_name: str  # Имя файла вместе с расширением
+    size: int
+    chunk_size: Optional[int] = None
+    checksum: Optional[str] = None  # Ожидаемый SHA-256 всего файла
+    comment: Optional[str] = None
+
+
+class UploadSessionResponse(BaseModel):
+    id: str
+    file_name: str
+    size: int
+    chunk_size: int
+    total_chunks: int
+    received_chunks: List[int]
+    status: str
+    expires_at: datetime
+
+    class Config:
+        orm_mode = True
+
+
+class UploadChunkResponse(BaseModel):
+    index: int
+    size: int
+    checksum: str
+
+    class Config:
+        orm_mode = True
+
+
+class ReconcileReport(BaseModel):
+    checked: int  # Проверено записей о файлах
+    removed: int  # Удалено записей, содержимого которых нет в хранилище
+    removed_files: List[str]
+    added: int = 0  # Добавлено записей о новых файлах
+    modified: int = 0  # Обновлено записей об изменённых файлах
+    renamed: int = 0  # Обновлено записей о переименованных и перемещённых файлах
+    full_scan: bool = False  # Обход без пропуска неизменённых директорий
+    scanned_files: int = 0  # Файлов на диске
+    scanned_dirs: int = 0  # Директорий, прочитанных через scandir
+    skipped_dirs: int = 0  # Неизменённых директорий, взятых из результатов прошлого обхода
+    scan_duration: float = 0  # Длительность обхода диска в секундах
+    duration: float  # Длительность сверки в секундах
+    finished_at: datetime
+
+
+class WatcherStats(BaseModel):
+    events_received: int = 0
+    events_coalesced: int = 0  # События, объединённые с ещё не обработанными событиями того же пути
+    queue_depth: int = 0
+    queue_max_depth: int = 0
+    backpressure_waits: int = 0  # Сколько раз наблюдатель ждал освобождения места в очереди
+    pending: int = 0  # Пути, ожидающие окончания записи файла
+    batches: int = 0
+    files_added: int = 0
+    files_updated: int = 0
+    files_renamed: int = 0
+    files_deleted: int = 0
+    last_batch_size: int = 0
+    last_batch_duration: float = 0
+
+
+class CacheStats(BaseModel):
+    hits: int = 0
+    misses: int = 0
+    expirations: int = 0  # Промахи из-за истёкшего времени жизни записи
+    evictions: int = 0  # Записи, вытесненные при переполнении кеша
+    invalidations: int = 0
+    size: int = 0
+    shared_hits: int = 0  # Попадания в общий уровень кеша (Redis) после промаха в памяти процесса
+    shared_misses: int = 0
+
+
+class ProfileStack(BaseModel):
+    stack: str  # Кадры от внешнего к внутреннему через ";"
+    count: int  # Число выборок с этим стеком
+
+
+class SlowRequestProfile(BaseModel):
+    method: str
+    path: str
+    started_at: datetime
+    duration: float  # Секунды
+    samples: int
+    stacks: List[ProfileStack]
+
+
+class BulkItemResult(BaseModel):
+    name: str
+    status: int  # HTTP-статус операции над этим файлом
+    detail: Optional[str] = None
+    file: Optional[FileResponse] = None
+
+
+class BulkDeleteRequest(BaseModel):
+    names: List[str]
+
+
+class BulkUpdateItem(FileUpdate):
+    file_name: str  # Текущее имя файла
+
+
+class BulkUpdateRequest(BaseModel):
+    items: List[BulkUpdateItem]
+
+
+class ArchiveRequest(BaseModel):
+    names: Optional[List[str]] = None
+    directory: Optional[str] = None  # Вместо списка имён: все файлы директории, как в /search/
+    recursive: bool = False
+    format: str = "zip"  # zip или tar
+
+    @validator('format')
+    def check_format(cls, v):
+        if v not in ("zip", "tar"):
+            raise ValueError("Поддерживаются форматы zip и tar")
+        return v
+
+
+class FileOperationResponse(BaseModel):
+    id: int
+    kind: str
+    source: str
+    target: Optional[str] = None
+    status: str
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
@@ -0,0 +1,104 @@
+import json
+import os
+from datetime import datetime
+from typing import AsyncIterator, Iterable, List, Optional, Sequence
+
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.sql import Select
+
+from src.database import AsyncSessionLocal
+from src.models import File
+
+try:
+    import orjson
+except ImportError:  # orjson необязателен: без него используется стандартный json
+    orjson = None
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+# Записей в одном фрагменте потокового ответа NDJSON
+NDJSON_BATCH_SIZE = 1000
+
+# Столбцы, из которых собирается ответ FileResponse. Списки файлов читаются кортежами этих столбцов,
+# без создания объектов ORM и проверки каждой записи моделью Pydantic. id нужен для курсора следующей страницы
+FILE_RESPONSE_COLUMNS = (
+    File.id, File.name, File.extension, File.size, File.path, File.created_at, File.updated_at, File.comment,
+    File.checksum, File.encoding, File.stored_size, File.mime_type, File.width, File.height, File.page_count,
+    File.preview_key,
+)
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Объект типа {type(value).__name__} не сериализуется в JSON")
+
+
+def dumps(content) -> bytes:
+    """JSON в том же виде, что у JSONResponse (UTF-8 без экранирования, без пробелов), через orjson, если он установлен."""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=_default).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse с сериализацией через orjson; даты сериализуются без предварительного преобразования."""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def file_row(row: Sequence) -> dict:
+    """Запись FileResponse из кортежа FILE_RESPONSE_COLUMNS; path - директория файла, как в FileResponse."""
+    (_, name, extension, size, path, created_at, updated_at, comment, checksum, encoding, stored_size,
+     mime_type, width, height, page_count, preview_key) = row
+    return {
+        "name": name,
+        "extension": extension,
+        "size": size,
+        "path": os.path.dirname(path),
+        "created_at": created_at,
+        "updated_at": updated_at,
+        "comment": comment,
+        "checksum": checksum,
+        "encoding": encoding,
+        "stored_size": stored_size,
+        "mime_type": mime_type,
+        "width": width,
+        "height": height,
+        "page_count": page_count,
+        "has_preview": preview_key is not None,
+    }
+
+
+def file_list_response(rows: List[Sequence], limit: Optional[int] = None) -> FastJSONResponse:
+    """Страница списка файлов; если страница заполнена, id последней записи передаётся в X-Next-Cursor."""
+    headers = {"X-Next-Cursor": str(rows[-1][0])} if rows and len(rows) == limit else None
+    return FastJSONResponse([file_row(row) for row in rows], headers=headers)
+
+
+def wants_ndjson(accept: Optional[str]) -> bool:
+    return bool(accept) and NDJSON_MEDIA_TYPE in accept
+
+
+async def _ndjson_lines(queries: Iterable[Select], limit: Optional[int]) -> AsyncIterator[bytes]:
+    # Собственная сессия: сессия зависимости get_db закрывается до отправки тела ответа
+    sent = 0
+    async with AsyncSessionLocal() as db:
+        for query in queries:
+            if limit is not None:
+                query = query.limit(limit - sent)
+            result = await db.stream(query.execution_options(yield_per=NDJSON_BATCH_SIZE))
+            async for rows in result.partitions():
+                sent += len(rows)
+                yield b"".join(dumps(file_row(row)) + b"\n" for row in rows)
+            if limit is not None and sent >= limit:
+                return
+
+
+def ndjson_response(queries: Iterable[Select], limit: Optional[int] = None) -> StreamingResponse:
+    """
+    Потоковый ответ NDJSON (по записи FileResponse в строке) для больших выборок: записи читаются
+    курсором пакетами по NDJSON_BATCH_SIZE и отправляются по мере чтения, не накапливаясь в памяти.
+    queries выполняются по очереди; limit - наибольшее общее число записей (None - без ограничения).
+    """
+    return StreamingResponse(_ndjson_lines(queries, limit), media_type=NDJSON_MEDIA_TYPE)
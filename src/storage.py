@@ -0,0 +1,280 @@
+import logging
+import os
+import posixpath
+import shutil
+from datetime import datetime, timezone
+from typing import AsyncIterable, AsyncIterator, List, NamedTuple, Optional
+
+import aiofiles
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+
+from src.config import (
+    CHUNK_SIZE,
+    S3_BUCKET,
+    S3_ENDPOINT_URL,
+    S3_PART_SIZE,
+    S3_REGION,
+    STORAGE_BACKEND,
+)
+
+
+class StorageStat(NamedTuple):
+    """Сведения об объекте в хранилище."""
+    key: str
+    size: int
+    modified_at: datetime
+
+
+class StorageEngine:
+    """
+    Интерфейс хранилища содержимого файлов.
+
+    Ключи объектов - пути в том виде, в котором они хранятся в базе данных
+    (например, "src/files/report.pdf" или "src/files/.blobs/ab/cd/abcd...").
+    Все операции асинхронные и не блокируют цикл событий. Для кода, работающего в отдельных потоках
+    (наблюдатель за директорией, пул фоновых операций с файлами), есть синхронные stat, move и delete.
+    """
+
+    def open_read(self, key: str, start: int = 0, end: Optional[int] = None,
+                  chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+        """Потоково читает объект блоками в диапазоне [start, end] включительно."""
+        raise NotImplementedError
+
+    async def write(self, key: str, chunks: AsyncIterable[bytes]) -> int:
+        """Потоково записывает объект из блоков, возвращает количество записанных байт."""
+        raise NotImplementedError
+
+    def stat_sync(self, key: str) -> Optional[StorageStat]:
+        """Возвращает размер и время изменения объекта или None, если объекта нет."""
+        raise NotImplementedError
+
+    def move_sync(self, src: str, dst: str) -> None:
+        """Перемещает объект, перезаписывая существующий объект dst."""
+        raise NotImplementedError
+
+    def delete_sync(self, key: str) -> bool:
+        """Удаляет объект, возвращает False, если объекта не было."""
+        raise NotImplementedError
+
+    async def stat(self, key: str) -> Optional[StorageStat]:
+        return await run_in_threadpool(self.stat_sync, key)
+
+    async def exists(self, key: str) -> bool:
+        return await self.stat(key) is not None
+
+    async def move(self, src: str, dst: str) -> None:
+        await run_in_threadpool(self.move_sync, src, dst)
+
+    async def delete(self, key: str) -> bool:
+        return await run_in_threadpool(self.delete_sync, key)
+
+    async def delete_prefix(self, prefix: str) -> None:
+        """Удаляет все объекты с ключами внутри директории prefix."""
+        raise NotImplementedError
+
+    def list(self, prefix: str) -> AsyncIterator[StorageStat]:
+        """Перечисляет объекты внутри директории prefix (рекурсивно)."""
+        raise NotImplementedError
+
+
+class LocalStorage(StorageEngine):
+    """Хранилище на локальной файловой системе: ключ - путь к файлу."""
+
+    async def open_read(self, key: str, start: int = 0, end: Optional[int] = None,
+                        chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+        async with aiofiles.open(key, "rb") as f:
+            await f.seek(start)
+            remaining = None if end is None else end - start + 1
+            while remaining is None or remaining > 0:
+                to_read = chunk_size if remaining is None else min(chunk_size, remaining)
+                chunk = await f.read(to_read)
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    async def write(self, key: str, chunks: AsyncIterable[bytes]) -> int:
+        directory = os.path.dirname(key)
+        if directory:
+            await run_in_threadpool(os.makedirs, directory, exist_ok=True)
+        size = 0
+        async with aiofiles.open(key, "wb") as f:
+            async for chunk in chunks:
+                await f.write(chunk)
+                size += len(chunk)
+        return size
+
+    def stat_sync(self, key: str) -> Optional[StorageStat]:
+        try:
+            st = os.stat(key)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        return StorageStat(key, st.st_size, datetime.fromtimestamp(st.st_mtime, tz=timezone.utc))
+
+    def move_sync(self, src: str, dst: str) -> None:
+        directory = os.path.dirname(dst)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        shutil.move(src, dst)  # Переименование в пределах одной ФС, копирование между ФС
+
+    def delete_sync(self, key: str) -> bool:
+        try:
+            os.remove(key)
+            return True
+        except FileNotFoundError:
+            return False
+
+    async def delete_prefix(self, prefix: str) -> None:
+        await run_in_threadpool(shutil.rmtree, prefix, True)
+
+    def _list(self, prefix: str) -> List[StorageStat]:
+        found = []
+        for root, _, files in os.walk(prefix):
+            for file_name in files:
+                stat = self.stat_sync(os.path.join(root, file_name))
+                if stat:
+                    found.append(stat)
+        return found
+
+    async def list(self, prefix: str) -> AsyncIterator[StorageStat]:
+        for stat in await run_in_threadpool(self._list, prefix):
+            yield stat
+
+
+class S3Storage(StorageEngine):
+    """
+    S3-совместимое объектное хранилище (AWS S3, MinIO и т.п.): ключ - ключ объекта в бакете.
+
+    Для проверки без облака достаточно указать S3_ENDPOINT_URL локального MinIO
+    или другого S3-совместимого сервера. Требует пакет boto3.
+    """
+
+    def __init__(self, bucket: str, endpoint_url: Optional[str] = None, region: Optional[str] = None,
+                 part_size: int = S3_PART_SIZE, client=None):
+        if client is None:
+            try:
+                import boto3
+            except ImportError as e:
+                raise RuntimeError("Для STORAGE_BACKEND=s3 необходимо установить пакет boto3") from e
+            client = boto3.client("s3", endpoint_url=endpoint_url, region_name=region)
+        self.client = client
+        self.bucket = bucket
+        self.part_size = part_size
+
+    @staticmethod
+    def _key(key: str) -> str:
+        return posixpath.normpath(key.replace(os.sep, "/")).lstrip("/")
+
+    async def open_read(self, key: str, start: int = 0, end: Optional[int] = None,
+                        chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+        params = {"Bucket": self.bucket, "Key": self._key(key)}
+        if start or end is not None:
+            # Для пустого объекта S3 отвечает на "bytes=0-" ошибкой 416 InvalidRange
+            params["Range"] = f"bytes={start}-{'' if end is None else end}"
+        response = await run_in_threadpool(self.client.get_object, **params)
+        body = response["Body"]
+        try:
+            async for chunk in iterate_in_threadpool(body.iter_chunks(chunk_size)):
+                yield chunk
+        finally:
+            body.close()
+
+    async def write(self, key: str, chunks: AsyncIterable[bytes]) -> int:
+        """Записывает объект multipart-загрузкой; в памяти держится не больше одной части."""
+        object_key = self._key(key)
+        buffer = bytearray()
+        size = 0
+        upload_id = None
+        parts = []
+        try:
+            async for chunk in chunks:
+                buffer.extend(chunk)
+                size += len(chunk)
+                if len(buffer) >= self.part_size:
+                    if upload_id is None:
+                        upload = await run_in_threadpool(
+                            self.client.create_multipart_upload, Bucket=self.bucket, Key=object_key
+                        )
+                        upload_id = upload["UploadId"]
+                    part = await run_in_threadpool(
+                        self.client.upload_part, Bucket=self.bucket, Key=object_key, UploadId=upload_id,
+                        PartNumber=len(parts) + 1, Body=bytes(buffer),
+                    )
+                    parts.append({"ETag": part["ETag"], "PartNumber": len(parts) + 1})
+                    buffer.clear()
+
+            if upload_id is None:
+                await run_in_threadpool(self.client.put_object, Bucket=self.bucket, Key=object_key, Body=bytes(buffer))
+                return size
+
+            if buffer:
+                part = await run_in_threadpool(
+                    self.client.upload_part, Bucket=self.bucket, Key=object_key, UploadId=upload_id,
+                    PartNumber=len(parts) + 1, Body=bytes(buffer),
+                )
+                parts.append({"ETag": part["ETag"], "PartNumber": len(parts) + 1})
+            await run_in_threadpool(
+                self.client.complete_multipart_upload, Bucket=self.bucket, Key=object_key,
+                UploadId=upload_id, MultipartUpload={"Parts": parts},
+            )
+            return size
+        except BaseException:
+            if upload_id is not None:
+                await run_in_threadpool(
+                    self.client.abort_multipart_upload, Bucket=self.bucket, Key=object_key, UploadId=upload_id
+                )
+            raise
+
+    def stat_sync(self, key: str) -> Optional[StorageStat]:
+        from botocore.exceptions import ClientError
+
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return StorageStat(key, head["ContentLength"], head["LastModified"])
+
+    def move_sync(self, src: str, dst: str) -> None:
+        # Управляемое копирование boto3 использует multipart copy для объектов больше 5 ГБ
+        self.client.copy({"Bucket": self.bucket, "Key": self._key(src)}, self.bucket, self._key(dst))
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(src))
+
+    def delete_sync(self, key: str) -> bool:
+        if self.stat_sync(key) is None:
+            return False
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+        return True
+
+    async def delete_prefix(self, prefix: str) -> None:
+        keys = [{"Key": self._key(stat.key)} async for stat in self.list(prefix)]
+        for start in range(0, len(keys), 1000):  # Не больше 1000 ключей за запрос
+            await run_in_threadpool(
+                self.client.delete_objects, Bucket=self.bucket, Delete={"Objects": keys[start:start + 1000]}
+            )
+
+    async def list(self, prefix: str) -> AsyncIterator[StorageStat]:
+        paginator = self.client.get_paginator("list_objects_v2")
+        pages = paginator.paginate(Bucket=self.bucket, Prefix=self._key(prefix).rstrip("/") + "/")
+        async for page in iterate_in_threadpool(iter(pages)):
+            for item in page.get("Contents", []):
+                yield StorageStat(item["Key"], item["Size"], item["LastModified"])
+
+
+_storage: Optional[StorageEngine] = None
+
+
+def get_storage() -> StorageEngine:
+    """Возвращает хранилище, выбранное переменной окружения STORAGE_BACKEND (local или s3)."""
+    global _storage
+    if _storage is None:
+        if STORAGE_BACKEND == "s3":
+            _storage = S3Storage(S3_BUCKET, endpoint_url=S3_ENDPOINT_URL, region=S3_REGION)
+        elif STORAGE_BACKEND == "local":
+            _storage = LocalStorage()
+        else:
+            raise RuntimeError(f"Неизвестный тип хранилища: {STORAGE_BACKEND}")
+        logging.info(f"Хранилище файлов: {type(_storage).__name__}.")
+    return _storage
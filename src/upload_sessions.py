@@ -0,0 +1,290 @@
+import asyncio
+import logging
+import math
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.blob_store import acquire_blob, discard_blobs, has_blob
+from src.compression import CompressingStream, choose_encoding
+from src.config import (
+    FILES_DIR,
+    MAX_UPLOAD_SIZE,
+    UPLOAD_SESSION_ASSEMBLY_TIMEOUT,
+    UPLOAD_SESSION_CHUNK_SIZE,
+    UPLOAD_SESSION_CLEANUP_INTERVAL,
+    UPLOAD_SESSION_MAX_CHUNK_SIZE,
+    UPLOAD_SESSION_MIN_CHUNK_SIZE,
+    UPLOAD_SESSION_TTL,
+    UPLOAD_TMP_DIR,
+)
+from src.crud import create_file
+from src.database import AsyncSessionLocal
+from src.models import Blob, File, UploadChunk, UploadSession
+from src.schemas import FileCreate, UploadSessionCreate
+from src.storage import get_storage
+from src.utils import HashingStream, temp_key
+
+
+def session_dir(session_id: str) -> str:
+    """Директория с частями файла для сессии загрузки."""
+    return os.path.join(UPLOAD_TMP_DIR, session_id)
+
+
+def chunk_path(session_id: str, index: int) -> str:
+    return os.path.join(session_dir(session_id), f"{index}.part")
+
+
+def assembly_cutoff() -> datetime:
+    """Сборка, начатая раньше этого момента, считается прерванной (процесс, начавший её, остановлен)."""
+    return datetime.utcnow() - timedelta(seconds=UPLOAD_SESSION_ASSEMBLY_TIMEOUT)
+
+
+def expected_chunk_size(upload_session: UploadSession, index: int) -> int:
+    """Размер части с номером index: все части одинаковые, кроме, возможно, последней."""
+    if index < upload_session.total_chunks - 1:
+        return upload_session.chunk_size
+    return upload_session.size - upload_session.chunk_size * (upload_session.total_chunks - 1)
+
+
+async def create_upload_session(db: AsyncSession, data: UploadSessionCreate) -> UploadSession:
+    """Создаёт сессию загрузки по частям."""
+    file_name = os.path.basename(data.file_name)
+    file_base_name, _ = os.path.splitext(file_name)
+    if not file_base_name:
+        raise HTTPException(status_code=400, detail="Некорректное имя файла.")
+    if data.size < 0 or data.size > MAX_UPLOAD_SIZE:
+        raise HTTPException(status_code=413, detail="Превышен максимальный размер файла.")
+
+    chunk_size = data.chunk_size or UPLOAD_SESSION_CHUNK_SIZE
+    if not UPLOAD_SESSION_MIN_CHUNK_SIZE <= chunk_size <= UPLOAD_SESSION_MAX_CHUNK_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Размер части должен быть от {UPLOAD_SESSION_MIN_CHUNK_SIZE} "
+                   f"до {UPLOAD_SESSION_MAX_CHUNK_SIZE} байт.",
+        )
+
+    if await db.scalar(select(File.id).where(File.name == file_base_name).limit(1)):
+        raise HTTPException(status_code=400, detail="Файл с таким именем уже существует.")
+
+    now = datetime.utcnow()
+    upload_session = UploadSession(
+        id=uuid.uuid4().hex,
+        file_name=file_name,
+        size=data.size,
+        chunk_size=chunk_size,
+        total_chunks=max(1, math.ceil(data.size / chunk_size)),
+        checksum=data.checksum.lower() if data.checksum else None,
+        comment=data.comment,
+        status="active",
+        created_at=now,
+        expires_at=now + timedelta(seconds=UPLOAD_SESSION_TTL),
+    )
+    db.add(upload_session)
+    await db.commit()
+    await db.refresh(upload_session)
+    logging.info(f"Создана сессия загрузки {upload_session.id} для файла '{file_name}'.")
+    return upload_session
+
+
+async def get_upload_session(db: AsyncSession, session_id: str, active: bool = True) -> UploadSession:
+    """Возвращает сессию загрузки; при active=True сессия должна принимать части."""
+    upload_session = await db.get(UploadSession, session_id)
+    if not upload_session:
+        raise HTTPException(status_code=404, detail="Сессия загрузки не найдена")
+    if upload_session.expires_at < datetime.utcnow():
+        raise HTTPException(status_code=410, detail="Сессия загрузки истекла")
+    if upload_session.status == "assembling" and (
+        upload_session.assembling_at is None or upload_session.assembling_at < assembly_cutoff()
+    ):
+        # Процесс, начавший сборку, не завершил её и не вернул сессию: сессия снова принимает части
+        logging.warning(f"Сборка файла сессии загрузки {session_id} прервана, сессия снова активна.")
+        upload_session.status = "active"
+        upload_session.assembling_at = None
+        await db.commit()
+    if active and upload_session.status != "active":
+        raise HTTPException(status_code=409, detail="Сессия загрузки уже завершается")
+    return upload_session
+
+
+async def save_chunk(db: AsyncSession, upload_session: UploadSession, index: int,
+                     body: AsyncIterator[bytes], checksum: Optional[str] = None) -> UploadChunk:
+    """
+    Потоково сохраняет часть файла и проверяет её размер и SHA-256.
+
+    Часть пишется во временный объект и затем переносится на место, поэтому повторная
+    или параллельная отправка одной и той же части не оставляет повреждённых данных.
+    """
+    if not 0 <= index < upload_session.total_chunks:
+        raise HTTPException(status_code=400, detail="Некорректный номер части.")
+
+    storage = get_storage()
+    expected_size = expected_chunk_size(upload_session, index)
+    final_key = chunk_path(upload_session.id, index)
+    tmp_key = f"{final_key}.{uuid.uuid4().hex}.tmp"
+    stream = HashingStream(body, expected_size, HTTPException(status_code=400, detail="Размер части больше ожидаемого."))
+    try:
+        await storage.write(tmp_key, stream)
+        if stream.size != expected_size:
+            raise HTTPException(status_code=400, detail=f"Ожидалась часть размером {expected_size} байт.")
+        if checksum and checksum.lower() != stream.sha256:
+            raise HTTPException(status_code=400, detail="Контрольная сумма части не совпадает.")
+        await storage.move(tmp_key, final_key)
+    except BaseException:
+        await storage.delete(tmp_key)
+        raise
+
+    chunk = await db.merge(UploadChunk(session_id=upload_session.id, index=index, size=stream.size, checksum=stream.sha256))
+    await db.commit()
+    return chunk
+
+
+async def iter_chunks(session_id: str, total_chunks: int) -> AsyncIterator[bytes]:
+    """Читает части сессии подряд блоками по CHUNK_SIZE, части целиком в память не читаются."""
+    storage = get_storage()
+    for index in range(total_chunks):
+        async for block in storage.open_read(chunk_path(session_id, index)):
+            yield block
+
+
+async def store_chunks(db: AsyncSession, upload_session: UploadSession) -> Blob:
+    """
+    Собирает файл из частей и размещает его в хранилище блобов.
+
+    Если клиент заранее указал SHA-256 и такое содержимое уже известно, части только
+    проверяются чтением, а итоговый файл не собирается и не записывается.
+    """
+    storage = get_storage()
+    session_id, total_chunks = upload_session.id, upload_session.total_chunks
+    expected = upload_session.checksum
+    encoding = choose_encoding(upload_session.file_name, upload_session.size)
+    mismatch = HTTPException(status_code=400, detail="Контрольная сумма файла не совпадает.")
+
+    if expected and await has_blob(db, expected):
+        stream = HashingStream(iter_chunks(session_id, total_chunks))
+        async for _ in stream:
+            pass
+        if stream.sha256 != expected:
+            raise mismatch
+        try:
+            return await acquire_blob(db, stream.sha256, stream.size)
+        except FileNotFoundError:
+            pass  # Последняя ссылка была удалена параллельно, собираем файл заново
+
+    stream = HashingStream(iter_chunks(session_id, total_chunks))
+    compressed = CompressingStream(stream, encoding)
+    tmp_key = temp_key()
+    try:
+        await storage.write(tmp_key, compressed)
+        if expected and expected != stream.sha256:
+            raise mismatch
+    except BaseException:
+        await storage.delete(tmp_key)
+        raise
+    return await acquire_blob(db, stream.sha256, stream.size, tmp_key, compressed.encoding, compressed.stored_size)
+
+
+async def complete_upload_session(db: AsyncSession, upload_session: UploadSession) -> File:
+    """Собирает файл из частей, размещает его в хранилище блобов и создаёт запись о файле."""
+    missing = set(range(upload_session.total_chunks)) - set(upload_session.received_chunks)
+    if missing:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Не получены части: {', '.join(str(index) for index in sorted(missing)[:20])}",
+        )
+
+    # Откат транзакции при сборке сбрасывает загруженные атрибуты, поэтому нужные значения читаем заранее
+    session_id, total_chunks, comment = upload_session.id, upload_session.total_chunks, upload_session.comment
+    file_name = upload_session.file_name
+    file_base_name, file_extension = os.path.splitext(file_name)
+    if await db.scalar(select(File.id).where(File.name == file_base_name).limit(1)):
+        raise HTTPException(status_code=400, detail="Файл с таким именем уже существует.")
+
+    # Помечаем сессию, чтобы параллельный запрос на завершение не начал сборку повторно
+    upload_session.status = "assembling"
+    upload_session.assembling_at = datetime.utcnow()
+    await db.commit()
+
+    # При ошибке сборки или создания записи о файле сессия снова принимает части и может быть завершена повторно,
+    # а собранное содержимое, на которое не осталось ссылок, удаляется из хранилища
+    sha256 = None
+    try:
+        blob = await store_chunks(db, upload_session)
+        sha256 = blob.hash
+        file_record = await create_file(db, FileCreate(
+            name=file_base_name,
+            extension=file_extension,
+            size=blob.size,
+            path=FILES_DIR,
+            comment=comment,
+            checksum=sha256,
+            encoding=blob.encoding,
+            stored_size=blob.stored_size,
+        ), file_path=os.path.join(FILES_DIR, file_name), blob_hash=sha256)
+    except BaseException:
+        await db.rollback()
+        if sha256 is not None:
+            await discard_blobs(db, [sha256])
+        upload_session.status = "active"
+        upload_session.assembling_at = None
+        await db.commit()
+        raise
+
+    await _delete_session(db, session_id)
+    logging.info(f"Файл '{file_name}' собран из {total_chunks} частей.")
+    return file_record
+
+
+async def _delete_session(db: AsyncSession, session_id: str) -> None:
+    await get_storage().delete_prefix(session_dir(session_id))
+    await db.execute(delete(UploadChunk).where(UploadChunk.session_id == session_id))
+    await db.execute(delete(UploadSession).where(UploadSession.id == session_id))
+    await db.commit()
+
+
+async def delete_upload_session(db: AsyncSession, upload_session: UploadSession) -> None:
+    """Удаляет сессию загрузки вместе с принятыми частями."""
+    await _delete_session(db, upload_session.id)
+
+
+async def cleanup_expired_sessions(db: AsyncSession) -> int:
+    """
+    Удаляет просроченные сессии загрузки и их части, возвращает количество удалённых сессий.
+    Сессии с прерванной сборкой снова становятся активными.
+    """
+    reopened = await db.execute(
+        update(UploadSession)
+        .where(UploadSession.status == "assembling",
+               or_(UploadSession.assembling_at.is_(None), UploadSession.assembling_at < assembly_cutoff()))
+        .values(status="active", assembling_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    if reopened.rowcount:
+        logging.warning(f"Сессий загрузки с прерванной сборкой снова активно: {reopened.rowcount}.")
+    expired = list(await db.scalars(select(UploadSession.id).where(UploadSession.expires_at < datetime.utcnow())))
+    for session_id in expired:
+        await _delete_session(db, session_id)
+    if expired:
+        logging.info(f"Удалено просроченных сессий загрузки: {len(expired)}.")
+    return len(expired)
+
+
+async def _cleanup_expired_sessions() -> int:
+    async with AsyncSessionLocal() as db:
+        return await cleanup_expired_sessions(db)
+
+
+async def run_session_cleanup(interval: int = UPLOAD_SESSION_CLEANUP_INTERVAL) -> None:
+    """Фоновая задача периодической очистки просроченных сессий загрузки."""
+    while True:
+        try:
+            await _cleanup_expired_sessions()
+        except Exception as e:
+            logging.error(f"Ошибка при очистке сессий загрузки: {e}", exc_info=True)
+        await asyncio.sleep(interval)
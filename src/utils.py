@@ -1,7 +1,168 @@
+import hashlib
 import os
+import posixpath
+import uuid
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import AsyncIterable, AsyncIterator, BinaryIO, Optional, Tuple
 
-def save_file(file, file_location):
-    os.makedirs(os.path.dirname(file_location), exist_ok=True)
-    with open(file_location, "wb") as f:
-        f.write(file)
+from fastapi import HTTPException, UploadFile
+from starlette.concurrency import run_in_threadpool
 
+from src.config import CHUNK_SIZE, MAX_UPLOAD_SIZE, UPLOAD_TMP_DIR
+
+
+def temp_key(suffix: str = ".part") -> str:
+    """Уникальный ключ временного объекта для загрузок."""
+    return os.path.join(UPLOAD_TMP_DIR, f"{uuid.uuid4().hex}{suffix}")
+
+
+def hash_stream(source: BinaryIO, max_size: int = MAX_UPLOAD_SIZE,
+                chunk_size: int = CHUNK_SIZE) -> Tuple[int, str]:
+    """Считает размер и SHA-256 потока без записи на диск."""
+    hasher = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_size:
+            raise HTTPException(status_code=413, detail="Превышен максимальный размер файла.")
+        hasher.update(chunk)
+    return size, hasher.hexdigest()
+
+
+# Блоки больше этого размера хешируются в пуле потоков (hashlib при этом отпускает GIL)
+HASH_IN_THREAD_THRESHOLD = 64 * 1024
+
+
+async def update_hash(hasher, data: bytes) -> None:
+    """Обновляет хеш, не задерживая цикл событий на больших блоках."""
+    if len(data) >= HASH_IN_THREAD_THRESHOLD:
+        await run_in_threadpool(hasher.update, data)
+    else:
+        hasher.update(data)
+
+
+class HashingStream:
+    """
+    Асинхронный поток блоков, попутно считающий размер и SHA-256 прошедших через него данных.
+    При превышении max_size выбрасывает limit_error.
+    """
+
+    def __init__(self, chunks: AsyncIterable[bytes], max_size: Optional[int] = None,
+                 limit_error: Optional[HTTPException] = None):
+        self.chunks = chunks
+        self.max_size = max_size
+        self.limit_error = limit_error or HTTPException(status_code=413, detail="Превышен максимальный размер файла.")
+        self.size = 0
+        self._hasher = hashlib.sha256()
+
+    @property
+    def sha256(self) -> str:
+        return self._hasher.hexdigest()
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self.chunks:
+            self.size += len(chunk)
+            if self.max_size is not None and self.size > self.max_size:
+                raise self.limit_error
+            await update_hash(self._hasher, chunk)
+            yield chunk
+
+
+async def iter_upload(upload: UploadFile, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Читает загруженный файл блоками."""
+    while True:
+        chunk = await upload.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def normalize_directory(directory: str) -> str:
+    """Приводит путь директории к единому виду: разделители "/", без "./", "..", и завершающего "/"."""
+    normalized = posixpath.normpath(directory.replace("\\", "/")) if directory else "."
+    return normalized if normalized == "/" else normalized.rstrip("/")
+
+
+def parent_directory(path: str) -> str:
+    """Нормализованная родительская директория файла."""
+    return normalize_directory(posixpath.dirname(path.replace("\\", "/")))
+
+
+def parse_range_header(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Разбирает заголовок Range вида "bytes=start-end", "bytes=start-" или "bytes=-suffix".
+
+    Возвращает кортеж (start, end) включительно или None, если заголовок нужно
+    проигнорировать (другая единица измерения, несколько диапазонов, ошибка синтаксиса).
+    Выбрасывает ValueError, если диапазон синтаксически верен, но не может быть удовлетворён.
+    """
+    unit, _, ranges = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+
+    start_str, sep, end_str = ranges.strip().partition("-")
+    if not sep:
+        return None
+    start_str, end_str = start_str.strip(), end_str.strip()
+    if not (start_str.isdigit() or end_str.isdigit()):
+        return None
+    if (start_str and not start_str.isdigit()) or (end_str and not end_str.isdigit()):
+        return None
+
+    if not start_str:
+        # Суффиксный диапазон: последние N байт
+        suffix = int(end_str)
+        if suffix == 0 or size == 0:
+            raise ValueError("Диапазон не может быть удовлетворён")
+        return max(size - suffix, 0), size - 1
+
+    start = int(start_str)
+    end = int(end_str) if end_str else size - 1
+    if end_str and start > end:
+        return None
+    if start >= size:
+        raise ValueError("Диапазон не может быть удовлетворён")
+    return start, min(end, size - 1)
+
+
+def to_utc(value: datetime) -> datetime:
+    """Приводит дату к UTC с точностью до секунды (naive-даты в базе хранятся в UTC)."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).replace(microsecond=0)
+
+
+def mtime_to_datetime(mtime_ns: int) -> datetime:
+    """Время изменения файла (наносекунды) в виде naive UTC datetime с точностью до микросекунды."""
+    return datetime(1970, 1, 1) + timedelta(microseconds=mtime_ns // 1000)
+
+
+def http_date(value: datetime) -> str:
+    """Форматирует дату для заголовка Last-Modified."""
+    return format_datetime(to_utc(value), usegmt=True)
+
+
+def parse_http_date(value: str) -> Optional[datetime]:
+    """Разбирает дату из заголовков If-Modified-Since / If-Range, возвращает None при ошибке."""
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if parsed is None:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def etag_matches(header_value: str, etag: str) -> bool:
+    """Проверяет заголовок If-None-Match (слабое сравнение, поддерживается "*")."""
+    candidates = [tag.strip() for tag in header_value.split(",")]
+    bare = etag[2:] if etag.startswith("W/") else etag
+    return "*" in candidates or any(
+        (tag[2:] if tag.startswith("W/") else tag) == bare for tag in candidates
+    )
@@ -0,0 +1,66 @@
+import asyncio
+import os
+import shutil
+import tempfile
+
+# Настройки читаются из окружения при импорте src.config, поэтому задаются до импорта приложения
+WORKDIR = tempfile.mkdtemp(prefix="files-tests-")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{os.path.join(WORKDIR, 'test.db')}",
+    "FILES_DIR": os.path.join(WORKDIR, "files"),
+    "WATCHER_ENABLED": "0",
+    "RECONCILE_INTERVAL": "0",
+    "PREVIEW_WORKERS": "1",
+    "RATE_LIMIT_REQUESTS": "0",
+    "RATE_LIMIT_TRANSFERS": "0",
+    "RATE_LIMIT_BANDWIDTH": "0",
+})
+
+import pytest  # noqa: E402
+from sqlalchemy import delete  # noqa: E402
+
+from src.cache import metadata_cache  # noqa: E402
+from src.config import FILES_DIR  # noqa: E402
+from src.database import SessionLocal, async_engine, init_db  # noqa: E402
+from src.models import Base  # noqa: E402  Импорт моделей регистрирует таблицы в Base.metadata
+
+
+def run(coroutine):
+    """Выполняет корутину в новом цикле событий; соединения aiosqlite привязаны к циклу и закрываются после неё."""
+    async def main():
+        try:
+            return await coroutine
+        finally:
+            await async_engine.dispose()
+    return asyncio.run(main())
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    os.makedirs(FILES_DIR, exist_ok=True)
+    init_db()
+    yield
+    shutil.rmtree(WORKDIR, ignore_errors=True)
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    """Каждый тест начинается с пустого каталога и пустого хранилища."""
+    yield
+    with SessionLocal() as db:
+        for table in reversed(Base.metadata.sorted_tables):
+            db.execute(delete(table))
+        db.commit()
+    shutil.rmtree(FILES_DIR, ignore_errors=True)
+    os.makedirs(FILES_DIR)
+    metadata_cache.local.clear()
+
+
+@pytest.fixture
+def client():
+    from fastapi.testclient import TestClient
+
+    from src.app import app
+
+    with TestClient(app) as test_client:
+        yield test_client
@@ -0,0 +1,42 @@
+import io
+import os
+import tarfile
+import zipfile
+from datetime import datetime
+
+from src.config import FILES_DIR
+from src.database import SessionLocal
+from src.models import File
+
+
+def _add_file(name: str, data: bytes, modified: datetime) -> None:
+    path = os.path.join(FILES_DIR, f"{name}.txt")
+    with open(path, "wb") as f:
+        f.write(data)
+    with SessionLocal() as db:
+        db.add(File(name=name, extension=".txt", size=len(data), path=path, created_at=modified))
+        db.commit()
+
+
+def test_zip_clamps_dates_outside_dos_range(client):
+    _add_file("epoch", b"old", datetime(1970, 1, 1))
+    _add_file("recent", b"new", datetime(2024, 5, 6, 7, 8, 10))
+
+    response = client.post("/archive/", json={"names": ["epoch", "recent"]})
+
+    assert response.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        assert archive.read("epoch.txt") == b"old"
+        assert archive.getinfo("epoch.txt").date_time == (1980, 1, 1, 0, 0, 0)
+        assert archive.getinfo("recent.txt").date_time == (2024, 5, 6, 7, 8, 10)
+
+
+def test_tar_mtime_is_utc(client):
+    _add_file("stamped", b"data", datetime(2024, 5, 6, 7, 8, 10))
+
+    response = client.post("/archive/", json={"names": ["stamped"], "format": "tar"})
+
+    with tarfile.open(fileobj=io.BytesIO(response.content)) as archive:
+        member = archive.getmember("stamped.txt")
+        assert archive.extractfile(member).read() == b"data"
+        assert member.mtime == 1714979290  # 2024-05-06 07:08:10 UTC
@@ -0,0 +1,12 @@
+import hashlib
+
+from bench.seed import synthetic_content
+
+
+def test_synthetic_content_is_reproducible():
+    checksums = [hashlib.sha256(synthetic_content(index, 100000)).hexdigest() for index in range(3)]
+
+    assert checksums == [hashlib.sha256(synthetic_content(index, 100000)).hexdigest() for index in range(3)]
+    assert len(set(checksums)) == 3
+    assert synthetic_content(0, 100000, seed=1) != synthetic_content(0, 100000)
+    assert len(synthetic_content(7, 12345)) == 12345
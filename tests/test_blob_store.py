@@ -0,0 +1,153 @@
+import hashlib
+import os
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+
+import src.app
+import src.blob_store as blob_store
+from src.blob_store import acquire_blob, blob_path, discard_blobs, release_blob
+from src.crud import delete_file
+from src.database import AsyncSessionLocal
+from src.models import Blob, File
+from src.storage import get_storage
+from src.utils import temp_key
+from tests.conftest import run
+
+
+async def _chunks(data: bytes):
+    yield data
+
+
+async def _write_temp(data: bytes) -> str:
+    key = temp_key()
+    await get_storage().write(key, _chunks(data))
+    return key
+
+
+async def _blob_rows():
+    async with AsyncSessionLocal() as db:
+        return {row.hash: row.refcount for row in await db.execute(select(Blob.hash, Blob.refcount))}
+
+
+def test_concurrent_insert_keeps_caller_transaction(monkeypatch):
+    """Параллельная вставка того же блоба не откатывает предыдущую работу транзакции вызывающего кода."""
+    data = b"same content"
+    sha256 = hashlib.sha256(data).hexdigest()
+    original_has_blob = blob_store.has_blob
+
+    async def has_blob_then_concurrent_upload(db, value):
+        # Другой запрос успевает записать такое же содержимое между проверкой и вставкой
+        found = await original_has_blob(db, value)
+        async with AsyncSessionLocal() as other:
+            other.add(Blob(hash=value, size=len(data), stored_size=len(data), refcount=1))
+            await other.commit()
+        return found
+
+    monkeypatch.setattr(blob_store, "has_blob", has_blob_then_concurrent_upload)
+
+    async def scenario():
+        source_key = await _write_temp(data)
+        async with AsyncSessionLocal() as db:
+            # Работа вызывающего кода, ещё не отправленная в базу (autoflush отключён)
+            db.add(File(name="earlier", extension=".txt", size=1, path="earlier.txt"))
+            blob = await acquire_blob(db, sha256, len(data), source_key)
+            assert blob.refcount == 2
+            await db.commit()
+        async with AsyncSessionLocal() as db:
+            return await db.scalar(select(File.id).where(File.name == "earlier"))
+
+    assert run(scenario()) is not None
+    assert run(_blob_rows()) == {sha256: 2}
+    assert os.path.exists(blob_path(sha256))
+
+
+def test_discard_removes_object_of_rolled_back_blob():
+    data = b"rolled back"
+    sha256 = hashlib.sha256(data).hexdigest()
+
+    async def scenario():
+        source_key = await _write_temp(data)
+        async with AsyncSessionLocal() as db:
+            await acquire_blob(db, sha256, len(data), source_key)
+            assert os.path.exists(blob_path(sha256))
+            await db.rollback()
+            await discard_blobs(db, [sha256])
+
+    run(scenario())
+    assert run(_blob_rows()) == {}
+    assert not os.path.exists(blob_path(sha256))
+
+
+def test_discard_keeps_referenced_object():
+    data = b"referenced"
+    sha256 = hashlib.sha256(data).hexdigest()
+
+    async def scenario():
+        source_key = await _write_temp(data)
+        async with AsyncSessionLocal() as db:
+            await acquire_blob(db, sha256, len(data), source_key)
+            await db.commit()
+            await discard_blobs(db, [sha256])
+
+    run(scenario())
+    assert run(_blob_rows()) == {sha256: 1}
+    assert os.path.exists(blob_path(sha256))
+
+
+def test_release_blob_leaves_commit_to_caller():
+    data = b"released"
+    sha256 = hashlib.sha256(data).hexdigest()
+
+    async def scenario():
+        source_key = await _write_temp(data)
+        async with AsyncSessionLocal() as db:
+            await acquire_blob(db, sha256, len(data), source_key)
+            await db.commit()
+        async with AsyncSessionLocal() as db:
+            assert await release_blob(db, sha256)
+            await db.rollback()
+
+    run(scenario())
+    assert run(_blob_rows()) == {sha256: 1}
+    assert os.path.exists(blob_path(sha256))
+
+
+def test_delete_file_removes_last_reference():
+    data = b"deleted"
+    sha256 = hashlib.sha256(data).hexdigest()
+
+    async def scenario():
+        source_key = await _write_temp(data)
+        async with AsyncSessionLocal() as db:
+            await acquire_blob(db, sha256, len(data), source_key)
+            db_file = File(name="d", extension=".txt", size=len(data), path="d.txt", blob_hash=sha256)
+            db.add(db_file)
+            await db.commit()
+            await delete_file(db, db_file.id)
+
+    run(scenario())
+    assert run(_blob_rows()) == {}
+    assert not os.path.exists(blob_path(sha256))
+
+
+def test_upload_removes_blob_when_file_record_fails(client, monkeypatch):
+    async def failing_create_file(db, *args, **kwargs):
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Файл с таким именем уже существует.")
+
+    monkeypatch.setattr(src.app, "create_file", failing_create_file)
+    response = client.post("/upload/", files={"uploaded_file": ("orphan.txt", b"orphan content")})
+
+    assert response.status_code == 400
+    assert run(_blob_rows()) == {}
+    assert not os.path.exists(blob_path(hashlib.sha256(b"orphan content").hexdigest()))
+
+
+@pytest.mark.parametrize("count", [1, 3])
+def test_upload_same_content_shares_blob(client, count):
+    for index in range(count):
+        response = client.post("/upload/", files={"uploaded_file": (f"shared{index}.txt", b"shared content")})
+        assert response.status_code == 200
+    assert run(_blob_rows()) == {hashlib.sha256(b"shared content").hexdigest(): count}
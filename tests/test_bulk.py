@@ -0,0 +1,46 @@
+from sqlalchemy import select
+
+from src.database import SessionLocal
+from src.models import Blob
+
+
+def _statuses(response) -> list:
+    assert response.status_code == 200
+    return [(item["name"], item["status"]) for item in response.json()]
+
+
+def test_bulk_upload_reports_each_file(client):
+    client.post("/upload/", files={"uploaded_file": ("taken.txt", b"old")})
+
+    response = client.post("/bulk/upload/", files=[
+        ("uploaded_files", ("a.txt", b"same")),
+        ("uploaded_files", ("b.txt", b"same")),
+        ("uploaded_files", ("taken.bin", b"new")),
+        ("uploaded_files", ("a.pdf", b"other")),
+    ])
+
+    assert [status for _, status in _statuses(response)] == [200, 200, 400, 400]
+    assert client.get("/download/b").content == b"same"
+    with SessionLocal() as db:
+        refcounts = dict(db.execute(select(Blob.hash, Blob.refcount)).all())
+    assert sorted(refcounts.values()) == [1, 2]  # Одинаковое содержимое хранится один раз
+
+
+def test_bulk_delete_and_update(client):
+    for name in ("one", "two", "three"):
+        client.post("/upload/", files={"uploaded_file": (f"{name}.txt", name.encode())})
+
+    response = client.post("/bulk/update/", json={"items": [
+        {"file_name": "one", "name": "first"},
+        {"file_name": "two", "comment": "kept"},
+        {"file_name": "three", "name": "first"},
+        {"file_name": "missing", "comment": "x"},
+    ]})
+    assert [status for _, status in _statuses(response)] == [200, 200, 400, 404]
+    assert client.get("/file/two").json()["comment"] == "kept"
+
+    response = client.post("/bulk/delete/", json={"names": ["first", "missing", "two"]})
+    assert _statuses(response) == [("first", 200), ("missing", 404), ("two", 200)]
+    assert [item["name"] for item in client.get("/files/").json()] == ["three"]
+    with SessionLocal() as db:
+        assert db.scalar(select(Blob.refcount)) == 1
@@ -0,0 +1,29 @@
+def _stats(client) -> dict:
+    return client.get("/cache/").json()
+
+
+def test_repeated_lookup_is_served_from_cache(client):
+    client.post("/upload/", files={"uploaded_file": ("hot.bin", b"hot")})
+    before = _stats(client)
+
+    assert client.get("/file/hot").status_code == 200
+    assert client.get("/file/hot").status_code == 200
+
+    after = _stats(client)
+    assert after["misses"] - before["misses"] == 1
+    assert after["hits"] - before["hits"] == 1
+
+
+def test_changes_invalidate_cached_metadata(client):
+    client.post("/upload/", files={"uploaded_file": ("hot.bin", b"hot")})
+    assert client.get("/file/hot").json()["comment"] is None
+
+    assert client.put("/file/hot", json={"comment": "updated"}).status_code == 200
+    assert client.get("/file/hot").json()["comment"] == "updated"
+
+    assert client.put("/file/hot", json={"name": "cold"}).status_code == 200
+    assert client.get("/file/hot").status_code == 404
+    assert client.get("/file/cold").status_code == 200
+
+    assert client.delete("/file/cold").status_code == 200
+    assert client.get("/file/cold").status_code == 404
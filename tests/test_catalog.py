@@ -0,0 +1,64 @@
+import json
+
+from sqlalchemy import func, select
+
+from src.database import SessionLocal
+from src.models import File
+
+
+def _add_files(count: int) -> None:
+    with SessionLocal() as db:
+        for index in range(count):
+            db.add(File(name=f"f{index:02d}", extension=".txt", size=index, path=f"missing/f{index:02d}.txt"))
+        db.commit()
+
+
+def _names(response) -> list:
+    assert response.status_code == 200
+    return [item["name"] for item in response.json()]
+
+
+def test_list_files_with_cursor(client):
+    _add_files(12)
+
+    first = client.get("/files/")
+    second = client.get("/files/", params={"cursor": first.headers["x-next-cursor"]})
+
+    assert _names(first) == [f"f{index:02d}" for index in range(10)]
+    assert _names(second) == ["f10", "f11"]
+    assert "x-next-cursor" not in second.headers
+    assert _names(client.get("/files/", params={"skip": 10, "limit": 5})) == ["f10", "f11"]
+
+
+def test_list_files_bounds(client):
+    assert client.get("/files/", params={"limit": 0}).status_code == 422
+    assert client.get("/files/", params={"limit": 1001}).status_code == 422
+    assert client.get("/files/", params={"skip": -1}).status_code == 422
+
+
+def test_list_files_ndjson(client):
+    _add_files(3)
+
+    response = client.get("/files/", headers={"Accept": "application/x-ndjson"})
+
+    assert [json.loads(line)["name"] for line in response.text.splitlines()] == ["f00", "f01", "f02"]
+
+
+def test_names_are_unique_regardless_of_extension(client):
+    assert client.post("/upload/", files={"uploaded_file": ("report.txt", b"a")}).status_code == 200
+
+    response = client.post("/upload/", files={"uploaded_file": ("report.pdf", b"b")})
+
+    assert response.status_code == 400
+    with SessionLocal() as db:
+        assert db.scalar(select(func.count()).select_from(File)) == 1
+
+
+def test_reads_do_not_check_disk(client):
+    """Записи о файлах, которых нет на диске, не удаляются при чтении: это задача фоновой сверки."""
+    _add_files(2)
+
+    assert _names(client.get("/files/")) == ["f00", "f01"]
+    assert client.get("/file/f00").json()["name"] == "f00"
+    with SessionLocal() as db:
+        assert db.scalar(select(func.count()).select_from(File)) == 2
@@ -0,0 +1,47 @@
+import gzip
+
+TEXT = b"line of a compressible log file\n" * 2000
+
+
+def _upload(client, params=None) -> dict:
+    response = client.post("/upload/", files={"uploaded_file": ("app.log", TEXT)}, params=params)
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_text_is_stored_compressed(client):
+    body = _upload(client)
+
+    assert body["encoding"] == "gzip"
+    assert body["size"] == len(TEXT)
+    assert body["stored_size"] < len(TEXT) // 10
+
+
+def test_compressed_file_is_sent_as_is_when_accepted(client):
+    _upload(client)
+
+    with client.stream("GET", "/download/app", headers={"Accept-Encoding": "gzip"}) as response:
+        raw = b"".join(response.iter_raw())  # Без распаковки на стороне клиента
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert len(raw) < len(TEXT) and gzip.decompress(raw) == TEXT
+
+
+def test_compressed_file_is_decoded_for_other_clients(client):
+    _upload(client)
+
+    response = client.get("/download/app", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["content-length"] == str(len(TEXT))
+    assert response.content == TEXT
+
+    response = client.get("/download/app", headers={"Accept-Encoding": "identity", "Range": "bytes=100-199"})
+    assert (response.status_code, response.content) == (206, TEXT[100:200])
+
+
+def test_compression_can_be_disabled_per_upload(client):
+    body = _upload(client, params={"compression": "none"})
+
+    assert (body["encoding"], body["stored_size"]) == (None, len(TEXT))
+    assert client.post("/upload/", files={"uploaded_file": ("x.log", TEXT)}, params={"compression": "lz4"}).status_code == 400
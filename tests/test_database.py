@@ -0,0 +1,28 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+
+from src.database import AsyncSessionLocal, SessionLocal, async_url, engine_options
+from tests.conftest import run
+
+
+def test_async_driver_is_chosen_by_dialect():
+    assert async_url(make_url("sqlite:///files.db")).drivername == "sqlite+aiosqlite"
+    assert async_url(make_url("postgresql://user@host/db")).drivername == "postgresql+asyncpg"
+    with pytest.raises(RuntimeError):
+        async_url(make_url("mysql://user@host/db"))
+
+
+def test_in_memory_sqlite_is_not_pooled():
+    assert engine_options(make_url("sqlite://")) == {}
+    assert engine_options(make_url("sqlite:///files.db"))["pool_pre_ping"] is False
+
+
+def test_sqlite_connections_use_wal():
+    async def async_pragmas():
+        async with AsyncSessionLocal() as db:
+            return (await db.scalar(text("PRAGMA journal_mode")), await db.scalar(text("PRAGMA synchronous")))
+
+    with SessionLocal() as db:
+        assert (db.scalar(text("PRAGMA journal_mode")), db.scalar(text("PRAGMA synchronous"))) == ("wal", 1)
+    assert run(async_pragmas()) == ("wal", 1)  # synchronous=NORMAL
@@ -0,0 +1,56 @@
+CONTENT = bytes(range(256)) * 40
+
+
+def _upload(client, name: str = "data.bin", content: bytes = CONTENT) -> None:
+    response = client.post("/upload/", files={"uploaded_file": (name, content)})
+    assert response.status_code == 200
+
+
+def test_download_whole_file(client):
+    _upload(client)
+
+    response = client.get("/download/data")
+
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["content-length"] == str(len(CONTENT))
+    assert response.headers["accept-ranges"] == "bytes"
+
+
+def test_download_range(client):
+    _upload(client)
+
+    response = client.get("/download/data", headers={"Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.content == CONTENT[100:200]
+    assert response.headers["content-range"] == f"bytes 100-199/{len(CONTENT)}"
+
+    response = client.get("/download/data", headers={"Range": "bytes=-10"})
+    assert response.content == CONTENT[-10:]
+
+
+def test_download_unsatisfiable_range(client):
+    _upload(client)
+
+    response = client.get("/download/data", headers={"Range": f"bytes={len(CONTENT)}-"})
+
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(CONTENT)}"
+
+
+def test_conditional_download(client):
+    _upload(client)
+    etag = client.get("/download/data").headers["etag"]
+
+    assert client.get("/download/data", headers={"If-None-Match": etag}).status_code == 304
+    # Диапазон по устаревшему ETag в If-Range: отдаётся весь файл
+    response = client.get("/download/data", headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+    assert (response.status_code, response.content) == (200, CONTENT)
+
+
+def test_download_empty_file(client):
+    _upload(client, "empty.bin", b"")
+
+    response = client.get("/download/empty")
+
+    assert (response.status_code, response.content) == (200, b"")
@@ -0,0 +1,52 @@
+import os
+import time
+
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+from src.app import app
+from src.config import FILES_DIR
+from src.database import SessionLocal
+from src.models import File, FileOperation
+
+
+def _add_plain_file(name: str) -> str:
+    path = os.path.join(FILES_DIR, f"{name}.txt")
+    with open(path, "wb") as f:
+        f.write(b"plain")
+    with SessionLocal() as db:
+        db.add(File(name=name, extension=".txt", size=5, path=path))
+        db.commit()
+    return path
+
+
+def test_move_and_delete_plain_file(client):
+    old_path = _add_plain_file("plain")
+    new_path = os.path.join(FILES_DIR, "moved", "renamed.txt")
+
+    response = client.put("/file/plain", json={"name": "renamed", "path": os.path.join(FILES_DIR, "moved")})
+
+    assert response.status_code == 200
+    assert (os.path.exists(old_path), os.path.exists(new_path)) == (False, True)
+    with SessionLocal() as db:
+        assert db.scalar(select(FileOperation.status)) == "done"
+
+    assert client.delete("/file/renamed").status_code == 200
+    assert not os.path.exists(new_path)
+
+
+def test_pending_operations_resume_on_startup():
+    path = _add_plain_file("leftover")
+    with SessionLocal() as db:
+        # Операция записана в журнал, но приложение остановилось раньше, чем она выполнилась
+        operation = FileOperation(kind="delete", source=path, status="pending")
+        db.add(operation)
+        db.commit()
+        operation_id = operation.id
+
+    with TestClient(app) as client:
+        deadline = time.monotonic() + 5
+        while client.get(f"/operations/{operation_id}").json()["status"] == "pending" and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert client.get(f"/operations/{operation_id}").json()["status"] == "done"
+    assert not os.path.exists(path)
@@ -0,0 +1,39 @@
+import os
+
+import pytest
+from watchdog.events import FileCreatedEvent, FileModifiedEvent, FileMovedEvent
+
+from src.config import FILES_DIR
+from src.file_watcher import FileEventHandler, WatcherPipeline
+
+
+@pytest.fixture
+def pipeline():
+    pipeline = WatcherPipeline(root_dir=FILES_DIR, queue_size=10)
+    yield pipeline
+    pipeline.executor.shutdown(wait=False)
+
+
+def _path(*parts: str) -> str:
+    return os.path.join(FILES_DIR, *parts)
+
+
+def test_service_paths_do_not_reach_queue(pipeline):
+    handler = FileEventHandler(pipeline)
+
+    handler.on_any_event(FileModifiedEvent(_path(".uploads", "session", "0")))
+    handler.on_any_event(FileCreatedEvent(_path(".blobs", "ab", "cd", "abcd")))
+    handler.on_any_event(FileMovedEvent(_path(".previews", "tmp"), _path(".previews", "1.jpg")))
+
+    assert pipeline.events.qsize() == 0
+    assert (pipeline.stats.events_received, pipeline.stats.backpressure_waits) == (0, 0)
+
+
+def test_moves_across_service_boundary_are_queued(pipeline):
+    handler = FileEventHandler(pipeline)
+
+    handler.on_any_event(FileCreatedEvent(_path("report.pdf")))
+    handler.on_any_event(FileMovedEvent(_path(".report.pdf.tmp"), _path("report.pdf")))  # Атомарная запись
+    handler.on_any_event(FileMovedEvent(_path("old.txt"), _path(".trash", "old.txt")))
+
+    assert pipeline.events.qsize() == 3
@@ -0,0 +1,38 @@
+from prometheus_client.parser import text_string_to_metric_families
+
+
+def _samples(client) -> dict:
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    return {
+        (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+        for family in text_string_to_metric_families(response.text)
+        for sample in family.samples
+    }
+
+
+def _value(samples: dict, name: str, **labels) -> float:
+    return samples.get((name, tuple(sorted(labels.items()))), 0.0)
+
+
+def test_requests_are_counted_by_route_template(client):
+    before = _samples(client)
+    client.post("/upload/", files={"uploaded_file": ("counted.bin", b"x" * 100)})
+    client.get("/file/counted")
+    client.get("/file/missing")
+
+    after = _samples(client)
+    route = "/file/{file_name}"
+    for status in ("200", "404"):
+        labels = dict(method="GET", route=route, status=status)
+        assert _value(after, "http_requests_total", **labels) - _value(before, "http_requests_total", **labels) == 1
+    assert not [key for key in after if ("route", "/file/counted") in key[1]]  # Имена файлов не попадают в метки
+    uploaded = _value(after, "http_request_body_bytes_total", route="/upload/")
+    assert uploaded - _value(before, "http_request_body_bytes_total", route="/upload/") > 100
+
+
+def test_sql_queries_are_timed(client):
+    client.get("/files/")
+
+    samples = _samples(client)
+    assert any(name == "db_query_duration_seconds_count" and value > 0 for (name, _), value in samples.items())
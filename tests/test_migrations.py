@@ -0,0 +1,41 @@
+import os
+
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.dialects import postgresql, sqlite
+
+from src.migrations import column_ddl, migrate
+from src.models import Base, File
+
+# Таблица files первой версии схемы
+LEGACY_FILES = """CREATE TABLE files (
+    id INTEGER PRIMARY KEY, name VARCHAR NOT NULL, extension VARCHAR NOT NULL, size INTEGER NOT NULL,
+    path VARCHAR NOT NULL, created_at DATETIME, updated_at DATETIME, comment VARCHAR
+)"""
+
+
+def test_column_ddl_follows_dialect():
+    assert column_ddl(File.__table__.c.modified_at, sqlite.dialect()) == "DATETIME"
+    assert column_ddl(File.__table__.c.modified_at, postgresql.dialect()) == "TIMESTAMP WITHOUT TIME ZONE"
+    assert column_ddl(File.__table__.c.blob_hash, postgresql.dialect()) == "VARCHAR(64) REFERENCES blobs(hash)"
+
+
+def test_legacy_duplicates_get_free_names(tmp_path):
+    engine = create_engine(f"sqlite:///{os.path.join(tmp_path, 'legacy.db')}")
+    with engine.begin() as connection:
+        connection.execute(text(LEGACY_FILES))
+        connection.execute(text(
+            "INSERT INTO files (id, name, extension, size, path) VALUES "
+            "(1, 'report', '.txt', 1, 'a/report.txt'), (2, 'report', '.pdf', 1, 'a/report.pdf'), "
+            "(3, 'report_2', '.txt', 1, 'a/report_2.txt'), (4, 'report', '.doc', 1, 'a/report.doc')"
+        ))
+
+    Base.metadata.create_all(bind=engine)
+    migrate(engine)
+
+    with engine.connect() as connection:
+        names = dict(connection.execute(text("SELECT id, name FROM files ORDER BY id")).fetchall())
+    assert names == {1: "report", 2: "report_2_2", 3: "report_2", 4: "report_4"}
+    indexes = {index["name"]: index for index in inspect(engine).get_indexes("files")}
+    assert indexes["uq_files_name"]["unique"]
+    assert "modified_at" in {column["name"] for column in inspect(engine).get_columns("files")}
+    engine.dispose()
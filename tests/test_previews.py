@@ -0,0 +1,83 @@
+import asyncio
+import os
+
+import pytest
+
+from src.config import FILES_DIR
+from src.crud import delete_file
+from src.database import AsyncSessionLocal, SessionLocal
+from src.models import File
+from src.previews import PreviewPipeline, preview_key
+from tests.conftest import run
+
+
+def test_stop_cancels_workers():
+    """После остановки задачи конвейера не обращаются к сброшенной очереди и закрытому циклу событий."""
+    pipeline = PreviewPipeline(workers=2)
+
+    async def scenario():
+        pipeline.start()
+        tasks = list(pipeline.tasks)
+        await asyncio.sleep(0)
+        pipeline.stop()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        pipeline.schedule([1])  # Не запущенный конвейер не принимает файлы
+        return tasks, results
+
+    tasks, results = run(scenario())
+    assert all(task.done() for task in tasks)
+    assert all(task.cancelled() for task in tasks[:2])
+    assert not [result for result in results if result is not None and not isinstance(result, asyncio.CancelledError)]
+    assert (pipeline.tasks, pipeline.queue, pipeline.loop, pipeline.queued) == ([], None, None, set())
+
+
+def _add_image(name: str, size=(640, 480)) -> int:
+    from PIL import Image
+
+    path = os.path.join(FILES_DIR, f"{name}.png")
+    Image.new("RGB", size, "red").save(path)
+    with SessionLocal() as db:
+        db_file = File(name=name, extension=".png", size=os.path.getsize(path), path=path)
+        db.add(db_file)
+        db.commit()
+        return db_file.id
+
+
+def _process(file_id: int) -> None:
+    # Без пула процессов run_in_executor выполняет извлечение в пуле потоков цикла событий
+    pipeline = PreviewPipeline(workers=1)
+
+    async def scenario():
+        pipeline.loop = asyncio.get_running_loop()
+        await pipeline.process(file_id)
+
+    run(scenario())
+
+
+def test_image_metadata_and_preview():
+    pytest.importorskip("PIL")
+    file_id = _add_image("picture")
+
+    _process(file_id)
+
+    with SessionLocal() as db:
+        db_file = db.get(File, file_id)
+        assert (db_file.mime_type, db_file.width, db_file.height) == ("image/png", 640, 480)
+        assert db_file.processed_at is not None
+        assert db_file.preview_key == preview_key(file_id)
+    with open(preview_key(file_id), "rb") as f:
+        assert f.read(3) == b"\xff\xd8\xff"  # JPEG
+
+
+def test_preview_is_deleted_with_file():
+    pytest.importorskip("PIL")
+    file_id = _add_image("short-lived")
+    _process(file_id)
+    assert os.path.exists(preview_key(file_id))
+
+    async def delete():
+        async with AsyncSessionLocal() as db:
+            await delete_file(db, file_id)
+
+    run(delete())
+    assert not os.path.exists(preview_key(file_id))
@@ -0,0 +1,40 @@
+import asyncio
+
+from src.rate_limit import LocalBackend, RateLimiter
+
+
+def test_token_bucket_refills_at_rate(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("src.rate_limit.time.monotonic", lambda: clock[0])
+    backend = LocalBackend()
+
+    async def take():
+        return await backend.take("client", rate=2, burst=3)
+
+    assert [asyncio.run(take()) for _ in range(3)] == [0, 0, 0]
+    assert asyncio.run(take()) == 0.5  # Пустая корзина: токен накопится через 1 / rate секунд
+    clock[0] += 0.5
+    assert asyncio.run(take()) == 0
+
+
+def test_bandwidth_debt_delays_next_transfer(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("src.rate_limit.time.monotonic", lambda: clock[0])
+    backend = LocalBackend()
+
+    async def take(amount):
+        return await backend.take("bw", rate=100, burst=100, amount=amount, debt=True)
+
+    assert asyncio.run(take(300)) == 2.0  # Блок больше запаса: ждём недостающие 200 байт
+    assert asyncio.run(take(100)) == 3.0  # Долг предыдущего блока тоже ожидается
+
+
+def test_transfer_slots_are_released():
+    limiter = RateLimiter(LocalBackend(), requests=0, transfers=2, bandwidth=0)
+
+    async def scenario():
+        taken = [await limiter.acquire_transfer("client") for _ in range(3)]
+        await limiter.release("client")
+        return taken, await limiter.acquire_transfer("client")
+
+    assert asyncio.run(scenario()) == ([True, True, False], True)
@@ -0,0 +1,91 @@
+import hashlib
+import os
+
+from sqlalchemy import select
+
+from src.blob_store import blob_path
+from src.config import FILES_DIR
+from src.database import SessionLocal
+from src.models import Blob, File
+from src.reconciler import DirectoryScanner, apply_scan
+
+
+def _write(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def _add_blob_file(db, name: str, data: bytes, store: bool = True) -> str:
+    """Запись о файле из хранилища блобов; store=False - объект содержимого не записан."""
+    sha256 = hashlib.sha256(data).hexdigest()
+    if store:
+        _write(blob_path(sha256), data)
+    db.add(Blob(hash=sha256, size=len(data), stored_size=len(data), refcount=1))
+    db.add(File(name=name, extension=".bin", size=len(data), path=os.path.join(FILES_DIR, f"{name}.bin"),
+                blob_hash=sha256))
+    db.commit()
+    return sha256
+
+
+def _catalog():
+    with SessionLocal() as db:
+        return (sorted(db.scalars(select(File.name))), sorted(db.scalars(select(Blob.hash))))
+
+
+def _reconcile(scanner: DirectoryScanner, scan) -> dict:
+    with SessionLocal() as db:
+        return apply_scan(db, scan, scanner, full=True).dict()
+
+
+def test_lost_blob_is_removed():
+    with SessionLocal() as db:
+        _add_blob_file(db, "kept", b"kept")
+        _add_blob_file(db, "lost", b"lost", store=False)
+    scanner = DirectoryScanner()
+
+    report = _reconcile(scanner, scanner.scan(full=True))
+
+    assert report["removed_files"] == ["lost.bin"]
+    assert _catalog() == (["kept"], [hashlib.sha256(b"kept").hexdigest()])
+
+
+def test_blob_uploaded_after_scan_is_kept():
+    """Содержимое, загруженное и зафиксированное между обходом и сверкой с базой, не считается пропавшим."""
+    scanner = DirectoryScanner()
+    scan = scanner.scan(full=True)
+    with SessionLocal() as db:
+        sha256 = _add_blob_file(db, "late", b"late upload")
+
+    report = _reconcile(scanner, scan)
+
+    assert report["removed"] == 0
+    assert _catalog() == (["late"], [sha256])
+
+
+def test_file_written_after_scan_is_kept():
+    path = os.path.join(FILES_DIR, "plain.txt")
+    with SessionLocal() as db:
+        db.add(File(name="plain", extension=".txt", size=4, path=path))
+        db.commit()
+    scanner = DirectoryScanner()
+    scan = scanner.scan(full=True)
+    _write(path, b"data")
+
+    report = _reconcile(scanner, scan)
+
+    assert report["removed"] == 0
+    assert _catalog() == (["plain"], [])
+
+
+def test_missing_file_is_removed_and_new_file_added():
+    with SessionLocal() as db:
+        db.add(File(name="gone", extension=".txt", size=4, path=os.path.join(FILES_DIR, "gone.txt")))
+        db.commit()
+    _write(os.path.join(FILES_DIR, "sub", "new.txt"), b"new")
+    scanner = DirectoryScanner()
+
+    report = _reconcile(scanner, scanner.scan(full=True))
+
+    assert (report["removed"], report["added"]) == (1, 1)
+    assert _catalog() == (["new"], [])
@@ -0,0 +1,47 @@
+from src.database import SessionLocal
+from src.models import File
+
+
+def _add_files(*paths: str, comments=None) -> None:
+    comments = comments or {}
+    with SessionLocal() as db:
+        for path in paths:
+            name, extension = path.rsplit("/", 1)[-1].split(".")
+            db.add(File(name=name, extension=f".{extension}", size=1, path=path, comment=comments.get(name)))
+        db.commit()
+
+
+def _names(response) -> list:
+    assert response.status_code == 200
+    return [item["name"] for item in response.json()]
+
+
+def test_directory_search(client):
+    _add_files("a/b/one.txt", "a/b/c/two.txt", "a/b0/sibling.txt", "a/bc/prefix.txt", "a/three.pdf")
+
+    assert _names(client.get("/search/", params={"directory": "a/b"})) == ["one"]
+    assert _names(client.get("/search/", params={"directory": "a/b/", "recursive": True})) == ["one", "two"]
+    assert _names(client.get("/search/", params={"directory": "a", "recursive": True, "extension": "pdf"})) == ["three"]
+    assert client.get("/search/", params={"directory": "missing"}).status_code == 404
+
+
+def test_directory_search_pages(client):
+    _add_files(*[f"d/f{index}.txt" for index in range(5)])
+
+    first = client.get("/search/", params={"directory": "d", "limit": 3})
+    second = client.get("/search/", params={"directory": "d", "limit": 3, "cursor": first.headers["x-next-cursor"]})
+
+    assert _names(first) == ["f0", "f1", "f2"]
+    assert _names(second) == ["f3", "f4"]
+    assert "x-next-cursor" not in second.headers
+
+
+def test_fulltext_search(client):
+    _add_files("t/quarterly.txt", "t/notes.txt", "t/other.txt",
+               comments={"notes": "draft of the quarterly report", "other": "unrelated"})
+
+    # Совпадение в имени ранжируется выше совпадения в комментарии
+    assert _names(client.get("/search/text", params={"q": "quarter"})) == ["quarterly", "notes"]
+    assert _names(client.get("/search/text", params={"q": "quarterly draft"})) == ["notes"]
+    assert _names(client.get("/search/text", params={"q": 'report"*('})) == ["notes"]
+    assert client.get("/search/text", params={"q": "***"}).status_code == 400
@@ -0,0 +1,27 @@
+from datetime import datetime
+
+import pytest
+
+import src.serialization
+from src.serialization import dumps
+
+
+def test_list_rows_match_single_file_response(client):
+    client.post("/upload/", files={"uploaded_file": ("отчёт.bin", b"content")}, params={"comment": "квартал"})
+
+    listed = client.get("/files/").json()
+    single = client.get("/file/отчёт").json()
+
+    assert listed == [single]
+
+
+@pytest.mark.parametrize("value", [
+    {"name": "отчёт", "size": 1, "created_at": datetime(2024, 5, 6, 7, 8, 9, 123456), "comment": None},
+    [{"created_at": datetime(2024, 1, 1), "has_preview": False}],
+])
+def test_fallback_json_matches_orjson(monkeypatch, value):
+    pytest.importorskip("orjson")
+    fast = dumps(value)
+    monkeypatch.setattr(src.serialization, "orjson", None)
+
+    assert dumps(value) == fast
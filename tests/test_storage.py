@@ -0,0 +1,151 @@
+import asyncio
+import io
+from datetime import datetime, timezone
+
+import pytest
+
+from src.storage import S3Storage
+
+PART_SIZE = 8
+
+
+class FakeBody(io.BytesIO):
+    def iter_chunks(self, chunk_size):
+        return iter(lambda: self.read(chunk_size), b"")
+
+
+class FakeS3Client:
+    """Минимальная замена клиента boto3 для S3Storage: объекты и multipart-загрузки хранятся в памяти."""
+
+    def __init__(self):
+        self.objects = {}
+        self.uploads = {}
+        self.ranges = []
+
+    def _error(self, code: str, status: int):
+        from botocore.exceptions import ClientError
+        return ClientError({"Error": {"Code": code}, "ResponseMetadata": {"HTTPStatusCode": status}}, "Operation")
+
+    def _get(self, key: str) -> bytes:
+        if key not in self.objects:
+            raise self._error("NoSuchKey", 404)
+        return self.objects[key]
+
+    def put_object(self, Bucket, Key, Body):
+        self.objects[Key] = Body
+
+    def create_multipart_upload(self, Bucket, Key):
+        upload_id = f"upload-{len(self.uploads) + 1}"
+        self.uploads[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.uploads[UploadId][PartNumber] = Body
+        return {"ETag": f"etag-{PartNumber}"}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = self.uploads.pop(UploadId)
+        self.objects[Key] = b"".join(parts[part["PartNumber"]] for part in MultipartUpload["Parts"])
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.uploads.pop(UploadId)
+
+    def get_object(self, Bucket, Key, Range=None):
+        data = self._get(Key)
+        self.ranges.append(Range)
+        if Range is not None:
+            start, _, end = Range[len("bytes="):].partition("-")
+            if int(start) >= len(data):
+                raise self._error("InvalidRange", 416)  # Так S3 и MinIO отвечают и на "bytes=0-" для пустого объекта
+            data = data[int(start):int(end) + 1 if end else None]
+        return {"Body": FakeBody(data)}
+
+    def head_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise self._error("404", 404)
+        return {"ContentLength": len(self.objects[Key]), "LastModified": datetime(2024, 1, 1, tzinfo=timezone.utc)}
+
+    def copy(self, CopySource, Bucket, Key):
+        self.objects[Key] = self._get(CopySource["Key"])
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop(Key, None)
+
+
+async def _chunks(*parts: bytes):
+    for part in parts:
+        yield part
+
+
+async def _read(storage: S3Storage, key: str, start: int = 0, end=None) -> bytes:
+    return b"".join([chunk async for chunk in storage.open_read(key, start, end, chunk_size=3)])
+
+
+@pytest.fixture
+def s3_client():
+    return FakeS3Client()
+
+
+@pytest.fixture
+def storage(s3_client):
+    return S3Storage("bucket", part_size=PART_SIZE, client=s3_client)
+
+
+def test_small_object_is_written_with_single_put(storage, s3_client):
+    assert asyncio.run(storage.write("src/files/a.txt", _chunks(b"abc", b"def"))) == 6
+    assert s3_client.objects == {"src/files/a.txt": b"abcdef"}
+    assert s3_client.uploads == {}
+
+
+def test_large_object_is_written_in_parts(storage, s3_client):
+    data = bytes(range(20))
+
+    assert asyncio.run(storage.write("big.bin", _chunks(data[:5], data[5:13], data[13:]))) == len(data)
+    assert s3_client.objects == {"big.bin": data}
+    assert s3_client.uploads == {}  # Загрузка завершена
+
+
+def test_failed_write_aborts_multipart_upload(storage, s3_client):
+    async def failing():
+        yield bytes(PART_SIZE)
+        raise OSError("connection reset")
+
+    with pytest.raises(OSError):
+        asyncio.run(storage.write("broken.bin", failing()))
+    assert s3_client.objects == {}
+    assert s3_client.uploads == {}
+
+
+def test_open_read_ranges(storage, s3_client):
+    s3_client.objects["data.bin"] = b"0123456789"
+
+    assert asyncio.run(_read(storage, "data.bin")) == b"0123456789"
+    assert asyncio.run(_read(storage, "data.bin", 2, 5)) == b"2345"
+    assert asyncio.run(_read(storage, "data.bin", 7)) == b"789"
+    assert s3_client.ranges == [None, "bytes=2-5", "bytes=7-"]
+
+
+def test_open_read_empty_object(storage, s3_client):
+    s3_client.objects["empty.txt"] = b""
+
+    assert asyncio.run(_read(storage, "empty.txt")) == b""
+    assert s3_client.ranges == [None]
+
+
+def test_stat_of_missing_object_is_none(storage, s3_client):
+    pytest.importorskip("botocore")
+    s3_client.objects["src/files/a.txt"] = b"abc"
+
+    assert storage.stat_sync("src/files/missing.txt") is None
+    assert storage.stat_sync("src/files/a.txt").size == 3
+
+
+def test_move_and_delete(storage, s3_client):
+    pytest.importorskip("botocore")
+    s3_client.objects["src/files/old.txt"] = b"abc"
+
+    storage.move_sync("src/files/old.txt", "src/files/new.txt")
+    assert s3_client.objects == {"src/files/new.txt": b"abc"}
+    assert storage.delete_sync("src/files/new.txt") is True
+    assert storage.delete_sync("src/files/new.txt") is False
+    assert s3_client.objects == {}
@@ -0,0 +1,50 @@
+import hashlib
+import io
+import os
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+import src.app
+from src.blob_store import store_upload_file
+from src.config import UPLOAD_TMP_DIR
+from src.database import AsyncSessionLocal
+from tests.conftest import run
+
+
+def _temp_files() -> list:
+    return [name for _, _, files in os.walk(UPLOAD_TMP_DIR) for name in files]
+
+
+def test_upload_reports_size_and_checksum(client):
+    content = os.urandom(300 * 1024)
+
+    response = client.post("/upload/", files={"uploaded_file": ("random.bin", content)}, params={"comment": "c"})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["size"], body["checksum"]) == (len(content), hashlib.sha256(content).hexdigest())
+    assert client.get("/download/random").content == content
+    assert _temp_files() == []
+
+
+def test_upload_over_content_length_limit_is_rejected_early(client, monkeypatch):
+    monkeypatch.setattr(src.app, "MAX_UPLOAD_SIZE", 1024)
+
+    response = client.post("/upload/", files={"uploaded_file": ("big.bin", bytes(200 * 1024))})
+
+    assert response.status_code == 413
+    assert client.get("/file/big").status_code == 404
+
+
+def test_streamed_upload_over_limit_leaves_nothing():
+    upload = UploadFile(io.BytesIO(bytes(4096)), filename="big.bin")
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            await store_upload_file(db, upload, max_size=1000)
+
+    with pytest.raises(HTTPException) as error:
+        run(scenario())
+    assert error.value.status_code == 413
+    assert _temp_files() == []
@@ -0,0 +1,105 @@
+import hashlib
+import os
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+from sqlalchemy import func, select, update
+
+import src.upload_sessions
+from src.blob_store import blob_path
+from src.config import UPLOAD_SESSION_ASSEMBLY_TIMEOUT, UPLOAD_SESSION_MIN_CHUNK_SIZE
+from src.database import AsyncSessionLocal, SessionLocal
+from src.models import Blob, File, UploadSession
+from src.upload_sessions import cleanup_expired_sessions
+from tests.conftest import run
+
+CHUNK_SIZE = UPLOAD_SESSION_MIN_CHUNK_SIZE
+CONTENT = bytes(range(256)) * (CHUNK_SIZE * 5 // 2 // 256)  # Две полные части и половина третьей
+
+
+def _start_session(client, file_name: str = "chunked.bin") -> str:
+    response = client.post("/uploads/", json={"file_name": file_name, "size": len(CONTENT), "chunk_size": CHUNK_SIZE})
+    assert response.status_code == 201
+    session_id = response.json()["id"]
+    for index, start in enumerate(range(0, len(CONTENT), CHUNK_SIZE)):
+        response = client.put(f"/uploads/{session_id}/chunks/{index}", content=CONTENT[start:start + CHUNK_SIZE])
+        assert response.status_code == 200
+    return session_id
+
+
+def _count(model) -> int:
+    with SessionLocal() as db:
+        return db.scalar(select(func.count()).select_from(model))
+
+
+def test_complete_assembles_file(client):
+    session_id = _start_session(client)
+
+    response = client.post(f"/uploads/{session_id}/complete")
+
+    assert response.status_code == 200
+    assert response.json()["checksum"] == hashlib.sha256(CONTENT).hexdigest()
+    assert client.get("/download/chunked").content == CONTENT
+    assert client.get(f"/uploads/{session_id}").status_code == 404
+
+
+def test_failed_completion_reopens_session(client, monkeypatch):
+    session_id = _start_session(client)
+    original_create_file = src.upload_sessions.create_file
+
+    async def failing_create_file(db, *args, **kwargs):
+        # Файл с таким же именем создали параллельно после проверки имени
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Файл с таким именем уже существует.")
+
+    monkeypatch.setattr(src.upload_sessions, "create_file", failing_create_file)
+    response = client.post(f"/uploads/{session_id}/complete")
+
+    assert response.status_code == 400
+    assert client.get(f"/uploads/{session_id}").json()["status"] == "active"
+    assert _count(Blob) == 0
+    assert not os.path.exists(blob_path(hashlib.sha256(CONTENT).hexdigest()))
+
+    # Сессию можно завершить повторно
+    monkeypatch.setattr(src.upload_sessions, "create_file", original_create_file)
+    response = client.post(f"/uploads/{session_id}/complete")
+    assert response.status_code == 200
+    assert _count(File) == 1
+    assert _count(Blob) == 1
+
+
+def _mark_assembling(session_id: str, started: datetime) -> None:
+    # Так сессию оставляет процесс, остановленный посреди сборки
+    with SessionLocal() as db:
+        db.execute(update(UploadSession).where(UploadSession.id == session_id)
+                   .values(status="assembling", assembling_at=started))
+        db.commit()
+
+
+def test_assembly_in_progress_blocks_completion(client):
+    session_id = _start_session(client)
+    _mark_assembling(session_id, datetime.utcnow())
+
+    assert client.post(f"/uploads/{session_id}/complete").status_code == 409
+
+
+def test_interrupted_assembly_can_be_completed(client):
+    session_id = _start_session(client)
+    _mark_assembling(session_id, datetime.utcnow() - timedelta(seconds=UPLOAD_SESSION_ASSEMBLY_TIMEOUT + 1))
+
+    response = client.post(f"/uploads/{session_id}/complete")
+
+    assert response.status_code == 200
+    assert _count(File) == 1
+
+
+def test_cleanup_reopens_interrupted_assembly(client):
+    session_id = _start_session(client)
+    _mark_assembling(session_id, datetime.utcnow() - timedelta(seconds=UPLOAD_SESSION_ASSEMBLY_TIMEOUT + 1))
+
+    async def cleanup():
+        async with AsyncSessionLocal() as db:
+            return await cleanup_expired_sessions(db)
+
+    assert run(cleanup()) == 0
+    assert client.get(f"/uploads/{session_id}").json()["status"] == "active"